@@ -1,2 +1,4 @@
 from .asset import AssetRouter
 from .core import CoreRouter
+from .metrics import MetricsRouter, RouteMetricsMiddleware
+from .stream import StreamRouter
@@ -1,25 +1,26 @@
 import asyncio
 from datetime import datetime, timedelta
 import json
-from typing import List
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from ticton import TicTonAsyncClient
 from app.providers import get_db
 from app.providers import get_cache
 from app.providers import get_scheduler
-from app.providers.manager import CacheManager, DatabaseManager, ScheduleManager
-from app.jobs.core import subscribe_oracle
-from app.jobs.price import get_exchanges, set_price
-from app.models.core import Asset, PriceFeed, CreatePairRequest
+from app.providers import get_leases, get_pair_registry
+from app.providers.manager import CacheManager, DatabaseManager, LeaseManager, PairRegistryManager, ScheduleManager
+from app.jobs.price import AGGREGATE_SOURCE, get_exchanges, price_feed_key, set_price
+from app.jobs.history import Resolution, get_price_history
+from app.jobs.jetton import REWARD_JETTON_ADDRESS, get_cached_jetton_wallet
+from app.models.core import Asset, PriceFeed, PricePoint, CreatePairRequest
 from app.models.core import Pair
 from ticton import TicTonAsyncClient
 from apscheduler.schedulers.base import BaseScheduler
 from app.settings import Settings, get_settings
 from app.tools import get_ticton_client, get_ton_center_client
 from pytoncenter.address import Address
-from pytoncenter import get_client
 from pytoncenter.v3.models import GetSpecifiedJettonWalletRequest, RunGetMethodRequest, GetMethodParameterInput
 
 
@@ -30,14 +31,15 @@ AssetRouter = APIRouter(prefix="/asset", tags=["asset"])
 async def get_jetton_wallet(
     user_wallet: str,
     jetton_master_addr: str = "kQBqSpvo4S87mX9tjHaG4zhYZeORhVhMapBJpnMZ64jhrP-A",
+    cache: CacheManager = Depends(get_cache),
     settings: Settings = Depends(get_settings),
 ):
     try:
-        toncenter = await get_ton_center_client(settings)
-        wallet = await toncenter.get_jetton_wallets(GetSpecifiedJettonWalletRequest(owner_address=user_wallet, jetton_address=jetton_master_addr))
+        toncenter = await get_ton_center_client()
+        wallet = await get_cached_jetton_wallet(cache, toncenter, user_wallet, jetton_master_addr, settings.TICTON_JETTON_WALLET_TTL, settings.TICTON_JETTON_WALLET_NEGATIVE_TTL)
         if wallet is None:
             return JSONResponse(status_code=status.HTTP_200_OK, content={"msg": "Please get some test usdt from faucet"})
-        return JSONResponse(status_code=status.HTTP_200_OK, content=wallet.model_dump())
+        return JSONResponse(status_code=status.HTTP_200_OK, content=wallet)
     except Exception as e:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -46,10 +48,9 @@ async def get_jetton_wallet(
 
 
 @AssetRouter.get("/pairs", response_model=List[Pair], description="Get available pairs")
-async def get_pairs(db: DatabaseManager = Depends(get_db)):
+async def get_pairs(registry: PairRegistryManager = Depends(get_pair_registry)):
     try:
-        result = db.db["pairs"].find()
-        result = [Pair(**i) for i in result]
+        result = await registry.list()
         return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(result))
     except Exception as e:
         return JSONResponse(
@@ -62,12 +63,12 @@ async def get_pairs(db: DatabaseManager = Depends(get_db)):
 async def create_pair(
     request: CreatePairRequest,
     db: DatabaseManager = Depends(get_db),
-    settings: Settings = Depends(get_settings),
-    scheduler: ScheduleManager = Depends(get_scheduler),
+    registry: PairRegistryManager = Depends(get_pair_registry),
+    leases: LeaseManager = Depends(get_leases),
 ):
     # TODO: only ton dynasty can create pair
     try:
-        client = await get_ticton_client(oracle_address=request.oracle_address, settings=settings)
+        client = await get_ticton_client(oracle_address=request.oracle_address)
 
         oracle_address = Address(request.oracle_address).to_string(False)
 
@@ -82,18 +83,12 @@ async def create_pair(
             base_asset_image_url=request.base_asset_image_url,
             quote_asset_image_url=request.quote_asset_image_url,
         )
-        result = db.db["pairs"].insert_one(pair.model_dump())
+        result = await db.db["pairs"].insert_one(pair.model_dump())
         if result.acknowledged:
             print("Pair Created", pair)
-        scheduler.scheduler.add_job(
-            subscribe_oracle,
-            "date",
-            next_run_time=datetime.now() + timedelta(seconds=5),
-            kwargs={"client": client},
-            id=f"subscribe_oracle_{pair.oracle_address}",
-            name=f"subscribe_oracle_{pair.oracle_address}",
-            replace_existing=True,
-        )
+        await registry.invalidate()
+        # the worker the subscription hashes to starts it, this one right away and the others on their next heartbeat
+        leases.rebalance()
         return JSONResponse(status_code=status.HTTP_201_CREATED, content={"message": "Success"})
     except Exception as e:
         return JSONResponse(
@@ -103,14 +98,49 @@ async def create_pair(
 
 
 @AssetRouter.get("/price", response_model=List[PriceFeed], description="Get price feeds of a specific pair")
-async def get_price_feeds(pair_id: str, cache: CacheManager = Depends(get_cache), db: DatabaseManager = Depends(get_db)):
+async def get_price_feeds(
+    pair_id: str,
+    source: Optional[str] = Query(None, description=f"Only the feed of this source, `{AGGREGATE_SOURCE}` is the price combined from every exchange"),
+    cache: CacheManager = Depends(get_cache),
+    registry: PairRegistryManager = Depends(get_pair_registry),
+):
     try:
         # find pair by pair id
-        pair = db.db["pairs"].find_one({"id": pair_id})
-        pair = Pair(**pair)
+        pair = await registry.get(pair_id)
+        if pair is None:
+            return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Pair not found"})
+        symbol = f"{pair.base_asset_symbol.upper()}/{pair.quote_asset_symbol.upper()}"
+        if source is not None:
+            feed = await cache.client.hget(price_feed_key(symbol), source)  # type: ignore
+            feeds = [feed] if feed is not None else []
+        else:
+            feeds = await cache.client.hvals(price_feed_key(symbol))  # type: ignore
+        result = [PriceFeed(**json.loads(i)) for i in feeds]
+        return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(result))
+    except Exception as e:
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"message": str(e)},
+        )
+
+
+@AssetRouter.get("/price/history", response_model=List[PricePoint], description="Get downsampled price history of a specific pair")
+async def get_price_history_by_pair_id(
+    pair_id: str,
+    resolution: Resolution = "5m",
+    start: Optional[datetime] = Query(None, alias="from", description="Start time, defaults to 24 hours before `to`"),
+    end: Optional[datetime] = Query(None, alias="to", description="End time, defaults to now"),
+    cache: CacheManager = Depends(get_cache),
+    registry: PairRegistryManager = Depends(get_pair_registry),
+):
+    try:
+        pair = await registry.get(pair_id)
+        if pair is None:
+            return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"message": "Pair not found"})
         symbol = f"{pair.base_asset_symbol.upper()}/{pair.quote_asset_symbol.upper()}"
-        iter = cache.client.scan_iter(f"price$*${symbol}")
-        result = [PriceFeed(**json.loads(cache.client.get(i))) for i in iter]  # type: ignore
+        end = end or datetime.now()
+        start = start or end - timedelta(days=1)
+        result = await get_price_history(cache.client, symbol, resolution, start, end)
         return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(result))
     except Exception as e:
         return JSONResponse(
@@ -120,15 +150,15 @@ async def get_price_feeds(pair_id: str, cache: CacheManager = Depends(get_cache)
 
 
 @AssetRouter.get("/reward", description="Get the number of reward tokens in specified address currently")
-async def get_reward_by_address(address: str, settings: Settings = Depends(get_settings)):
+async def get_reward_by_address(address: str, cache: CacheManager = Depends(get_cache), settings: Settings = Depends(get_settings)):
     try:
         my_address = Address(address).to_string(False)
-        client = get_client(version="v3", network=settings.TICTON_NETWORK)
-        request = GetSpecifiedJettonWalletRequest(owner_address=my_address, jetton_address="0:903d8c69172157c484a203f738db0358af3706736f4d7051eaaeea434e54f76b")
-        result = await client.get_jetton_wallets(request)
+        client = await get_ton_center_client()
+        # cached until the TTL runs out or ingestion sees a ring payout to the address
+        result = await get_cached_jetton_wallet(cache, client, my_address, REWARD_JETTON_ADDRESS, settings.TICTON_JETTON_WALLET_TTL, settings.TICTON_JETTON_WALLET_NEGATIVE_TTL)
         if result is None:
             return JSONResponse(status_code=status.HTTP_200_OK, content={"reward": 0})
-        balance = result.balance / 10**9
+        balance = result["balance"] / 10**9
         return JSONResponse(status_code=status.HTTP_200_OK, content={"reward": balance})
     except Exception as e:
         return JSONResponse(
@@ -141,19 +171,17 @@ async def get_reward_by_address(address: str, settings: Settings = Depends(get_s
 async def debug_delete_pair(
     pair_id: str,
     db: DatabaseManager = Depends(get_db),
-    scheduler: BaseScheduler = Depends(get_scheduler),
+    registry: PairRegistryManager = Depends(get_pair_registry),
+    leases: LeaseManager = Depends(get_leases),
 ):
     try:
-        # get oracle address by pair id
-        pair = db.db["pairs"].find_one({"id": pair_id})
-        oracle_address = pair["oracle_address"]
-
-        scheduler.remove_job(job_id=f"subscribe_oracle_{oracle_address}")
-
         # delete pair by pair id
-        result = db.db["pairs"].delete_one({"id": pair_id})
+        result = await db.db["pairs"].delete_one({"id": pair_id})
         if result.acknowledged:
             print("Pair Deleted", pair_id)
+        # the worker running the subscription stops it once it sees the pair is gone
+        await registry.invalidate()
+        leases.rebalance()
         return JSONResponse(status_code=status.HTTP_200_OK, content={"message": "Success"})
     except Exception as e:
         return JSONResponse(
@@ -1,65 +1,107 @@
+from typing import Any, Dict, List, Literal, Optional
+
 from fastapi import APIRouter, BackgroundTasks, Depends, status
 from fastapi.responses import JSONResponse
-from app.providers import DatabaseManager, get_cache, get_db, get_scheduler
-from app.models.common import PageResponse, Pagination
-from app.models.core import Alarm, AlarmResponse, Pair
-from fastapi.encoders import jsonable_encoder
 from pytoncenter.address import Address
-from app.providers.manager import CacheManager
-from app.utils import get_pagination, calculate_time_elapse
+
+from app.jobs.user_stats import count_user_stats, get_user_stats, user_stats_seeded
+from app.models.common import AlarmCursor, PageResponse, Pagination
+from app.models.core import AlarmResponse, UserStats
+from app.models.queries import (
+    active_alarms_by_pair_filter,
+    active_alarms_by_pair_pipeline,
+    active_alarms_by_watchmaker_filter,
+    active_alarms_by_watchmaker_pipeline,
+    alarm_cursor,
+    closed_alarms_by_watchmaker_filter,
+    closed_alarms_by_watchmaker_pipeline,
+)
+from app.providers import DatabaseManager, get_cache, get_db, get_event_hub, get_metrics, get_pair_registry, get_scheduler
+from app.providers.manager import CacheManager, EventStreamManager, MetricsManager, PairRegistryManager
+from app.settings import get_settings
+from app.utils import calculate_time_elapse, count_documents_cached, get_pagination, raw_json_response, split_page
 
 CoreRouter = APIRouter(prefix="/core", tags=["core"])
 
 
+def alarm_response_item(view: Dict[str, Any], closed: bool = False) -> Dict[str, Any]:
+    """
+    `AlarmResponse` of a document returned by `alarm_view_pipeline`, as a JSON-native dict.
+    Alarm documents are written by the ingestion handlers only, so they are not validated into `Alarm` and `AlarmResponse` on the way out.
+    The keys follow the field order of `AlarmResponse` and the values are cast to its field types, the JSON is the same as the validated one.
+    """
+    return {
+        "base_asset_image_url": view["base_asset_image_url"],
+        "quote_asset_image_url": view["quote_asset_image_url"],
+        "base_asset_symbol": view["base_asset_symbol"],
+        "quote_asset_symbol": view["quote_asset_symbol"],
+        "created_since": calculate_time_elapse(view["created_at"]),
+        "closed_since": calculate_time_elapse(view.get("closed_at")) if closed else None,  # type: ignore
+        "price": float(view["price"]),
+        "base_asset_scale": int(view["base_asset_scale"]),
+        "quote_asset_scale": int(view["quote_asset_scale"]),
+        "reward": float(view["reward"]),
+        "min_base_asset_threshold": float(view["min_base_asset_threshold"]),
+        "arbitrage_ratio": float(view["arbitrage_ratio"]),
+        "watchmaker": view["watchmaker"],
+        "alarm_id": int(view["id"]),
+        "alarm_address": view["address"],
+        "remain_scale": int(view["remain_scale"]),
+    }
+
+
+def alarm_page(items: List[Dict[str, Any]], total: Optional[int], next_cursor: Optional[str]) -> Dict[str, Any]:
+    """
+    `PageResponse[AlarmResponse]` of items built by `alarm_response_item`.
+    """
+    return {"items": items, "total": total, "next_cursor": next_cursor}
+
+
+async def watchmaker_total(manager: DatabaseManager, cache: CacheManager, watchmaker: str, kind: Literal["active", "closed"]) -> int:
+    """
+    Number of active or closed alarms of `watchmaker`, read from the stats maintained by ingestion.
+    The alarms are counted until the first worker seeded the stats, see `app.jobs.user_stats.seed_user_stats`.
+    """
+    if await user_stats_seeded(manager):
+        stats = await get_user_stats(manager, watchmaker)
+        return stats[kind] if stats is not None else 0
+    query = active_alarms_by_watchmaker_filter(watchmaker) if kind == "active" else closed_alarms_by_watchmaker_filter(watchmaker)
+    return await count_documents_cached(cache, manager.db["alarms"], query, get_settings().TICTON_PAGINATION_TOTAL_TTL)
+
+
+@CoreRouter.get("/users/{address}/stats", response_model=UserStats, description="Get alarm counts, wind activity and total reward of a user")
+async def get_user_stats_by_address(address: str, manager: DatabaseManager = Depends(get_db)):
+    try:
+        my_address = Address(address).to_string(False)
+        if not await user_stats_seeded(manager):
+            return raw_json_response(await count_user_stats(manager, my_address))
+        stats = await get_user_stats(manager, my_address)
+        if stats is None:
+            stats = UserStats(address=my_address, active=0, closed=0, ticks=0, winds=0, reward=0.0).model_dump()
+        return raw_json_response(stats)
+    except Exception as e:
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"message": str(e)},
+        )
+
+
 @CoreRouter.get("/alarms/{address}/active", response_model=PageResponse[AlarmResponse])
-async def get_my_active_alarms(address: str, manager: DatabaseManager = Depends(get_db), cache: CacheManager = Depends(get_cache), p: Pagination = Depends(get_pagination)):
+async def get_my_active_alarms(
+    address: str,
+    manager: DatabaseManager = Depends(get_db),
+    cache: CacheManager = Depends(get_cache),
+    p: Pagination = Depends(get_pagination(AlarmCursor)),
+):
     try:
         # find alarms with telegram_id, and status is not closed
         my_address = Address(address).to_string(False)
-        pipeline = [
-            {"$match": {"watchmaker": {"$eq": my_address}, "status": {"$ne": "closed"}}},
-            {"$sort": {"id": -1}},
-            {"$facet": {
-                "paginatedResults": [{"$skip": p.skip}, {"$limit": p.limit}],
-                "totalCount": [{"$count": "count"}]
-            }},
-        ]
-        result = manager.db["alarms"].aggregate(pipeline)
-        alarms = []
-        total = 0
-        for batch in result:
-            alarms = [Alarm(**i) for i in batch["paginatedResults"]]
-            total = batch["totalCount"][0]["count"] if batch["totalCount"] else 0
-
-        responses = []
-
-        unique_pairs = set([alarm.pair_id for alarm in alarms])
-        pairs = manager.db["pairs"].find({"id": {"$in": list(unique_pairs)}})
-        pairs = [Pair(**i) for i in pairs]
-        pair_map = {pair.id: pair for pair in pairs}
-
-        for alarm in alarms:
-            pair = pair_map[alarm.pair_id]
-            responses.append(
-                AlarmResponse(
-                    base_asset_image_url=pair.base_asset_image_url,
-                    quote_asset_image_url=pair.quote_asset_image_url,
-                    base_asset_symbol=pair.base_asset_symbol,
-                    quote_asset_symbol=pair.quote_asset_symbol,
-                    created_since=calculate_time_elapse(alarm.created_at),
-                    price=alarm.price,
-                    base_asset_scale=alarm.base_asset_scale,
-                    quote_asset_scale=alarm.quote_asset_scale,
-                    reward=alarm.reward,
-                    min_base_asset_threshold=alarm.min_base_asset_threshold,
-                    arbitrage_ratio=float(alarm.origin_remain_scale - alarm.remain_scale) / alarm.origin_remain_scale,
-                    watchmaker=alarm.watchmaker,
-                    alarm_id=alarm.id,
-                    alarm_address=alarm.address,
-                    remain_scale=alarm.remain_scale,
-                )
-            )
-        return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(PageResponse[AlarmResponse](items=responses, total=total)))
+        pipeline = active_alarms_by_watchmaker_pipeline(my_address, p)
+        docs, next_cursor = split_page(await manager.db["alarms"].aggregate(pipeline).to_list(length=None), p, lambda doc, _: alarm_cursor(doc))
+        total = await watchmaker_total(manager, cache, my_address, "active") if p.include_total else None
+
+        items = [alarm_response_item(doc) for doc in docs]
+        return raw_json_response(alarm_page(items, total, next_cursor))
     except Exception as e:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -68,53 +110,22 @@ async def get_my_active_alarms(address: str, manager: DatabaseManager = Depends(
 
 
 @CoreRouter.get("/alarms/{address}/closed", response_model=PageResponse[AlarmResponse])
-async def get_my_closed_alarms(address: str, manager: DatabaseManager = Depends(get_db), p: Pagination = Depends(get_pagination)):
+async def get_my_closed_alarms(
+    address: str,
+    manager: DatabaseManager = Depends(get_db),
+    cache: CacheManager = Depends(get_cache),
+    p: Pagination = Depends(get_pagination(AlarmCursor)),
+):
     try:
         my_address = Address(address).to_string(False)
         # find alarms with telegram_id, and status is closed
-        pipeline = [
-            {"$match": {"watchmaker": {"$eq": my_address}, "status": {"$eq": "closed"}}},
-            {"$sort": {"id": -1}},
-            {"$facet": {"paginatedResults": [{"$skip": p.skip}, {"$limit": p.limit}], "totalCount": [{"$count": "count"}]}},
-        ]
-
-        result = manager.db["alarms"].aggregate(pipeline)
-        alarms = []
-        total = 0
-        for batch in result:
-            alarms = [Alarm(**i) for i in batch["paginatedResults"]]
-            total = batch["totalCount"][0]["count"] if batch["totalCount"] else 0
-
-        responses = []
-
-        unique_pairs = set([alarm.pair_id for alarm in alarms])
-        pairs = manager.db["pairs"].find({"id": {"$in": list(unique_pairs)}})
-        pairs = [Pair(**i) for i in pairs]
-        pair_map = {pair.id: pair for pair in pairs}
-
-        for alarm in alarms:
-            pair = pair_map[alarm.pair_id]
-            responses.append(
-                AlarmResponse(
-                    base_asset_image_url=pair.base_asset_image_url,
-                    quote_asset_image_url=pair.quote_asset_image_url,
-                    base_asset_symbol=pair.base_asset_symbol,
-                    quote_asset_symbol=pair.quote_asset_symbol,
-                    created_since=calculate_time_elapse(alarm.created_at),
-                    closed_since=calculate_time_elapse(alarm.closed_at),  # type: ignore
-                    price=alarm.price,
-                    base_asset_scale=alarm.base_asset_scale,
-                    quote_asset_scale=alarm.quote_asset_scale,
-                    reward=alarm.reward,
-                    min_base_asset_threshold=alarm.min_base_asset_threshold,
-                    arbitrage_ratio=float(alarm.origin_remain_scale - alarm.remain_scale) / alarm.origin_remain_scale,
-                    watchmaker=alarm.watchmaker,
-                    alarm_id=alarm.id,
-                    alarm_address=alarm.address,
-                    remain_scale=alarm.remain_scale,
-                )
-            )
-        return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(PageResponse[AlarmResponse](items=responses, total=total)))
+        pipeline = closed_alarms_by_watchmaker_pipeline(my_address, p)
+
+        docs, next_cursor = split_page(await manager.db["alarms"].aggregate(pipeline).to_list(length=None), p, lambda doc, _: alarm_cursor(doc))
+        total = await watchmaker_total(manager, cache, my_address, "closed") if p.include_total else None
+
+        items = [alarm_response_item(doc, closed=True) for doc in docs]
+        return raw_json_response(alarm_page(items, total, next_cursor))
     except Exception as e:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -123,52 +134,29 @@ async def get_my_closed_alarms(address: str, manager: DatabaseManager = Depends(
 
 
 @CoreRouter.get("/alarms/active", response_model=PageResponse[AlarmResponse], description="Get all active alarms with non-zero remain scale")
-async def get_alarms_by_pair_id(pair_id: str, manager: DatabaseManager = Depends(get_db), p: Pagination = Depends(get_pagination)):
+async def get_alarms_by_pair_id(
+    pair_id: str,
+    manager: DatabaseManager = Depends(get_db),
+    cache: CacheManager = Depends(get_cache),
+    registry: PairRegistryManager = Depends(get_pair_registry),
+    p: Pagination = Depends(get_pagination(AlarmCursor)),
+):
     try:
         # get pair by pair_id
-        pair_raw = manager.db["pairs"].find_one({"id": {"$eq": pair_id}})
-        if pair_raw is None:
+        pair = await registry.get(pair_id)
+        if pair is None:
             return JSONResponse(
                 status_code=status.HTTP_404_NOT_FOUND,
                 content={"message": "Pair not found"},
             )
-        pair = Pair(**pair_raw)
         # find alarms with pair_id
-        pipeline = [
-            {"$match": {"pair_id": {"$eq": pair_id}, "status": {"$ne": "closed"}, "remain_scale": {"$gt": 0}}},
-            {"$sort": {"id": -1}},
-            {"$facet": {"paginatedResults": [{"$skip": p.skip}, {"$limit": p.limit}], "totalCount": [{"$count": "count"}]}},
-        ]
-
-        result = manager.db["alarms"].aggregate(pipeline)
-        alarms = []
-        total = 0
-        for batch in result:
-            alarms = [Alarm(**i) for i in batch["paginatedResults"]]
-            total = batch["totalCount"][0]["count"] if batch["totalCount"] else 0
-
-        responses = []
-        for alarm in alarms:
-            responses.append(
-                AlarmResponse(
-                    base_asset_image_url=pair.base_asset_image_url,
-                    quote_asset_image_url=pair.quote_asset_image_url,
-                    base_asset_symbol=pair.base_asset_symbol,
-                    quote_asset_symbol=pair.quote_asset_symbol,
-                    created_since=calculate_time_elapse(alarm.created_at),
-                    price=alarm.price,
-                    base_asset_scale=alarm.base_asset_scale,
-                    quote_asset_scale=alarm.quote_asset_scale,
-                    reward=alarm.reward,
-                    min_base_asset_threshold=alarm.min_base_asset_threshold,
-                    arbitrage_ratio=float(alarm.origin_remain_scale - alarm.remain_scale) / alarm.origin_remain_scale,
-                    watchmaker=alarm.watchmaker,
-                    alarm_id=alarm.id,
-                    alarm_address=alarm.address,
-                    remain_scale=alarm.remain_scale,
-                )
-            )
-        return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(PageResponse[AlarmResponse](items=responses, total=total)))
+        pipeline = active_alarms_by_pair_pipeline(pair_id, p)
+
+        docs, next_cursor = split_page(await manager.db["alarms"].aggregate(pipeline).to_list(length=None), p, lambda doc, _: alarm_cursor(doc))
+        total = await count_documents_cached(cache, manager.db["alarms"], active_alarms_by_pair_filter(pair_id), get_settings().TICTON_PAGINATION_TOTAL_TTL) if p.include_total else None
+
+        items = [alarm_response_item(doc) for doc in docs]
+        return raw_json_response(alarm_page(items, total, next_cursor))
     except Exception as e:
         import traceback
 
@@ -177,3 +165,28 @@ async def get_alarms_by_pair_id(pair_id: str, manager: DatabaseManager = Depends
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content={"message": str(e)},
         )
+
+
+@CoreRouter.get("/debug/ingestion", description="Get oracle event ingestion counters, flush latency and batch size of every worker")
+async def get_ingestion_stats(metrics: MetricsManager = Depends(get_metrics)):
+    return JSONResponse(status_code=status.HTTP_200_OK, content=await metrics.stats("ingestion"))
+
+
+@CoreRouter.get("/debug/prices", description="Get price polling interval, lateness and cycle duration of every exchange, by worker")
+async def get_price_poller_stats(metrics: MetricsManager = Depends(get_metrics)):
+    return JSONResponse(status_code=status.HTTP_200_OK, content=await metrics.stats("prices"))
+
+
+@CoreRouter.get("/debug/exchanges", description="Get the circuit breaker state of every exchange, by worker")
+async def get_exchange_stats(metrics: MetricsManager = Depends(get_metrics)):
+    return JSONResponse(status_code=status.HTTP_200_OK, content=await metrics.stats("exchanges"))
+
+
+@CoreRouter.get("/debug/leases", description="Get the live workers and the subscriptions every worker runs")
+async def get_lease_stats(metrics: MetricsManager = Depends(get_metrics)):
+    return JSONResponse(status_code=status.HTTP_200_OK, content=await metrics.stats("leases"))
+
+
+@CoreRouter.get("/debug/streams", description="Get the stream clients of this process and the events received, delivered and dropped")
+async def get_stream_stats(hub: EventStreamManager = Depends(get_event_hub)):
+    return JSONResponse(status_code=status.HTTP_200_OK, content=hub.stats())
@@ -5,13 +5,16 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
 from pydantic import Json
-from app.models.common import PageResponse, Pagination
+from app.models.common import LeaderboardCursor, PageResponse, Pagination
+from app.models.queries import leaderboard_cursor, leaderboard_pipeline
 from app.providers import get_cache, get_db
 from app.providers.manager import CacheManager, DatabaseManager
 from app.models.leaderboard import LeaderboardRecord, LeaderboardRecordList, LeaderboardResponse, LeaderboardRecordResponse
 from pytoncenter.address import Address
 
-from app.utils import get_pagination
+from app.settings import get_settings
+from app.utils import count_documents_cached, get_pagination, split_page
+from app.jobs.leaderboard import get_rank, get_top_records
 
 LeaderBoardRouter = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
 
@@ -19,33 +22,22 @@ LeaderBoardRouter = APIRouter(prefix="/leaderboard", tags=["leaderboard"])
 @LeaderBoardRouter.get("", response_model=LeaderboardResponse, description="Get current user rank based on rewards.")
 async def get_leader_board(
     address: str,
-    manager: DatabaseManager = Depends(get_db),
     cache: CacheManager = Depends(get_cache),
 ):
     try:
         my_address = Address(address).to_string(False)
 
-        # Calculate rank dynamically based on rewards, assuming 'reward' field is indexed for sorting
-        cache_top_10 = cache.client.get("leaderboard_top_10")
-        if cache_top_10 is not None:
-            top_10_records = json.loads(cache_top_10)  # type: ignore
-            top_10_records = LeaderboardRecordList(**top_10_records)
-        else:
-            top_10_records_raw = manager.db["leaderboard"].find().sort("reward", -1).limit(10)
-            top_10_records = LeaderboardRecordList(leaderboard=[LeaderboardRecord(**r, rank=i + 1) for i, r in enumerate(top_10_records_raw)])
-            cache.client.set("leaderboard_top_10", top_10_records.model_dump_json(), ex=60)
+        # Rank and top 10 come from the redis sorted set maintained by on_ring_success
+        top_10_records = LeaderboardRecordList(
+            leaderboard=[LeaderboardRecord(address=record_address, reward=reward, rank=i + 1) for i, (record_address, reward) in enumerate(await get_top_records(cache, 10))]
+        )
 
         if len(top_10_records.leaderboard) == 0:
             return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(LeaderboardResponse(current_address=my_address, current_rank=-1, current_reward=0.0, leaderboard=[])))
 
         # Get the rank of the current user
-        user_rank = 0
-        user_reward = 0.0
-        current_user_record = manager.db["leaderboard"].find_one({"address": my_address})
-        if current_user_record is not None:
-            current_user_rank = manager.db["leaderboard"].count_documents({"reward": {"$gt": current_user_record["reward"]}}) + 1
-            user_rank = current_user_rank
-            user_reward = current_user_record["reward"]
+        user_rank, user_reward = await get_rank(cache, my_address)
+        user_reward = user_reward or 0.0
 
         leaderboard_response = []
         for i, record in enumerate(top_10_records.leaderboard):
@@ -62,19 +54,19 @@ async def get_leader_board(
 @LeaderBoardRouter.get("/debug", response_model=PageResponse[LeaderboardRecord], description="Get leaderboard records with pagination")
 async def get_leader_board_pagination(
     manager: DatabaseManager = Depends(get_db),
-    p: Pagination = Depends(get_pagination),
+    cache: CacheManager = Depends(get_cache),
+    p: Pagination = Depends(get_pagination(LeaderboardCursor)),
 ):
     try:
-        pipeline = [
-            {"$sort": {"reward": -1}},
-            {"$facet": {"paginatedResults": [{"$skip": p.skip}, {"$limit": p.limit}], "totalCount": [{"$count": "count"}]}},
-        ]
-        result = manager.db["leaderboard"].aggregate(pipeline)
-        leaderboard_records = []
-        total = 0
-        for batch in result:
-            leaderboard_records = [LeaderboardRecord(**b, rank=(i + 1) + p.skip) for i, b in enumerate(batch["paginatedResults"])]
-            total = batch["totalCount"][0]["count"] if batch["totalCount"] else 0
-        return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(PageResponse[LeaderboardRecord](items=leaderboard_records, total=total)))
+        pipeline = leaderboard_pipeline(p)
+        # rank of the first record on the page, the cursor carries the rank of the last record of the previous page
+        offset = p.cursor["rank"] if p.cursor is not None else p.skip
+        docs, next_cursor = split_page(await manager.db["leaderboard"].aggregate(pipeline).to_list(length=None), p, lambda doc, i: leaderboard_cursor(doc, offset + i + 1))
+        leaderboard_records = [LeaderboardRecord(**b, rank=(i + 1) + offset) for i, b in enumerate(docs)]
+        total = await count_documents_cached(cache, manager.db["leaderboard"], {}, get_settings().TICTON_PAGINATION_TOTAL_TTL) if p.include_total else None
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content=jsonable_encoder(PageResponse[LeaderboardRecord](items=leaderboard_records, total=total, next_cursor=next_cursor)),
+        )
     except Exception as e:
         return JSONResponse(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, content={"message": str(e)})
@@ -0,0 +1,59 @@
+import time
+import traceback
+
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.providers import get_metrics
+from app.providers.manager import MetricsManager
+from app.utils.metrics import REGISTRY, ROUTE_LATENCY
+
+MetricsRouter = APIRouter(tags=["metrics"])
+
+
+class RouteMetricsMiddleware:
+    """
+    Times every HTTP request by route template, method and status, from receiving the request to sending the response headers.
+    Timing stops at the headers so streaming responses are measured by how fast they start. Requests that match no route share one
+    label so scanners cannot grow the number of series.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not REGISTRY.enabled:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        observed = False
+
+        def observe(status_code: int):
+            nonlocal observed
+            observed = True
+            route = scope.get("route")
+            ROUTE_LATENCY.labels(scope["method"], route.path if route is not None else "unmatched", str(status_code)).observe(time.perf_counter() - start)
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            if not observed:
+                # the handler raised before responding, the server answers 500
+                observe(status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@MetricsRouter.get("/metrics", description="Metrics of every API and worker process in Prometheus text format", response_class=PlainTextResponse)
+async def get_metrics_text(metrics: MetricsManager = Depends(get_metrics)):
+    try:
+        return PlainTextResponse(await metrics.render(), media_type="text/plain; version=0.0.4")
+    except Exception as e:
+        print(traceback.format_exc())
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={"message": str(e)},
+        )
@@ -0,0 +1,86 @@
+import asyncio
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, Request, WebSocket, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from pytoncenter.address import Address
+
+from app.providers import get_event_hub
+from app.providers.manager import EventStreamManager
+from app.settings import Settings, get_settings
+
+StreamRouter = APIRouter(prefix="/stream", tags=["stream"])
+
+
+def get_stream_filters(pair_id: Optional[str] = None, address: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    return pair_id, Address(address).to_string(False) if address else None
+
+
+@StreamRouter.get(
+    "/events",
+    description="Server-sent events of price feeds and alarm changes, filtered by pair id and watchmaker address. Each event is one JSON object",
+)
+async def stream_events(
+    request: Request,
+    pair_id: Optional[str] = None,
+    address: Optional[str] = None,
+    hub: EventStreamManager = Depends(get_event_hub),
+    settings: Settings = Depends(get_settings),
+):
+    try:
+        pair_id, watchmaker = get_stream_filters(pair_id, address)
+    except Exception as e:
+        return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"message": str(e)})
+
+    async def body():
+        # subscribed once the response streams, a response that is never sent leaves nothing behind
+        subscription = hub.subscribe(pair_id, watchmaker)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), timeout=settings.TICTON_STREAM_KEEPALIVE)
+                    yield f"data: {message}\n\n"
+                except asyncio.TimeoutError:
+                    # keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingResponse(body(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@StreamRouter.websocket("/ws")
+async def stream_socket(
+    websocket: WebSocket,
+    pair_id: Optional[str] = None,
+    address: Optional[str] = None,
+    hub: EventStreamManager = Depends(get_event_hub),
+):
+    """
+    WebSocket of price feeds and alarm changes, same filters and events as `/stream/events`, one JSON object per text frame.
+    """
+    try:
+        pair_id, watchmaker = get_stream_filters(pair_id, address)
+    except Exception:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    subscription = hub.subscribe(pair_id, watchmaker)
+
+    async def send():
+        while True:
+            await websocket.send_text(await subscription.get())
+
+    async def receive():
+        # clients do not send anything, reading is how a closed socket is noticed
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = [asyncio.create_task(send()), asyncio.create_task(receive())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        hub.unsubscribe(subscription)
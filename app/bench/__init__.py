@@ -0,0 +1,63 @@
+import asyncio
+import math
+import time
+from typing import Dict, List
+
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile, q is in [0, 100].
+    """
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: List[float]) -> Dict[str, float]:
+    """
+    Summarize latencies in seconds as milliseconds.
+    """
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies, default=0.0) * 1000, 3),
+    }
+
+
+class LoopMonitor:
+    """
+    Measure how long the event loop is stalled by sleeping for a fixed interval and recording the overshoot.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stalls: List[float] = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.stalls.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def report(self) -> Dict[str, float]:
+        return {
+            "total_stall_ms": round(sum(self.stalls) * 1000, 3),
+            "max_stall_ms": round(max(self.stalls, default=0.0) * 1000, 3),
+            "p99_stall_ms": round(percentile(self.stalls, 99) * 1000, 3),
+        }
@@ -0,0 +1,111 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Coroutine, Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+
+from app.bench import LoopMonitor, summarize
+from app.settings import Settings
+
+BENCH_COLLECTION = "bench_alarms"
+
+
+def _build_pipeline(watchmaker: str) -> List[Dict[str, Any]]:
+    """
+    Same shape as the pipeline used by `/core/alarms/{address}/active`.
+    """
+    return [
+        {"$match": {"watchmaker": {"$eq": watchmaker}, "status": {"$ne": "closed"}}},
+        {"$sort": {"id": -1}},
+        {"$facet": {"paginatedResults": [{"$skip": 0}, {"$limit": 10}], "totalCount": [{"$count": "count"}]}},
+    ]
+
+
+def _make_alarm(alarm_id: int, watchmaker: str) -> Dict[str, Any]:
+    return {
+        "id": alarm_id,
+        "address": f"0:{alarm_id:064x}",
+        "lt": alarm_id,
+        "pair_id": "bench",
+        "oracle": "0:bench",
+        "created_at": datetime.now() - timedelta(seconds=alarm_id),
+        "closed_at": None,
+        "watchmaker": watchmaker,
+        "base_asset_amount": 1.0,
+        "quote_asset_amount": 2.5,
+        "origin_remain_scale": 1,
+        "remain_scale": 1,
+        "base_asset_scale": 1,
+        "quote_asset_scale": 1,
+        "min_base_asset_threshold": 1.0,
+        "price": 2.5,
+        "status": random.choice(["active", "closed", "emptied"]),
+        "reward": 0.0,
+    }
+
+
+async def _drive(handler: Callable[[str], Coroutine[Any, Any, None]], watchmakers: List[str], requests: int, concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+    monitor = LoopMonitor()
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await handler(random.choice(watchmakers))
+            latencies.append(time.perf_counter() - start)
+
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(requests)])
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+    return {"throughput_rps": round(requests / elapsed, 2), **summarize(latencies), **monitor.report()}
+
+
+async def run_db_benchmark(settings: Settings, alarms: int, watchmakers: int, requests: int, concurrency: int) -> Dict[str, Any]:
+    """
+    Compare the blocking pymongo client with the motor client inside the event loop.
+    The sync client blocks the loop for the duration of every query, which shows up as stall time.
+    """
+    options = dict(
+        host=settings.TICTON_DB_HOST,
+        port=settings.TICTON_DB_PORT,
+        username=settings.TICTON_DB_USERNAME,
+        password=settings.TICTON_DB_PASSWORD,
+        serverSelectionTimeoutMS=3000,
+    )
+    sync_client = MongoClient(maxPoolSize=settings.TICTON_DB_MAX_POOL_SIZE, **options)
+    async_client = AsyncIOMotorClient(maxPoolSize=settings.TICTON_DB_MAX_POOL_SIZE, **options)
+    sync_collection = sync_client.get_database(settings.TICTON_DB_NAME)[BENCH_COLLECTION]
+    async_collection = async_client.get_database(settings.TICTON_DB_NAME)[BENCH_COLLECTION]
+
+    addresses = [f"0:{i:064x}" for i in range(watchmakers)]
+    try:
+        await async_collection.drop()
+        docs = [_make_alarm(i, addresses[i % watchmakers]) for i in range(alarms)]
+        for i in range(0, len(docs), 10_000):
+            await async_collection.insert_many(docs[i : i + 10_000])
+        await async_collection.create_index([("watchmaker", 1), ("id", -1), ("status", 1)])
+
+        async def blocking(watchmaker: str):
+            list(sync_collection.aggregate(_build_pipeline(watchmaker)))
+
+        async def non_blocking(watchmaker: str):
+            await async_collection.aggregate(_build_pipeline(watchmaker)).to_list(length=None)
+
+        return {
+            "alarms": alarms,
+            "watchmakers": watchmakers,
+            "requests": requests,
+            "concurrency": concurrency,
+            "before": await _drive(blocking, addresses, requests, concurrency),
+            "after": await _drive(non_blocking, addresses, requests, concurrency),
+        }
+    finally:
+        await async_collection.drop()
+        sync_client.close()
+        async_client.close()
@@ -0,0 +1,47 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+
+import ccxt.async_support as ccxt
+
+from app.bench import summarize
+from app.jobs.price import fetch_price
+from app.providers.impl.exchange_manager import ExchangeManager
+
+
+async def _cycle(exchanges, symbols: List[str]) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*[fetch_price(exchange, symbol) for exchange in exchanges for symbol in symbols])
+    return time.perf_counter() - start
+
+
+async def run_exchange_benchmark(names: List[str], symbols: List[str], cycles: int, interval: float) -> Dict[str, Any]:
+    """
+    Compare the old poller, which closed its exchange sessions at the end of every cycle, with the long-lived exchange manager.
+    """
+    cold: List[float] = []
+    exchanges = [getattr(ccxt, name)() for name in names]
+    for _ in range(cycles):
+        start = time.perf_counter()
+        await _cycle(exchanges, symbols)
+        await asyncio.gather(*[exchange.close() for exchange in exchanges])
+        cold.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+    manager = ExchangeManager()
+    await manager.connect(names)
+    warm: List[float] = []
+    try:
+        for _ in range(cycles):
+            warm.append(await _cycle(manager.exchanges, symbols))
+            await asyncio.sleep(interval)
+    finally:
+        await manager.disconnect()
+
+    return {
+        "exchanges": names,
+        "symbols": symbols,
+        "cycles": cycles,
+        "before": {**summarize(cold), "cycles_ms": [round(c * 1000, 3) for c in cold]},
+        "after": {**summarize(warm), "cycles_ms": [round(c * 1000, 3) for c in warm]},
+    }
@@ -0,0 +1,296 @@
+import asyncio
+import json
+import random
+import subprocess
+import time
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import FastAPI
+
+from app.bench import LoopMonitor, summarize
+from app.jobs.history import record_price_history
+from app.jobs.leaderboard import rebuild_leaderboard
+from app.jobs.price import aggregate_price, price_feed_key
+from app.jobs.user_stats import USER_STATS_MIGRATION
+from app.models.core import Pair, PriceFeed
+from app.models.indexes import apply_indexes
+from app.providers import get_cache, get_db
+from app.providers.manager import CacheManager, DatabaseManager
+from app.settings import Settings
+
+SYMBOLS = ["TON", "NOT", "BTC", "ETH", "DOGS", "USDC", "SOL", "BNB", "XRP", "ADA", "TRX", "AVAX"]
+SOURCES = ["Bybit", "Gate.io", "OKX"]
+INSERT_BATCH = 10_000
+
+PathOf = Callable[[random.Random], str]
+
+
+def bench_address(i: int) -> str:
+    return f"0:{i:064x}"
+
+
+def bench_pairs(pairs: int) -> List[Pair]:
+    return [
+        Pair(
+            oracle_address=bench_address(10**12 + i),
+            base_asset_address=bench_address(2 * 10**12 + i),
+            quote_asset_address=bench_address(3 * 10**12),
+            base_asset_symbol=SYMBOLS[i % len(SYMBOLS)] + ("" if i < len(SYMBOLS) else str(i)),
+            quote_asset_symbol="USDT",
+            base_asset_decimals=9,
+            quote_asset_decimals=6,
+            base_asset_image_url="",
+            quote_asset_image_url="",
+        )
+        for i in range(pairs)
+    ]
+
+
+async def connect_fakes(db_name: str) -> Tuple[DatabaseManager, CacheManager]:
+    """
+    Point the database and cache managers at in-process stand-ins, for machines without a local MongoDB and redis.
+    mongomock-motor and fakeredis are not dependencies of the app, install them to use the stand-ins. Their latencies say little about
+    production, compare runs against stand-ins with each other only.
+    """
+    try:
+        import fakeredis
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise Exception("In-process stand-ins need mongomock-motor and fakeredis, install them with `pip install mongomock-motor fakeredis`")
+    manager = await get_db()
+    manager.client = AsyncMongoMockClient()  # type: ignore
+    manager.db = manager.client.get_database(db_name)  # type: ignore
+    cache = await get_cache()
+    cache.client = fakeredis.FakeAsyncRedis()  # type: ignore
+    return manager, cache
+
+
+def _zipf_weights(n: int, s: float = 1.1) -> List[float]:
+    """
+    Cumulative weights of a Zipf distribution over `n` ranks, a few watchmakers own most alarms and most own a handful.
+    """
+    return list(accumulate(1 / (rank + 1) ** s for rank in range(n)))
+
+
+def _alarm(rng: random.Random, alarm_id: int, pair: Pair, watchmaker: str, now: datetime) -> Dict[str, Any]:
+    status = rng.choices(["closed", "active", "emptied"], weights=[70, 25, 5])[0]
+    created_at = now - timedelta(seconds=rng.randrange(90 * 86400))
+    origin_remain_scale = rng.choice([1, 1, 1, 2, 4])
+    remain_scale = 0 if status == "emptied" else rng.randint(0 if status == "closed" else 1, origin_remain_scale)
+    price = rng.uniform(1, 10)
+    return {
+        "id": alarm_id,
+        "address": bench_address(alarm_id),
+        "lt": alarm_id,
+        "pair_id": pair.id,
+        "oracle": pair.oracle_address,
+        "created_at": created_at,
+        "closed_at": created_at + timedelta(minutes=rng.randrange(1, 600)) if status == "closed" else None,
+        "watchmaker": watchmaker,
+        "base_asset_amount": 1.0 * origin_remain_scale,
+        "quote_asset_amount": price * origin_remain_scale,
+        "min_base_asset_threshold": 1.0,
+        "origin_remain_scale": origin_remain_scale,
+        "remain_scale": remain_scale,
+        "base_asset_scale": origin_remain_scale,
+        "quote_asset_scale": origin_remain_scale,
+        "status": status,
+        "reward": round(rng.expovariate(1.0), 4) if status == "closed" else 0.0,
+        "price": price,
+    }
+
+
+async def _seed_price_history(cache: CacheManager, pairs: List[Pair], minutes: int, settings: Settings):
+    rng = random.Random(1)
+    now = datetime.now()
+    for pair in pairs:
+        symbol = f"{pair.base_asset_symbol}/{pair.quote_asset_symbol}"
+        price = rng.uniform(1, 10)
+        for start in range(0, minutes, 60):
+            pipe = cache.client.pipeline(transaction=False)
+            feeds = []
+            for minute in range(start, min(start + 60, minutes)):
+                price *= 1 + rng.gauss(0, 0.001)
+                ts = now - timedelta(minutes=minutes - minute)
+                feeds.extend(PriceFeed(source=source, price=round(price, 4), last_updated_at=ts, symbol=symbol) for source in SOURCES)
+            await record_price_history(pipe, feeds, settings)
+            await pipe.execute()
+        pipe = cache.client.pipeline(transaction=False)
+        for source in SOURCES:
+            feed = PriceFeed(source=source, price=round(price, 4), last_updated_at=now, symbol=symbol)
+            pipe.hset(name=price_feed_key(symbol), key=source, value=feed.model_dump_json())
+            await aggregate_price(pipe, feed, [pair.id], settings)
+        await pipe.execute()
+
+
+# parameters of the data in the scratch database and redis, a run seeds again when they differ from its own
+SEED_MARKER = "http"
+SEED_MARKER_KEY = "bench$http$seed"
+# the price history is written relative to the time it was seeded, redis is seeded again once it is this old
+CACHE_SEED_TTL = 600
+
+
+def seed_params(pairs: int, alarms: int, watchmakers: int, leaderboard: int) -> Dict[str, Any]:
+    return {"pairs": pairs, "alarms": alarms, "watchmakers": watchmakers, "leaderboard": leaderboard}
+
+
+async def database_seeded(manager: DatabaseManager, params: Dict[str, Any]) -> bool:
+    marker = await manager.db["bench"].find_one({"name": SEED_MARKER})
+    return marker is not None and marker["params"] == params
+
+
+async def cache_seeded(cache: CacheManager, params: Dict[str, Any]) -> bool:
+    marker = await cache.client.get(SEED_MARKER_KEY)
+    return marker is not None and json.loads(marker) == params
+
+
+async def seed_http_database(manager: DatabaseManager, pairs: int, alarms: int, watchmakers: int, leaderboard: int, indexes: bool = True):
+    """
+    Fill the database with synthetic data shaped like production: alarms of every pair spread over watchmakers by a Zipf distribution
+    and a leaderboard with exponentially distributed rewards. Everything is generated from fixed seeds, the same arguments always produce
+    the same data so runs are comparable. The arguments are stored in the `bench` collection once the data is complete.
+    `indexes=False` skips the declared indexes, the in-process MongoDB checks unique indexes by scanning and never uses them for queries.
+    """
+    rng = random.Random(0)
+    now = datetime.now()
+    pair_list = bench_pairs(pairs)
+    for name in ["bench", "pairs", "alarms", "leaderboard", "user_stats", "migrations", "sync_state"]:
+        await manager.db[name].drop()
+    if indexes:
+        await apply_indexes(manager.db)
+    await manager.db["pairs"].insert_many([pair.model_dump() for pair in pair_list])
+
+    # the stats ingestion would have counted for the seeded alarms and rewards
+    user_stats: Dict[str, Dict[str, Any]] = {}
+
+    def stats_of(address: str) -> Dict[str, Any]:
+        return user_stats.setdefault(address, {"address": address, "active": 0, "closed": 0, "ticks": 0, "winds": 0, "reward": 0.0})
+
+    cum_weights = _zipf_weights(watchmakers)
+    for start in range(0, alarms, INSERT_BATCH):
+        ids = range(start + 1, min(start + INSERT_BATCH, alarms) + 1)
+        owners = rng.choices(range(watchmakers), cum_weights=cum_weights, k=len(ids))
+        docs = [_alarm(rng, alarm_id, rng.choice(pair_list), bench_address(owner), now) for alarm_id, owner in zip(ids, owners)]
+        await manager.db["alarms"].insert_many(docs)
+        for doc in docs:
+            stats = stats_of(doc["watchmaker"])
+            stats["closed" if doc["status"] == "closed" else "active"] += 1
+            stats["winds" if doc["base_asset_amount"] > doc["min_base_asset_threshold"] else "ticks"] += 1
+
+    for start in range(0, leaderboard, INSERT_BATCH):
+        records = {bench_address(i): round(rng.expovariate(0.1), 4) for i in range(start, min(start + INSERT_BATCH, leaderboard))}
+        await manager.db["leaderboard"].insert_many([{"address": address, "reward": reward} for address, reward in records.items()])
+        for address, reward in records.items():
+            stats_of(address)["reward"] = reward
+
+    stats_docs = list(user_stats.values())
+    for start in range(0, len(stats_docs), INSERT_BATCH):
+        await manager.db["user_stats"].insert_many(stats_docs[start : start + INSERT_BATCH])
+    await manager.db["migrations"].insert_one({"name": USER_STATS_MIGRATION, "applied_at": now})
+    await manager.db["bench"].insert_one({"name": SEED_MARKER, "params": seed_params(pairs, alarms, watchmakers, leaderboard)})
+
+
+async def seed_http_cache(manager: DatabaseManager, cache: CacheManager, settings: Settings, pairs: int, history_minutes: int, params: Dict[str, Any]):
+    """
+    Flush the scratch redis and fill it with the leaderboard of the database and `history_minutes` of price history up to now.
+    `params` is stored as the marker for `CACHE_SEED_TTL` seconds.
+    """
+    await cache.client.flushdb()
+    await rebuild_leaderboard(manager, cache)
+    await _seed_price_history(cache, bench_pairs(pairs), history_minutes, settings)
+    await cache.client.set(SEED_MARKER_KEY, json.dumps(params), ex=CACHE_SEED_TTL)
+
+
+def bench_data(pairs: int, alarms: int, watchmakers: int, leaderboard: int) -> Dict[str, Any]:
+    """
+    Description of the data `seed_http_database` writes for these arguments, requests are built from it.
+    """
+    return {
+        "pair_ids": [pair.id for pair in bench_pairs(pairs)],
+        "watchmakers": watchmakers,
+        "leaderboard": leaderboard,
+        "alarms": alarms,
+    }
+
+
+def run_info() -> Dict[str, Any]:
+    """
+    When and on which commit the results were measured, so result files can be told apart.
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        commit = None
+    return {"started_at": datetime.now().isoformat(), "commit": commit}
+
+
+def http_endpoints(data: Dict[str, Any]) -> Dict[str, PathOf]:
+    """
+    Every GET endpoint served from the database and cache, with the query a client would send.
+    `/asset/jetton_wallet` and `/asset/reward` call the TON API, `POST /asset/pairs` writes the pair list and `/stream/*` are long lived
+    connections measured by `bench stream`, so they are left out. Watchmakers are picked uniformly, most own a few alarms and the heavy
+    ones show up in the tail latencies.
+    """
+    pair_ids: List[str] = data["pair_ids"]
+
+    def watchmaker(rng: random.Random) -> str:
+        return bench_address(rng.randrange(data["watchmakers"]))
+
+    return {
+        "GET /core/alarms/{address}/active": lambda rng: f"/core/alarms/{watchmaker(rng)}/active",
+        "GET /core/alarms/{address}/closed": lambda rng: f"/core/alarms/{watchmaker(rng)}/closed",
+        "GET /core/users/{address}/stats": lambda rng: f"/core/users/{watchmaker(rng)}/stats",
+        "GET /core/alarms/active": lambda rng: f"/core/alarms/active?pair_id={rng.choice(pair_ids)}",
+        "GET /core/alarms/active?page=deep": lambda rng: f"/core/alarms/active?pair_id={rng.choice(pair_ids)}&page={rng.randint(50, 200)}",
+        "GET /asset/pairs": lambda rng: "/asset/pairs",
+        "GET /asset/price": lambda rng: f"/asset/price?pair_id={rng.choice(pair_ids)}",
+        "GET /asset/price?source=aggregate": lambda rng: f"/asset/price?pair_id={rng.choice(pair_ids)}&source=aggregate",
+        "GET /asset/price/history": lambda rng: f"/asset/price/history?pair_id={rng.choice(pair_ids)}&resolution={rng.choice(['1m', '5m', '1h'])}",
+        "GET /leaderboard": lambda rng: f"/leaderboard?address={bench_address(rng.randrange(data['leaderboard']))}",
+        "GET /leaderboard/debug": lambda rng: f"/leaderboard/debug?page={rng.randint(1, 100)}&per_page=20",
+        "GET /metrics": lambda rng: "/metrics",
+    }
+
+
+async def _drive(client: httpx.AsyncClient, path_of: PathOf, requests: int, concurrency: int, rng: random.Random) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    paths = [path_of(rng) for _ in range(requests)]
+    queue = iter(paths)
+    monitor = LoopMonitor()
+
+    async def client_loop():
+        for path in queue:
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*[client_loop() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+    return {"throughput_rps": round(requests / elapsed, 2), "statuses": statuses, **summarize(latencies), **monitor.report()}
+
+
+async def run_http_benchmark(app: FastAPI, data: Dict[str, Any], requests: int, concurrency: int, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Drive every endpoint with `concurrency` clients sending `requests` requests in total, one endpoint at a time.
+    Requests go through the whole ASGI app in process, middleware and serialization included, without a network hop so the numbers
+    track the code of `app/api` rather than the machine's TCP stack.
+    """
+    endpoints = http_endpoints(data)
+    results: Dict[str, Any] = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+        for name, path_of in endpoints.items():
+            if only and not any(part in name for part in only):
+                continue
+            rng = random.Random(name)
+            # warm caches and connection pools so the first requests do not skew the tail
+            await _drive(client, path_of, min(requests, 50), min(concurrency, 8), rng)
+            results[name] = await _drive(client, path_of, requests, concurrency, rng)
+    return results
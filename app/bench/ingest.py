@@ -0,0 +1,156 @@
+import asyncio
+import contextlib
+import io
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Tuple
+
+from app.jobs.core import on_ring_success, on_tick_success, on_wind_success
+from app.jobs.leaderboard import LEADERBOARD_KEY
+from app.models.core import Pair
+from app.models.indexes import apply_indexes
+from app.providers.impl.ingestion_buffer import IngestionBuffer
+from app.providers.manager import CacheManager, DatabaseManager
+
+Event = Tuple[Any, SimpleNamespace]
+
+
+def _address(i: int) -> str:
+    return f"0:{i:064x}"
+
+
+def _tx(lt: int, now: int, source: str, destination: str) -> SimpleNamespace:
+    return SimpleNamespace(lt=lt, now=now, in_msg=SimpleNamespace(source=source, destination=destination))
+
+
+def bench_pair(oracle: int) -> Pair:
+    return Pair(
+        id=f"bench{oracle}",
+        oracle_address=_address(oracle),
+        base_asset_address=_address(0),
+        quote_asset_address=_address(0),
+        base_asset_symbol="TON",
+        quote_asset_symbol="USDT",
+        base_asset_decimals=9,
+        quote_asset_decimals=6,
+        base_asset_image_url="",
+        quote_asset_image_url="",
+    )
+
+
+def make_event_stream(oracle: int, events: int, next_id, receivers: int, interval: float = 1.0) -> List[Event]:
+    """
+    Event stream of one oracle shaped like a catch-up: ticks open alarms, winds replace open alarms and rings close them with a reward.
+    Transactions are `interval` seconds apart on chain, ending now.
+    """
+    start = time.time() - events * interval
+    stream: List[Event] = []
+    active: List[int] = []
+    oracle_address = _address(oracle)
+    for lt in range(events):
+        now = int(start + lt * interval)
+        kind = random.random()
+        if len(active) == 0 or kind < 0.5:
+            alarm_id = next_id()
+            active.append(alarm_id)
+            params = SimpleNamespace(
+                new_alarm_id=alarm_id,
+                created_at=now,
+                watchmaker=_address(random.randrange(receivers)),
+                base_asset_price=random.uniform(1, 10),
+                tx=_tx(lt, now, _address(alarm_id), oracle_address),
+            )
+            stream.append((on_tick_success, params))
+        elif kind < 0.75:
+            old_alarm_id = active.pop(random.randrange(len(active)))
+            new_alarm_id = next_id()
+            active.append(new_alarm_id)
+            params = SimpleNamespace(
+                old_alarm_id=old_alarm_id,
+                new_alarm_id=new_alarm_id,
+                created_at=now,
+                timekeeper=_address(random.randrange(receivers)),
+                old_price=random.uniform(1, 10),
+                new_price=random.uniform(1, 10),
+                old_remain_scale=random.choice([0, 1]),
+                new_remain_scale=2,
+                tx=_tx(lt, now, oracle_address, _address(new_alarm_id)),
+            )
+            stream.append((on_wind_success, params))
+        else:
+            alarm_id = active.pop(random.randrange(len(active)))
+            params = SimpleNamespace(
+                alarm_id=alarm_id,
+                created_at=now,
+                receiver=_address(random.randrange(receivers)),
+                reward=random.uniform(0.1, 1),
+                tx=_tx(lt, now, oracle_address, _address(alarm_id)),
+            )
+            stream.append((on_ring_success, params))
+    return stream
+
+
+async def _replay(streams: Dict[int, List[Event]], ingestion: IngestionBuffer, manager: DatabaseManager) -> float:
+    client = SimpleNamespace(metadata=SimpleNamespace(min_base_asset_threshold=10**9, base_asset_decimals=9))
+
+    async def subscription(oracle: int, stream: List[Event]):
+        # a subscription handles its events one after another, like TicTonAsyncClient.subscribe
+        pair = bench_pair(oracle)
+        for handler, params in stream:
+            await handler(client, params, pair, manager=manager, ingestion=ingestion)
+
+    start = time.perf_counter()
+    # handlers print every event, keep the output out of the measurement
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*[subscription(oracle, stream) for oracle, stream in streams.items()])
+        await ingestion.flush()
+    return time.perf_counter() - start
+
+
+async def _run_mode(streams: Dict[int, List[Event]], manager: DatabaseManager, cache: CacheManager, batch_size: int, flush_interval: float, max_pending: int) -> Dict[str, Any]:
+    await manager.db["alarms"].drop()
+    await manager.db["leaderboard"].drop()
+    await manager.db["user_stats"].drop()
+    await apply_indexes(manager.db)
+    await cache.client.delete(LEADERBOARD_KEY)
+    ingestion = IngestionBuffer()
+    # scratch events must not reach the stream clients of a deployment sharing the redis
+    await ingestion.connect(manager, cache, batch_size=batch_size, flush_interval=flush_interval, max_pending=max_pending, publish_events=False)
+    try:
+        elapsed = await _replay(streams, ingestion, manager)
+    finally:
+        await ingestion.disconnect()
+    events = sum(len(stream) for stream in streams.values())
+    rewards = await manager.db["leaderboard"].aggregate([{"$group": {"_id": None, "total": {"$sum": "$reward"}}}]).to_list(length=1)
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "events_per_s": round(events / elapsed, 2),
+        "alarms": await manager.db["alarms"].count_documents({}),
+        "closed": await manager.db["alarms"].count_documents({"status": "closed"}),
+        "reward_total": round(rewards[0]["total"], 6) if rewards else 0.0,
+        **ingestion.stats(),
+    }
+
+
+async def run_ingest_benchmark(manager: DatabaseManager, cache: CacheManager, oracles: int, events: int, receivers: int, batch_size: int, flush_interval: float, max_pending: int) -> Dict[str, Any]:
+    """
+    Replay the same event stream through the write-through path, one round trip per write like the handlers did before the
+    ingestion buffer, and through the buffered path. `manager` and `cache` must point at scratch databases, the collections are dropped.
+    Both modes must end with the same alarms and reward total.
+    """
+    random.seed(0)
+    ids = iter(range(1, oracles * events + 1))
+    streams = {oracle: make_event_stream(oracle + 1, events, lambda: next(ids), receivers) for oracle in range(oracles)}
+    try:
+        return {
+            "oracles": oracles,
+            "events": oracles * events,
+            "before": await _run_mode(streams, manager, cache, batch_size=1, flush_interval=flush_interval, max_pending=1),
+            "after": await _run_mode(streams, manager, cache, batch_size=batch_size, flush_interval=flush_interval, max_pending=max_pending),
+        }
+    finally:
+        await manager.db["alarms"].drop()
+        await manager.db["leaderboard"].drop()
+        await manager.db["user_stats"].drop()
+        await cache.client.delete(LEADERBOARD_KEY)
@@ -0,0 +1,122 @@
+import time
+from typing import Any, Dict, List
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.metrics import RouteMetricsMiddleware
+from app.bench import percentile
+from app.providers.manager import DatabaseManager
+from app.utils.metrics import MONGO_LATENCY, REDIS_LATENCY, REGISTRY, MetricFamily
+
+
+async def hot_paths(manager: DatabaseManager) -> List[str]:
+    """
+    Paths of the routes the app polls, built from an alarm of the configured database.
+    """
+    alarm = await manager.db["alarms"].find_one({"status": "active"}, sort=[("id", -1)])
+    if alarm is None:
+        raise Exception("No active alarm in the database, the hot routes would only measure empty results")
+    watchmaker, pair_id = alarm["watchmaker"], alarm["pair_id"]
+    return [
+        f"/core/alarms/{watchmaker}/active",
+        f"/core/alarms/{watchmaker}/closed",
+        f"/core/alarms/active?pair_id={pair_id}",
+        f"/asset/price?pair_id={pair_id}",
+        f"/leaderboard?address={watchmaker}",
+    ]
+
+
+async def _empty_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def _middleware_cost(calls: int) -> float:
+    """
+    Seconds the route middleware adds to one request, measured around an app that does nothing.
+    """
+    middleware = RouteMetricsMiddleware(_empty_app)
+    scope = {"type": "http", "method": "GET", "path": "/bench"}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(_):
+        pass
+
+    costs = {}
+    for enabled in (True, False):
+        REGISTRY.enabled = enabled
+        start = time.perf_counter()
+        for _ in range(calls):
+            await middleware(dict(scope), receive, send)
+        costs[enabled] = (time.perf_counter() - start) / calls
+    return costs[True] - costs[False]
+
+
+def _timing_cost(calls: int) -> float:
+    """
+    Seconds it takes to time one datastore command, the two clock reads and the observation the redis and mongo hooks add.
+    """
+    family = MetricFamily("bench_command_duration_seconds", "histogram", "", ("command",))
+    start = time.perf_counter()
+    for _ in range(calls):
+        begin = time.perf_counter()
+        family.labels("GET").observe(time.perf_counter() - begin)
+    return (time.perf_counter() - start) / calls
+
+
+def _datastore_commands() -> int:
+    return sum(child.count for family in (REDIS_LATENCY, MONGO_LATENCY) for child in list(family.children.values()))
+
+
+async def run_metrics_benchmark(app: FastAPI, paths: List[str], rounds: int, requests: int, budget: float) -> Dict[str, Any]:
+    """
+    Check that instrumentation adds at most `budget`, a fraction, to the p50 latency of every path.
+    The overhead of a path is estimated from what it instruments: the cost of the route middleware plus the cost of timing one datastore
+    command times the commands a request of the path runs, both measured in isolation. A few microseconds are lost in the noise of an
+    end to end comparison, which is still reported as `p50_ms_on` and `p50_ms_off` from rounds that alternate instrumentation on and off.
+    """
+    enabled = REGISTRY.enabled
+    results: Dict[str, Any] = {}
+    try:
+        middleware = await _middleware_cost(requests * rounds * 10)
+        timing = _timing_cost(requests * rounds * 10)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            for path in paths:
+                latencies: Dict[bool, List[float]] = {True: [], False: []}
+                commands = 0
+                for _ in range(requests):
+                    (await client.get(path)).raise_for_status()
+                for i in range(rounds):
+                    for mode in (True, False) if i % 2 == 0 else (False, True):
+                        REGISTRY.enabled = mode
+                        before = _datastore_commands()
+                        for _ in range(requests):
+                            start = time.perf_counter()
+                            await client.get(path)
+                            latencies[mode].append(time.perf_counter() - start)
+                        if mode:
+                            commands += _datastore_commands() - before
+                on, off = percentile(latencies[True], 50), percentile(latencies[False], 50)
+                per_request = commands / (rounds * requests)
+                cost = middleware + per_request * timing
+                overhead = cost / off if off > 0 else 0.0
+                results[path] = {
+                    "p50_ms_on": round(on * 1000, 3),
+                    "p50_ms_off": round(off * 1000, 3),
+                    "datastore_commands_per_request": round(per_request, 2),
+                    "overhead_us": round(cost * 1e6, 2),
+                    "overhead": round(overhead, 4),
+                    "ok": overhead <= budget,
+                }
+    finally:
+        REGISTRY.enabled = enabled
+    return {
+        "budget": budget,
+        "middleware_us_per_request": round(middleware * 1e6, 2),
+        "timing_us_per_command": round(timing * 1e6, 2),
+        "routes": results,
+        "ok": all(r["ok"] for r in results.values()),
+    }
@@ -0,0 +1,59 @@
+from typing import Any, Dict, List
+
+from app.models.indexes import INDEXES, apply_indexes
+from app.models.queries import QueryCase, query_cases
+
+# plan stages that mean the query reads the whole collection or sorts in memory
+FORBIDDEN_STAGES = {"COLLSCAN", "SORT"}
+# parts of an explain document that are not the executed plan, the echoed command contains the original $sort
+IGNORED_KEYS = {"rejectedPlans", "command", "originalCommand"}
+
+
+def find_forbidden_stages(explain: Any) -> List[str]:
+    """
+    Walk an explain document and collect forbidden stages of the winning plan.
+    """
+    found: List[str] = []
+    if isinstance(explain, dict):
+        if explain.get("stage") in FORBIDDEN_STAGES:
+            found.append(explain["stage"])
+        if "$sort" in explain:
+            # a $sort stage that was not pushed down into the query layer
+            found.append("$sort")
+        for key, value in explain.items():
+            if key in IGNORED_KEYS:
+                continue
+            found.extend(find_forbidden_stages(value))
+    elif isinstance(explain, list):
+        for value in explain:
+            found.extend(find_forbidden_stages(value))
+    return found
+
+
+async def explain_case(db, case: QueryCase) -> Dict[str, Any]:
+    if case.pipeline is not None:
+        return await db.command("aggregate", case.collection, pipeline=case.pipeline, explain=True)
+    cursor = db[case.collection].find(case.filter or {})
+    if case.sort is not None:
+        cursor = cursor.sort(case.sort)
+    return await cursor.limit(1).explain()
+
+
+async def check_query_plans(client, db_name: str) -> List[Dict[str, Any]]:
+    """
+    Apply the declared indexes to a scratch database, explain every query the app runs and report the ones that
+    fall back to a collection scan or an in-memory sort.
+    """
+    db = client.get_database(db_name)
+    await client.drop_database(db_name)
+    try:
+        for collection in INDEXES:
+            await db.create_collection(collection)
+        await apply_indexes(db)
+        results = []
+        for case in query_cases():
+            forbidden = find_forbidden_stages(await explain_case(db, case))
+            results.append({"name": case.name, "collection": case.collection, "ok": len(forbidden) == 0, "forbidden_stages": sorted(set(forbidden))})
+        return results
+    finally:
+        await client.drop_database(db_name)
@@ -0,0 +1,271 @@
+import asyncio
+import contextlib
+import gzip
+import io
+import json
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Union
+
+from pytoncenter.address import Address
+
+from app.bench import summarize
+from app.bench.ingest import bench_pair, make_event_stream
+from app.jobs.core import on_ring_success, on_tick_success, on_wind_success
+from app.jobs.leaderboard import LEADERBOARD_KEY
+from app.models.core import Pair
+from app.models.indexes import apply_indexes
+from app.providers.impl.ingestion_buffer import IngestionBuffer
+from app.providers.manager import CacheManager, DatabaseManager, TonClientManager
+
+RECORDING_FORMAT = "ticton-ingest-recording"
+RECORDING_VERSION = 1
+
+# params fields of every event kind, in the order they are stored, `tx` is stored separately
+FIELDS: Dict[str, Tuple[str, ...]] = {
+    "tick": ("watchmaker", "base_asset_price", "new_alarm_id", "created_at"),
+    "wind": ("timekeeper", "old_alarm_id", "old_remain_scale", "old_price", "new_price", "new_alarm_id", "new_remain_scale", "created_at"),
+    "ring": ("alarm_id", "created_at", "origin", "receiver", "reward"),
+}
+ADDRESS_FIELDS = {"watchmaker", "timekeeper", "origin", "receiver"}
+HANDLERS: Dict[str, Callable] = {"tick": on_tick_success, "wind": on_wind_success, "ring": on_ring_success}
+
+Event = Tuple[int, str, SimpleNamespace]
+
+
+def _raw_address(value: Any) -> Optional[str]:
+    return Address(value).to_string(False) if value is not None else None
+
+
+def encode_params(kind: str, params: Any) -> List[Any]:
+    """
+    Compact form of `OnTickSuccessParams`, `OnWindSuccessParams` or `OnRingSuccessParams`. Only the transaction fields the handlers read
+    are kept, the full transaction with its messages is what makes live params large.
+    """
+    tx = params.tx
+    # ring params without a reward leave origin and receiver empty
+    values = [_raw_address(getattr(params, f, None)) if f in ADDRESS_FIELDS else getattr(params, f) for f in FIELDS[kind]]
+    return [tx.lt, tx.now, _raw_address(tx.in_msg.source), _raw_address(tx.in_msg.destination), *values]
+
+
+def decode_params(kind: str, values: List[Any]) -> SimpleNamespace:
+    lt, now, source, destination, *fields = values
+    tx = SimpleNamespace(lt=lt, now=now, in_msg=SimpleNamespace(source=source, destination=destination))
+    return SimpleNamespace(tx=tx, **dict(zip(FIELDS[kind], fields)))
+
+
+class IngestRecorder:
+    """
+    Writes the events of one or more oracle subscriptions to a gzipped JSON lines file, in the order they are received.
+    The first line names the format, every stream starts with a line holding its pair and the oracle metadata the handlers read, and every
+    event is one array: stream, kind, the transaction fields and the params fields.
+    """
+
+    def __init__(self, path: str):
+        self.file = gzip.open(path, "wt", encoding="utf-8")
+        self.streams = 0
+        self.events = 0
+        self._write({"format": RECORDING_FORMAT, "version": RECORDING_VERSION})
+
+    def _write(self, line: Any):
+        self.file.write(json.dumps(line, separators=(",", ":")) + "\n")
+
+    def add_stream(self, pair: Pair, min_base_asset_threshold: int, base_asset_decimals: int) -> int:
+        stream = self.streams
+        self.streams += 1
+        metadata = {"min_base_asset_threshold": min_base_asset_threshold, "base_asset_decimals": base_asset_decimals}
+        self._write({"stream": stream, "pair": pair.model_dump(), "metadata": metadata})
+        return stream
+
+    def record(self, stream: int, kind: str, params: Any):
+        self._write([stream, kind, *encode_params(kind, params)])
+        self.events += 1
+
+    def handlers(self, stream: int) -> Dict[str, Callable]:
+        """
+        Callbacks for `TicTonAsyncClient.subscribe` that record the events of `stream` instead of ingesting them.
+        """
+
+        def recording(kind: str):
+            async def handler(client, params, *args, **kwargs):
+                self.record(stream, kind, params)
+
+            return handler
+
+        return {f"on_{kind}_success": recording(kind) for kind in FIELDS}
+
+    def close(self):
+        self.file.close()
+
+
+async def record_oracles(ton_clients: TonClientManager, pairs: List[Pair], path: str, events: int, duration: float, start_lt: Union[int, Literal["latest", "oldest"]]) -> Dict[str, Any]:
+    """
+    Subscribe to the oracle of every pair and record its events to `path` until `events` are recorded or `duration` seconds pass.
+    Nothing is written to the database, recording from `oldest` captures the catch-up a fresh worker goes through.
+    """
+    recorder = IngestRecorder(path)
+    done = asyncio.Event()
+    tasks: List[asyncio.Task] = []
+
+    async def subscription(pair: Pair):
+        client = await ton_clients.ticton(pair.oracle_address, background=True)
+        stream = recorder.add_stream(pair, client.metadata.min_base_asset_threshold, client.metadata.base_asset_decimals)
+
+        def counting(handler: Callable) -> Callable:
+            async def wrapper(*args, **kwargs):
+                await handler(*args, **kwargs)
+                if recorder.events >= events:
+                    done.set()
+
+            return wrapper
+
+        handlers = {name: counting(handler) for name, handler in recorder.handlers(stream).items()}
+        await client.subscribe(**handlers, start_lt=start_lt)
+
+    start = time.perf_counter()
+    try:
+        tasks = [asyncio.create_task(subscription(pair)) for pair in pairs]
+        waiter = asyncio.create_task(done.wait())
+        finished, _ = await asyncio.wait([waiter, *tasks], timeout=duration, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        for task in finished:
+            if task is not waiter and task.exception() is not None:
+                raise task.exception()  # type: ignore
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        recorder.close()
+    return {"oracles": recorder.streams, "events": recorder.events, "elapsed_s": round(time.perf_counter() - start, 3), "path": path}
+
+
+class Recording:
+    def __init__(self):
+        self.pairs: Dict[int, Pair] = {}
+        self.metadata: Dict[int, Dict[str, int]] = {}
+        self.events: List[Event] = []
+
+    def add_stream(self, pair: Pair, metadata: Dict[str, int]) -> int:
+        stream = len(self.pairs)
+        self.pairs[stream] = pair
+        self.metadata[stream] = metadata
+        return stream
+
+    def save(self, path: str):
+        recorder = IngestRecorder(path)
+        try:
+            for stream, pair in self.pairs.items():
+                recorder.add_stream(pair, **self.metadata[stream])
+            for stream, kind, params in self.events:
+                recorder.record(stream, kind, params)
+        finally:
+            recorder.close()
+
+
+def read_recording(path: str) -> Recording:
+    recording = Recording()
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != RECORDING_FORMAT or header.get("version") != RECORDING_VERSION:
+            raise Exception(f"{path} is not a version {RECORDING_VERSION} ingest recording")
+        for line in f:
+            item = json.loads(line)
+            if isinstance(item, dict):
+                recording.pairs[item["stream"]] = Pair(**item["pair"])
+                recording.metadata[item["stream"]] = item["metadata"]
+            else:
+                stream, kind, *values = item
+                recording.events.append((stream, kind, decode_params(kind, values)))
+    return recording
+
+
+def synthetic_recording(oracles: int, events: int, receivers: int, interval: float = 1.0) -> Recording:
+    """
+    Recording of the event streams `bench ingest` replays, `events` per oracle, `interval` seconds apart on chain.
+    """
+    random.seed(0)
+    kinds = {handler: kind for kind, handler in HANDLERS.items()}
+    ids = iter(range(1, oracles * events + 1))
+    recording = Recording()
+    for oracle in range(1, oracles + 1):
+        stream = recording.add_stream(bench_pair(oracle), {"min_base_asset_threshold": 10**9, "base_asset_decimals": 9})
+        recording.events.extend((stream, kinds[handler], params) for handler, params in make_event_stream(oracle, events, lambda: next(ids), receivers, interval))
+    recording.events.sort(key=lambda event: event[2].tx.now)
+    return recording
+
+
+async def _replay(recording: Recording, ingestion: IngestionBuffer, manager: DatabaseManager, speed: float) -> Dict[str, Any]:
+    handler_latency: Dict[str, List[float]] = {kind: [] for kind in HANDLERS}
+    behind: List[float] = []
+    first = min((params.tx.now for _, _, params in recording.events), default=0)
+    by_stream: Dict[int, List[Event]] = {stream: [] for stream in recording.pairs}
+    for event in recording.events:
+        by_stream[event[0]].append(event)
+
+    async def subscription(stream: int, events: List[Event]):
+        # a subscription handles its events one after another, like TicTonAsyncClient.subscribe
+        client = SimpleNamespace(metadata=SimpleNamespace(**recording.metadata[stream]))
+        pair = recording.pairs[stream]
+        for _, kind, params in events:
+            if speed > 0:
+                due = start + (params.tx.now - first) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    behind.append(-delay)
+            began = time.perf_counter()
+            await HANDLERS[kind](client, params, pair, manager=manager, ingestion=ingestion)
+            handler_latency[kind].append(time.perf_counter() - began)
+
+    start = time.perf_counter()
+    # handlers print every event, keep the output out of the measurement
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*[subscription(stream, events) for stream, events in by_stream.items()])
+        await ingestion.flush()
+    elapsed = time.perf_counter() - start
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "handler": {kind: summarize(latencies) for kind, latencies in handler_latency.items()},
+        # events that were due before the previous event of their oracle was done, replay cannot keep up at this speed
+        "behind": summarize(behind),
+    }
+
+
+async def run_replay(manager: DatabaseManager, cache: CacheManager, recording: Recording, speed: float, batch_size: int, flush_interval: float, max_pending: int) -> Dict[str, Any]:
+    """
+    Feed `recording` through the ingest handlers and the ingestion buffer into scratch databases, the collections are dropped.
+    Events are replayed `speed` times faster than they happened on chain, every oracle in its own subscription, `speed=0` replays as fast
+    as the handlers go, which is the throughput number. The write cost is the database flush time spent per event and per write.
+    """
+    for name in ["alarms", "leaderboard", "user_stats", "sync_state"]:
+        await manager.db[name].drop()
+    await apply_indexes(manager.db)
+    await cache.client.delete(LEADERBOARD_KEY)
+    ingestion = IngestionBuffer()
+    # scratch events must not reach the stream clients of a deployment sharing the redis
+    await ingestion.connect(manager, cache, batch_size=batch_size, flush_interval=flush_interval, max_pending=max_pending, publish_events=False)
+    try:
+        result = await _replay(recording, ingestion, manager, speed)
+    finally:
+        await ingestion.disconnect()
+    events = len(recording.events)
+    stats = ingestion.stats()
+    flush_seconds = ingestion.flush_latency.sum
+    try:
+        return {
+            "oracles": len(recording.pairs),
+            "events": events,
+            "speed": speed,
+            "events_per_s": round(events / result["elapsed_s"], 2) if result["elapsed_s"] > 0 else 0.0,
+            "write_ms_per_event": round(flush_seconds / events * 1000, 4) if events > 0 else 0.0,
+            "write_ms_per_write": round(flush_seconds / stats["written"] * 1000, 4) if stats["written"] > 0 else 0.0,
+            **result,
+            "alarms": await manager.db["alarms"].count_documents({}),
+            "ingestion": stats,
+        }
+    finally:
+        for name in ["alarms", "leaderboard", "user_stats", "sync_state"]:
+            await manager.db[name].drop()
+        await cache.client.delete(LEADERBOARD_KEY)
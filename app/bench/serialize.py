@@ -0,0 +1,143 @@
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.api.core import alarm_page, alarm_response_item
+from app.models.common import PageResponse
+from app.models.core import Alarm, AlarmResponse, Pair
+from app.models.queries import ALARM_VIEW_PAIR_FIELDS
+from app.utils import calculate_time_elapse, json_bytes
+
+PAIR = Pair(
+    id="bench",
+    oracle_address="0:" + "1" * 64,
+    base_asset_address="0:" + "0" * 64,
+    quote_asset_address="0:" + "2" * 64,
+    base_asset_symbol="TON",
+    quote_asset_symbol="USDT",
+    base_asset_decimals=9,
+    quote_asset_decimals=6,
+    base_asset_image_url="https://cryptologos.cc/logos/toncoin-ton-logo.svg?v=029",
+    quote_asset_image_url="https://cryptologos.cc/logos/tether-usdt-logo.svg?v=029",
+)
+
+
+def _make_docs(count: int, closed: bool) -> List[Dict[str, Any]]:
+    """
+    Alarm documents shaped like the ones the ingestion handlers write. The ages are whole days and hours so `created_since` does not
+    change between the two paths.
+    """
+    now = datetime.now()
+    docs = []
+    for i in range(count):
+        origin_remain_scale = random.randint(1, 10)
+        doc = {
+            "_id": f"{i:024x}",
+            "id": 1000 + i,
+            "address": f"0:{i:064x}",
+            "lt": 45_000_000 + i,
+            "pair_id": PAIR.id,
+            "oracle": PAIR.oracle_address,
+            "created_at": now - timedelta(days=random.randint(0, 30), hours=random.randint(1, 23)),
+            "watchmaker": f"0:{random.randrange(500):064x}",
+            "base_asset_amount": round(random.uniform(1, 10), 9),
+            "quote_asset_amount": round(random.uniform(1, 30), 6),
+            "origin_remain_scale": origin_remain_scale,
+            "remain_scale": random.randint(0, origin_remain_scale),
+            "base_asset_scale": 1,
+            "quote_asset_scale": 1,
+            "min_base_asset_threshold": 1,
+            "price": random.uniform(1, 10),
+            "status": "closed" if closed else "active",
+            "reward": random.uniform(0, 1) if closed else 0.0,
+        }
+        if closed:
+            doc["closed_at"] = now - timedelta(hours=random.randint(1, 23))
+        docs.append(doc)
+    return docs
+
+
+def validated_page(docs: List[Dict[str, Any]], closed: bool) -> bytes:
+    """
+    Body of an alarm list response the way the handlers built it before `alarm_response_item`.
+    """
+    responses = []
+    for alarm in [Alarm(**doc) for doc in docs]:
+        responses.append(
+            AlarmResponse(
+                base_asset_image_url=PAIR.base_asset_image_url,
+                quote_asset_image_url=PAIR.quote_asset_image_url,
+                base_asset_symbol=PAIR.base_asset_symbol,
+                quote_asset_symbol=PAIR.quote_asset_symbol,
+                created_since=calculate_time_elapse(alarm.created_at),
+                closed_since=calculate_time_elapse(alarm.closed_at) if closed else None,  # type: ignore
+                price=alarm.price,
+                base_asset_scale=alarm.base_asset_scale,
+                quote_asset_scale=alarm.quote_asset_scale,
+                reward=alarm.reward,
+                min_base_asset_threshold=alarm.min_base_asset_threshold,
+                arbitrage_ratio=float(alarm.origin_remain_scale - alarm.remain_scale) / alarm.origin_remain_scale,
+                watchmaker=alarm.watchmaker,
+                alarm_id=alarm.id,
+                alarm_address=alarm.address,
+                remain_scale=alarm.remain_scale,
+            )
+        )
+    return JSONResponse(content=jsonable_encoder(PageResponse[AlarmResponse](items=responses, total=len(docs), next_cursor=None))).body
+
+
+def _as_view(doc: Dict[str, Any], closed: bool) -> Dict[str, Any]:
+    """
+    The document as `alarm_view_pipeline` returns it, the join and projection run in the database and are not part of the measurement.
+    """
+    view = {field: getattr(PAIR, field) for field in ALARM_VIEW_PAIR_FIELDS}
+    view.update({field: doc[field] for field in ["id", "oracle", "created_at", "price", "base_asset_scale", "quote_asset_scale", "reward"]})
+    view.update({field: doc[field] for field in ["min_base_asset_threshold", "watchmaker", "address", "remain_scale"]})
+    view["arbitrage_ratio"] = (doc["origin_remain_scale"] - doc["remain_scale"]) / doc["origin_remain_scale"]
+    if closed:
+        view["closed_at"] = doc["closed_at"]
+    return view
+
+
+def fast_page(views: List[Dict[str, Any]], closed: bool) -> bytes:
+    return json_bytes(alarm_page([alarm_response_item(view, closed=closed) for view in views], len(views), None))
+
+
+def _per_item_us(build: Callable[[List[Dict[str, Any]], bool], bytes], docs: List[Dict[str, Any]], closed: bool, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        build(docs, closed)
+    return round((time.perf_counter() - start) / rounds / len(docs) * 1_000_000, 3)
+
+
+def run_serialize_benchmark(page_sizes: List[int], rounds: int) -> Dict[str, Any]:
+    """
+    Per-item cost of building an alarm list response body, validated path vs `alarm_response_item`.
+    Both paths must produce the same bytes for every page, the benchmark fails otherwise.
+    """
+    random.seed(0)
+    rows = []
+    for size in page_sizes:
+        for closed in [False, True]:
+            docs = _make_docs(size, closed)
+            views = [_as_view(doc, closed) for doc in docs]
+            before, after = validated_page(docs, closed), fast_page(views, closed)
+            if before != after:
+                raise AssertionError(f"page of {size} {'closed' if closed else 'active'} alarms differs:\n{before!r}\n{after!r}")
+            validated_us = _per_item_us(validated_page, docs, closed, rounds)
+            fast_us = _per_item_us(fast_page, views, closed, rounds)
+            rows.append(
+                {
+                    "page_size": size,
+                    "list": "closed" if closed else "active",
+                    "bytes": len(after),
+                    "validated_us_per_item": validated_us,
+                    "fast_us_per_item": fast_us,
+                    "speedup": round(validated_us / fast_us, 2),
+                }
+            )
+    return {"rounds": rounds, "results": rows}
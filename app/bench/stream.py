@@ -0,0 +1,126 @@
+import asyncio
+import json
+import resource
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import uvicorn
+import websockets
+from fastapi import FastAPI
+from pytoncenter.address import Address
+
+from app.api.stream import StreamRouter
+from app.bench import LoopMonitor, summarize
+from app.jobs.events import ALARM_CHANNEL, PRICE_CHANNEL, encode_event, event_matches
+from app.providers import get_event_hub
+from app.providers.manager import CacheManager
+
+Filter = Tuple[Optional[str], Optional[str]]
+
+
+def _watchmaker(i: int) -> str:
+    return Address(f"0:{i:064x}").to_string(False)
+
+
+def _filters(clients: int, pairs: int, watchmakers: int) -> List[Filter]:
+    """
+    Half of the clients follow a pair, the other half a watchmaker, like the alarm list and the wallet pages.
+    """
+    return [(f"bench-{i % pairs}", None) if i % 2 == 0 else (None, _watchmaker(i % watchmakers)) for i in range(clients)]
+
+
+def _raise_open_files_limit(clients: int):
+    # every client holds two sockets in this process, the client side and the server side
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = clients * 2 + 256
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(wanted, hard), hard))
+
+
+async def _start_server(port: int) -> Tuple[uvicorn.Server, asyncio.Task]:
+    app = FastAPI()
+    app.include_router(StreamRouter)
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, lifespan="off", log_level="warning", ws_max_queue=1024)
+    server = uvicorn.Server(config)
+    server.install_signal_handlers = lambda: None  # type: ignore
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def _client(uri: str, latencies: List[float], connected: asyncio.Semaphore, ready: List[Any]):
+    async with connected:
+        socket = await websockets.connect(uri, open_timeout=30, max_queue=None)
+    ready.append(socket)
+    try:
+        async for message in socket:
+            latencies.append(time.time() - json.loads(message)["ts"])
+    except websockets.ConnectionClosed:
+        pass
+
+
+async def run_stream_benchmark(cache: CacheManager, clients: int, pairs: int, watchmakers: int, events: int, rate: float, port: int) -> Dict[str, Any]:
+    """
+    Connect `clients` local WebSocket clients to `/stream/ws`, publish `events` alarm events on redis at `rate` per second and measure
+    the time from publishing an event to a client receiving it. Clients and server share the event loop, so the latencies include the
+    cost of the clients and are an upper bound of what the server adds.
+    """
+    _raise_open_files_limit(clients)
+    hub = await get_event_hub()
+    await hub.connect(cache=cache, queue_size=100)
+    server, server_task = await _start_server(port)
+    filters = _filters(clients, pairs, watchmakers)
+    latencies: List[float] = []
+    sockets: List[Any] = []
+    connecting = asyncio.Semaphore(200)
+    tasks = []
+    try:
+        start = time.perf_counter()
+        for pair_id, watchmaker in filters:
+            query = f"pair_id={pair_id}" if pair_id is not None else f"address={watchmaker}"
+            tasks.append(asyncio.create_task(_client(f"ws://127.0.0.1:{port}/stream/ws?{query}", latencies, connecting, sockets)))
+        while hub.stats()["subscriptions"] < clients:
+            failed = [t for t in tasks if t.done() and t.exception() is not None]
+            if len(failed) > 0:
+                raise failed[0].exception()  # type: ignore
+            await asyncio.sleep(0.05)
+        connect_seconds = time.perf_counter() - start
+
+        published = [{"type": "alarm", "event": "tick", "pair_id": f"bench-{n % pairs}", "alarm_id": n, "watchmaker": _watchmaker(n % watchmakers)} for n in range(events)]
+        expected = sum(1 for event in published for pair_id, watchmaker in filters if event_matches(event, pair_id, watchmaker))
+        monitor = LoopMonitor()
+        monitor.start()
+        start = time.perf_counter()
+        for n, event in enumerate(published):
+            await cache.client.publish(ALARM_CHANNEL, encode_event({**event, "ts": time.time()}))
+            # paced from the start so the publish time does not slow the rate down
+            await asyncio.sleep(max(0.0, start + (n + 1) / rate - time.perf_counter()))
+        deadline = time.perf_counter() + 10.0
+        while len(latencies) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        publish_seconds = time.perf_counter() - start
+        await monitor.stop()
+
+        subscriptions = await cache.client.pubsub_numsub(PRICE_CHANNEL, ALARM_CHANNEL)
+        stats = hub.stats()
+        return {
+            "clients": clients,
+            "events": events,
+            "connect_seconds": round(connect_seconds, 3),
+            "events_per_second": round(events / publish_seconds, 1),
+            "expected_deliveries": expected,
+            "received": len(latencies),
+            "dropped": stats["dropped"],
+            "latency": summarize(latencies),
+            "loop": monitor.report(),
+            "redis_subscriptions": {(k.decode() if isinstance(k, bytes) else k): v for k, v in subscriptions},
+        }
+    finally:
+        await asyncio.gather(*(socket.close() for socket in sockets), return_exceptions=True)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        server.should_exit = True
+        await server_task
+        await hub.disconnect()
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from app.jobs.price import fetch_price, fetch_prices
+
+
+class SimulatedExchange:
+    """
+    Stand-in for a ccxt exchange: every request takes `latency` seconds and requests are spaced by `rate_limit` seconds, like ccxt's throttler.
+    """
+
+    def __init__(self, name: str, symbols: List[str], latency: float, rate_limit: float, batched: bool):
+        self.name = name
+        self.markets = {symbol: {} for symbol in symbols}
+        self.has = {"fetchTickers": batched}
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self._lock = asyncio.Lock()
+        self._last_request = 0.0
+
+    async def _request(self):
+        async with self._lock:
+            wait = self._last_request + self.rate_limit - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_request = time.perf_counter()
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+
+    async def fetch_ticker(self, symbol: str):
+        await self._request()
+        return {"symbol": symbol, "last": 1.0}
+
+    async def fetch_tickers(self, symbols: List[str]):
+        await self._request()
+        return {symbol: {"symbol": symbol, "last": 1.0} for symbol in symbols}
+
+
+async def _measure(mode: str, pairs: int, exchanges: int, latency: float, rate_limit: float, max_concurrency: int) -> Dict[str, Any]:
+    symbols = [f"T{i}/USDT" for i in range(pairs)]
+    venues = [SimulatedExchange(f"venue{i}", symbols, latency, rate_limit, batched=mode == "batched") for i in range(exchanges)]
+    start = time.perf_counter()
+    if mode == "per_symbol":
+        await asyncio.gather(*[fetch_price(venue, symbol) for venue in venues for symbol in symbols])  # type: ignore
+    else:
+        await asyncio.gather(*[fetch_prices(venue, symbols, max_concurrency) for venue in venues])  # type: ignore
+    return {"cycle_ms": round((time.perf_counter() - start) * 1000, 3), "requests": sum(venue.requests for venue in venues)}
+
+
+async def run_ticker_benchmark(pair_counts: List[int], exchanges: int, latency: float, rate_limit: float, max_concurrency: int) -> Dict[str, Any]:
+    """
+    Cycle time of one polling round as the number of pairs grows.
+    `per_symbol` is the old one-request-per-pair poller, `batched` uses fetch_tickers and `fallback` is the capped single-fetch path.
+    """
+    rows = []
+    for pairs in pair_counts:
+        row: Dict[str, Any] = {"pairs": pairs}
+        for mode in ["per_symbol", "batched", "fallback"]:
+            row[mode] = await _measure(mode, pairs, exchanges, latency, rate_limit, max_concurrency)
+        rows.append(row)
+    return {"exchanges": exchanges, "latency_ms": latency * 1000, "rate_limit_ms": rate_limit * 1000, "max_concurrency": max_concurrency, "results": rows}
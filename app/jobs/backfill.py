@@ -0,0 +1,145 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict, List, Literal, Optional, Tuple, Union
+
+from pytoncenter.address import Address
+from pytoncenter.extension.message import JettonMessage
+from pytoncenter.utils import get_opcode
+from pytoncenter.v3.models import GetTransactionsRequest, Transaction
+from ticton import TicTonAsyncClient
+from ticton.callbacks import handle_chime, handle_chronoshift, handle_noop, handle_notification
+from ticton.parser import TicTonMessage
+from tonpy import CellSlice
+
+from app.jobs.core import get_start_lt, on_ring_success, on_tick_success, on_wind_success
+from app.models.core import Pair
+from app.providers import get_ton_clients
+from app.providers.manager import DatabaseManager, IngestionManager
+
+# same opcode -> handler table as TicTonAsyncClient.subscribe
+CALLBACKS = {
+    JettonMessage.TransferNotification.OPCODE: handle_notification,
+    TicTonMessage.Chronoshift.OPCODE: handle_chronoshift,
+    TicTonMessage.Chime.OPCODE: handle_chime,
+}
+# largest page toncenter accepts
+PAGE_SIZE = 256
+
+
+def split_lt_range(start_lt: int, end_lt: int, parts: int) -> List[Tuple[int, int]]:
+    """
+    Split the inclusive range [start_lt, end_lt] into at most `parts` contiguous inclusive ranges.
+    """
+    step = max(1, -(-(end_lt - start_lt + 1) // parts))
+    return [(lo, min(lo + step - 1, end_lt)) for lo in range(start_lt, end_lt + 1, step)]
+
+
+async def get_lt_bounds(client: TicTonAsyncClient, start_lt: Union[int, Literal["oldest"]]) -> Optional[Tuple[int, int]]:
+    """
+    Range of lt left to process, from `start_lt` to the newest transaction of the oracle. None when the oracle is up to date.
+    """
+    account = client.oracle.to_string(True)
+    latest, _ = await client.toncenter.get_transactions(GetTransactionsRequest(account=account, limit=1, sort="desc"))
+    if len(latest) == 0:
+        return None
+    if start_lt == "oldest":
+        oldest, _ = await client.toncenter.get_transactions(GetTransactionsRequest(account=account, limit=1, sort="asc"))
+        start_lt = oldest[0].lt
+    if start_lt > latest[0].lt:
+        return None
+    return start_lt, latest[0].lt
+
+
+async def fetch_range(client: TicTonAsyncClient, start_lt: int, end_lt: int) -> List[Transaction]:
+    """
+    Every transaction of the oracle with start_lt <= lt <= end_lt, oldest first.
+    """
+    txs: List[Transaction] = []
+    while True:
+        page, _ = await client.toncenter.get_transactions(GetTransactionsRequest(account=client.oracle.to_string(True), start_lt=start_lt, end_lt=end_lt, limit=PAGE_SIZE, offset=len(txs), sort="asc"))
+        txs.extend(page)
+        if len(page) < PAGE_SIZE:
+            return txs
+
+
+async def dispatch_transaction(client: TicTonAsyncClient, tx: Transaction, **kwargs):
+    """
+    Run the handler of one transaction, like one iteration of TicTonAsyncClient.subscribe.
+    """
+    try:
+        msg = tx.in_msg
+        if msg.message_content is None:
+            return
+        cs = CellSlice(msg.message_content.body)
+        opcode = get_opcode(cs.preload_uint(32))
+        if opcode == "0x00000000":  # Comment Message
+            return
+        await CALLBACKS.get(opcode, handle_noop)(
+            ticton_client=client,
+            body=cs,
+            tx=tx,
+            on_tick_success=on_tick_success,
+            on_wind_success=on_wind_success,
+            on_ring_success=on_ring_success,
+            **kwargs,
+        )
+    except Exception as e:
+        client.logger.debug(e)
+
+
+async def backfill_oracle(client: TicTonAsyncClient, pair_info: Pair, manager: DatabaseManager, ingestion: IngestionManager, workers: asyncio.Semaphore, ranges: int, window: int) -> int:
+    """
+    Process the history of one oracle from its sync checkpoint.
+    The history is split into `ranges` lt ranges, up to `window` of them are fetched ahead while the oldest one is processed.
+    Ranges are processed in lt order because wind and ring events refer to alarms of earlier events, the checkpoint is moved to the end
+    of every processed range.
+    """
+    bounds = await get_lt_bounds(client, await get_start_lt(manager, pair_info))
+    if bounds is None:
+        return 0
+    oracle = Address(pair_info.oracle_address).to_string(False)
+
+    async def fetch(start_lt: int, end_lt: int) -> List[Transaction]:
+        async with workers:
+            return await fetch_range(client, start_lt, end_lt)
+
+    parts = iter(split_lt_range(bounds[0], bounds[1], ranges))
+    pending: Deque[Tuple[int, asyncio.Task]] = deque()
+    processed = 0
+    try:
+        for start_lt, end_lt in parts:
+            pending.append((end_lt, asyncio.create_task(fetch(start_lt, end_lt))))
+            if len(pending) >= window:
+                break
+        while len(pending) > 0:
+            end_lt, task = pending.popleft()
+            txs = await task
+            part = next(parts, None)
+            if part is not None:
+                pending.append((part[1], asyncio.create_task(fetch(*part))))
+            for tx in txs:
+                await dispatch_transaction(client, tx, manager=manager, ingestion=ingestion, pair_info=pair_info)
+            await ingestion.checkpoint(oracle, end_lt)
+            processed += len(txs)
+    finally:
+        for _, task in pending:
+            task.cancel()
+    return processed
+
+
+async def backfill(pairs: List[Pair], manager: DatabaseManager, ingestion: IngestionManager, workers: int, ranges: int) -> Dict[str, int]:
+    """
+    Backfill every pair concurrently, `workers` bounds the number of range fetches in flight across all oracles.
+    Live subscriptions resume from the checkpoints, run it while no `start` or `worker` process is running so events are not processed twice.
+    Requests go through the background toncenter client of the pool, so the shared rate limit still applies.
+    """
+    semaphore = asyncio.Semaphore(workers)
+    clients = await get_ton_clients()
+
+    async def one(pair: Pair) -> int:
+        client = await clients.ticton(pair.oracle_address, background=True)
+        return await backfill_oracle(client, pair, manager, ingestion, semaphore, ranges, window=workers)
+
+    processed = await asyncio.gather(*[one(pair) for pair in pairs])
+    await ingestion.flush()
+    return {pair.oracle_address: count for pair, count in zip(pairs, processed)}
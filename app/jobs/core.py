@@ -3,21 +3,34 @@ from hmac import new
 from operator import ne
 from pydoc import cli
 import time
+from functools import partial
+from typing import Awaitable, Callable, Dict, Literal, Union
 
 from pytz import utc
 import pytz
-from app.providers import get_cache, get_db, get_scheduler
-from app.providers.manager import CacheManager, DatabaseManager, ScheduleManager
+from app.providers import get_db, get_ingestion, get_pair_registry, get_scheduler, get_ton_clients
+from app.providers.manager import DatabaseManager, IngestionManager, PairRegistryManager, ScheduleManager
+from app.jobs.events import ALARM_CHANNEL, alarm_event
 from app.models.core import Alarm
 from ticton import TicTonAsyncClient
 from pytoncenter.address import Address
 from datetime import datetime, timedelta
 from ticton.callbacks import OnTickSuccessParams, OnRingSuccessParams, OnWindSuccessParams
 from app.models.core import Pair
+from app.models.queries import LATEST_ALARM_SORT, latest_alarm_of_oracle_filter, sync_state_filter
 from app.settings import Settings
+from app.utils.metrics import INGESTION_LAG, REGISTRY
 from apscheduler.schedulers.base import BaseScheduler
 
 
+def observe_ingestion_lag(oracle: str, tx_now: int):
+    """
+    Record how far the subscription of `oracle` runs behind the chain, from the time of the transaction to the event being processed.
+    """
+    if REGISTRY.enabled:
+        INGESTION_LAG.labels(oracle).observe(max(0.0, time.time() - tx_now))
+
+
 async def on_tick_success(client: TicTonAsyncClient, params: OnTickSuccessParams, pair_info: Pair, **kwargs):
     """
     Wait for tick success and check the alarm id is exists.
@@ -25,7 +38,7 @@ async def on_tick_success(client: TicTonAsyncClient, params: OnTickSuccessParams
     - Update the position status to "active".
     """
     try:
-        manager: DatabaseManager = kwargs["manager"]
+        ingestion: IngestionManager = kwargs["ingestion"]
 
         # Put Alarm data to DB
         alarm = Alarm(
@@ -48,20 +61,19 @@ async def on_tick_success(client: TicTonAsyncClient, params: OnTickSuccessParams
             reward=0.0,
             price=params.base_asset_price,
         )
-        result = manager.db["alarms"].update_one(
-            {"id": params.new_alarm_id},
-            {"$set": alarm.model_dump()},
-            upsert=True,
-        )
-        if result.acknowledged:
-            print(
-                "Tick Success | {ts} | {symbol} | alarm #{alarm_id} | price: {price}".format(
-                    ts=datetime.fromtimestamp(params.tx.now, tz=utc).astimezone(pytz.timezone("Asia/Taipei")).isoformat(),
-                    symbol=f"{pair_info.base_asset_symbol}/{pair_info.quote_asset_symbol}",
-                    alarm_id=params.new_alarm_id,
-                    price=params.base_asset_price,
-                )
+        await ingestion.upsert_alarm(alarm.model_dump())
+        await ingestion.add_user_stats(alarm.watchmaker, {"active": 1, "ticks": 1})
+        await ingestion.checkpoint(alarm.oracle, params.tx.lt)
+        observe_ingestion_lag(alarm.oracle, params.tx.now)
+        await ingestion.publish(ALARM_CHANNEL, alarm_event("tick", alarm.model_dump(), status=alarm.status, price=alarm.price, remain_scale=alarm.remain_scale))
+        print(
+            "Tick Success | {ts} | {symbol} | alarm #{alarm_id} | price: {price}".format(
+                ts=datetime.fromtimestamp(params.tx.now, tz=utc).astimezone(pytz.timezone("Asia/Taipei")).isoformat(),
+                symbol=f"{pair_info.base_asset_symbol}/{pair_info.quote_asset_symbol}",
+                alarm_id=params.new_alarm_id,
+                price=params.base_asset_price,
             )
+        )
     except Exception as e:
         import traceback
 
@@ -77,26 +89,25 @@ async def on_ring_success(client: TicTonAsyncClient, params: OnRingSuccessParams
     - Update leader board.
     """
     try:
-        manager: DatabaseManager = kwargs["manager"]
+        ingestion: IngestionManager = kwargs["ingestion"]
+        oracle = Address(pair_info.oracle_address).to_string(False)
         # check if alarm is exists
-        alarm = manager.db["alarms"].find_one({"id": params.alarm_id})
+        alarm = await ingestion.find_alarm(oracle, params.alarm_id)
         if alarm is None:
             raise Exception("on_ring_success: Alarm does not exist")
         else:
             # Update the alarm status to "closed" and update the reward.
             close_at = datetime.fromtimestamp(params.created_at)
-            manager.db["alarms"].update_one(
-                {"id": params.alarm_id},
-                {"$set": {"status": "closed", "reward": params.reward, "closed_at": close_at}},
-            )
-        # Update leader board
+            await ingestion.update_alarm(oracle, params.alarm_id, {"status": "closed", "reward": params.reward, "closed_at": close_at})
+            await ingestion.add_user_stats(alarm["watchmaker"], {"active": -1, "closed": 1})
+            await ingestion.publish(ALARM_CHANNEL, alarm_event("ring", alarm, status="closed", reward=params.reward))
+        # Update leader board, the buffer updates the collection and the sorted set together
         if params.receiver is not None and params.reward > 0:
             wallet_address = Address(params.receiver).to_string(False)
-            manager.db["leaderboard"].update_one(
-                {"address": wallet_address},
-                {"$inc": {"reward": params.reward}},
-                upsert=True,
-            )
+            await ingestion.add_reward(wallet_address, params.reward)
+            await ingestion.add_user_stats(wallet_address, {"reward": params.reward})
+        await ingestion.checkpoint(oracle, params.tx.lt)
+        observe_ingestion_lag(oracle, params.tx.now)
 
         print(
             "Ring Success | {ts} | {symbol} | alarm #{alarm_id} | reward: {reward}".format(
@@ -121,9 +132,10 @@ async def on_wind_success(client: TicTonAsyncClient, params: OnWindSuccessParams
     - Update the remain scale of the alarm.
     """
     try:
-        manager: DatabaseManager = kwargs["manager"]
+        ingestion: IngestionManager = kwargs["ingestion"]
+        oracle = Address(pair_info.oracle_address).to_string(False)
 
-        old_alarm_raw = manager.db["alarms"].find_one({"id": params.old_alarm_id})
+        old_alarm_raw = await ingestion.find_alarm(oracle, params.old_alarm_id)
         if old_alarm_raw is None:
             raise Exception("Old alarm does not exist")
         old_alarm = Alarm(**old_alarm_raw)
@@ -134,7 +146,7 @@ async def on_wind_success(client: TicTonAsyncClient, params: OnWindSuccessParams
             address=Address(params.tx.in_msg.source).to_string(False),  # type: ignore
             lt=params.tx.lt,
             pair_id=pair_info.id,
-            oracle=Address(pair_info.oracle_address).to_string(False),
+            oracle=oracle,
             created_at=datetime.fromtimestamp(params.created_at, tz=utc),
             closed_at=None,
             price=params.new_price,
@@ -151,24 +163,20 @@ async def on_wind_success(client: TicTonAsyncClient, params: OnWindSuccessParams
         )
 
         # upsert new alarm
-        manager.db["alarms"].update_one(
-            {"id": params.new_alarm_id},
-            {"$set": new_alarm.model_dump()},
-            upsert=True,
-        )
+        await ingestion.upsert_alarm(new_alarm.model_dump())
+        await ingestion.add_user_stats(new_alarm.watchmaker, {"active": 1, "winds": 1})
 
         if params.old_remain_scale == 0:
             # update the old alarm status to "emptied" and remain scale
-            manager.db["alarms"].update_one(
-                {"id": params.old_alarm_id},
-                {"$set": {"status": "emptied", "remain_scale": 0}},
-            )
+            old_fields = {"status": "emptied", "remain_scale": 0}
         else:
             # update the old alarm remain scale
-            manager.db["alarms"].update_one(
-                {"id": params.old_alarm_id},
-                {"$set": {"remain_scale": params.old_remain_scale}},
-            )
+            old_fields = {"remain_scale": params.old_remain_scale}
+        await ingestion.update_alarm(oracle, params.old_alarm_id, old_fields)
+        await ingestion.checkpoint(new_alarm.oracle, params.tx.lt)
+        observe_ingestion_lag(new_alarm.oracle, params.tx.now)
+        await ingestion.publish(ALARM_CHANNEL, alarm_event("wind", old_alarm_raw, **old_fields))
+        await ingestion.publish(ALARM_CHANNEL, alarm_event("wind", new_alarm.model_dump(), status=new_alarm.status, price=new_alarm.price, remain_scale=new_alarm.remain_scale))
 
         print(
             "Wind Success | {ts} | {symbol} | old alarm #{old_alarm_id} | old price {old_price} | new alarm #{new_alarm_id} | new price {new_price} | arbitrage ratio {arbitrage_ratio}".format(
@@ -188,49 +196,52 @@ async def on_wind_success(client: TicTonAsyncClient, params: OnWindSuccessParams
         print(traceback.format_exc())
 
 
-async def subscribe_oracle(client: TicTonAsyncClient, **kwargs):
+async def get_start_lt(manager: DatabaseManager, pair_info: Pair) -> Union[int, Literal["oldest"]]:
+    """
+    First lt that has not been processed for the oracle of `pair_info`.
+    The sync checkpoint is the last processed lt, oracles without one resume after their newest alarm, which the user stats already count, or replay from the oldest transaction.
+    """
+    state = await manager.db["sync_state"].find_one(sync_state_filter(Address(pair_info.oracle_address).to_string(False)))
+    if state is not None:
+        return state["lt"] + 1
+    last_record = manager.db["alarms"].find(latest_alarm_of_oracle_filter(pair_info.oracle_address)).sort(LATEST_ALARM_SORT).limit(1)
+    last_record = [Alarm(**i) async for i in last_record]
+    if len(last_record) == 1:
+        return last_record[0].lt + 1
+    return "oldest"
+
+
+async def subscribe_oracle(oracle_address: str, **kwargs):
     """
-    Subscribe to oracle address.
+    Subscribe to oracle address, runs until cancelled.
+    The client comes from the process-wide pool and its requests yield to API requests.
     """
+    client = await (await get_ton_clients()).ticton(oracle_address, background=True)
     manager = await get_db()
-    pair_info_raw = manager.db["pairs"].find_one({"oracle_address": client.oracle.to_string(False)})
-    if pair_info_raw is None:
+    ingestion = await get_ingestion()
+    registry = await get_pair_registry()
+    pair_info = await registry.get_by_oracle(client.oracle.to_string(False))
+    if pair_info is None:
         raise Exception("subscribe_oracle: Pair does not exist")
-    pair_info = Pair(**pair_info_raw)
-    last_record = manager.db["alarms"].find({"oracle": pair_info.oracle_address}).sort({"created_at": -1}).limit(1)
-    start_lt = "oldest"
-    last_record = [Alarm(**i) for i in last_record]
-    if len(last_record) == 1:
-        start_lt = last_record[0].lt
-    await client.subscribe(
-        on_tick_success=on_tick_success,  # type: ignore
-        on_ring_success=on_ring_success,  # type: ignore
-        on_wind_success=on_wind_success,  # type: ignore
-        start_lt=start_lt,
-        manager=manager,
-        pair_info=pair_info,
-        **kwargs,
-    )
-
-
-async def init_subscriptions(db: DatabaseManager, scheduler: ScheduleManager):
+    start_lt = await get_start_lt(manager, pair_info)
+    try:
+        await client.subscribe(
+            on_tick_success=on_tick_success,  # type: ignore
+            on_ring_success=on_ring_success,  # type: ignore
+            on_wind_success=on_wind_success,  # type: ignore
+            start_lt=start_lt,
+            manager=manager,
+            ingestion=ingestion,
+            pair_info=pair_info,
+            **kwargs,
+        )
+    finally:
+        # write the processed events and their checkpoint before the lease is released, the next owner resumes from the checkpoint
+        await ingestion.flush()
+
+
+async def subscription_units(registry: PairRegistryManager) -> Dict[str, Callable[[], Awaitable[None]]]:
     """
-    Initialize the background jobs.
+    Subscription of every pair, keyed like the scheduler jobs they replace. Run by the lease coordinator so each oracle has one subscriber.
     """
-    # get pairs from db
-    pairs = db.db["pairs"].find()
-    pairs = [Pair(**i) for i in pairs]
-
-    # subscribe to oracle address
-    for pair in pairs:
-        if scheduler.scheduler.get_job(f"subscribe_oracle_{pair.oracle_address}") is None:
-            client = await TicTonAsyncClient.init(oracle_addr=pair.oracle_address)
-            scheduler.scheduler.add_job(
-                subscribe_oracle,
-                "date",
-                next_run_time=datetime.now() + timedelta(seconds=5),
-                kwargs={"client": client},
-                id=f"subscribe_oracle_{pair.oracle_address}",
-                name=f"subscribe_oracle_{pair.oracle_address}",
-                replace_existing=True,
-            )
+    return {f"subscribe_oracle_{pair.oracle_address}": partial(subscribe_oracle, pair.oracle_address) for pair in await registry.list()}
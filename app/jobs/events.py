@@ -0,0 +1,46 @@
+import json
+import time
+from typing import Any, Dict, Literal, Optional
+
+from app.models.core import PriceFeed
+
+# Price feeds and alarm changes are published on these redis channels, the API fans them out to stream clients.
+PRICE_CHANNEL = "events$price"
+ALARM_CHANNEL = "events$alarm"
+
+AlarmEventKind = Literal["tick", "wind", "ring"]
+
+
+def encode_event(event: Dict[str, Any]) -> str:
+    return json.dumps(event, separators=(",", ":"))
+
+
+def price_event(pair_id: str, feed: PriceFeed) -> Dict[str, Any]:
+    return {"type": "price", "pair_id": pair_id, "symbol": feed.symbol, "source": feed.source, "price": feed.price, "ts": feed.last_updated_at.timestamp()}
+
+
+def alarm_event(kind: AlarmEventKind, alarm: Dict[str, Any], **fields) -> Dict[str, Any]:
+    """
+    Change of one alarm, `fields` are the fields the event changed. Clients refetch the alarm lists for anything else.
+    """
+    return {
+        "type": "alarm",
+        "event": kind,
+        "pair_id": alarm["pair_id"],
+        "alarm_id": alarm["id"],
+        "watchmaker": alarm["watchmaker"],
+        **fields,
+        "ts": time.time(),
+    }
+
+
+def event_matches(event: Dict[str, Any], pair_id: Optional[str], watchmaker: Optional[str]) -> bool:
+    """
+    Whether a stream filtered by `pair_id` and `watchmaker` receives `event`, unset filters match everything.
+    Price events have no watchmaker, so a stream filtered by watchmaker only receives alarm events.
+    """
+    if pair_id is not None and event.get("pair_id") != pair_id:
+        return False
+    if watchmaker is not None and event.get("watchmaker") != watchmaker:
+        return False
+    return True
@@ -0,0 +1,131 @@
+import json
+from datetime import datetime
+from typing import Dict, List, Literal
+
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.commands.core import AsyncScript
+
+from app.models.core import PriceFeed, PricePoint
+from app.settings import Settings
+
+Resolution = Literal["raw", "1m", "5m", "1h"]
+
+# bucket width in seconds of every rollup resolution
+ROLLUPS: Dict[str, int] = {"1m": 60, "5m": 300, "1h": 3600}
+
+# Merge one price into the OHLC bucket stored at KEYS[1][ARGV[1]] and index the bucket in KEYS[2],
+# then drop the buckets older than ARGV[4] so the series stays bounded.
+UPDATE_ROLLUP_SCRIPT = """
+local price = tonumber(ARGV[3])
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+local bucket = {o = price, h = price, l = price, c = price, n = 1}
+if current then
+    local prev = cjson.decode(current)
+    bucket.o = prev.o
+    bucket.h = math.max(prev.h, price)
+    bucket.l = math.min(prev.l, price)
+    bucket.n = prev.n + 1
+end
+redis.call('HSET', KEYS[1], ARGV[1], cjson.encode(bucket))
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', '(' .. ARGV[4])
+if #expired > 0 then
+    redis.call('HDEL', KEYS[1], unpack(expired))
+    redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', '(' .. ARGV[4])
+end
+return bucket.n
+"""
+# built without a client, it only ever runs on the pipeline of the caller, which loads it into redis when missing
+UPDATE_ROLLUP = AsyncScript(None, UPDATE_ROLLUP_SCRIPT.encode())  # type: ignore
+
+
+def raw_history_key(symbol: str) -> str:
+    return f"price_history$raw${symbol}"
+
+
+def rollup_key(resolution: str, symbol: str) -> str:
+    return f"price_history${resolution}${symbol}"
+
+
+def rollup_index_key(resolution: str, symbol: str) -> str:
+    return f"price_history_index${resolution}${symbol}"
+
+
+def retention_of(resolution: Resolution, settings: Settings) -> int:
+    return {
+        "raw": settings.TICTON_PRICE_HISTORY_RAW_RETENTION,
+        "1m": settings.TICTON_PRICE_HISTORY_1M_RETENTION,
+        "5m": settings.TICTON_PRICE_HISTORY_5M_RETENTION,
+        "1h": settings.TICTON_PRICE_HISTORY_1H_RETENTION,
+    }[resolution]
+
+
+async def record_price_history(pipe: Pipeline, feeds: List[PriceFeed], settings: Settings):
+    """
+    Queue the commands that append `feeds` to the raw series and fold them into every rollup.
+    Nothing is sent until the caller executes `pipe`, so history costs no extra round trip.
+    """
+    now = datetime.now().timestamp()
+    for feed in feeds:
+        ts = feed.last_updated_at.timestamp()
+        member = json.dumps({"source": feed.source, "price": feed.price, "ts": ts}, separators=(",", ":"))
+        pipe.zadd(raw_history_key(feed.symbol), {member: ts})
+        for resolution, width in ROLLUPS.items():
+            bucket = int(ts // width * width)
+            await UPDATE_ROLLUP(
+                keys=[rollup_key(resolution, feed.symbol), rollup_index_key(resolution, feed.symbol)],
+                args=[f"{feed.source}${bucket}", bucket, feed.price, now - retention_of(resolution, settings)],  # type: ignore
+                client=pipe,
+            )
+    for symbol in set(feed.symbol for feed in feeds):
+        pipe.zremrangebyscore(raw_history_key(symbol), "-inf", f"({now - retention_of('raw', settings)}")
+
+
+async def get_price_history(client: Redis, symbol: str, resolution: Resolution, start: datetime, end: datetime) -> List[PricePoint]:
+    """
+    Read the points of `symbol` between `start` and `end`, rollups are served as pre-aggregated OHLC buckets.
+    """
+    if resolution == "raw":
+        members = await client.zrangebyscore(raw_history_key(symbol), start.timestamp(), end.timestamp())
+        points = []
+        for member in members:
+            raw = json.loads(member)
+            points.append(
+                PricePoint(
+                    source=raw["source"],
+                    symbol=symbol,
+                    timestamp=datetime.fromtimestamp(raw["ts"]),
+                    open=raw["price"],
+                    high=raw["price"],
+                    low=raw["price"],
+                    close=raw["price"],
+                    count=1,
+                )
+            )
+        return points
+
+    width = ROLLUPS[resolution]
+    fields = await client.zrangebyscore(rollup_index_key(resolution, symbol), int(start.timestamp() // width * width), end.timestamp())
+    if len(fields) == 0:
+        return []
+    values = await client.hmget(rollup_key(resolution, symbol), fields)  # type: ignore
+    points = []
+    for field, value in zip(fields, values):
+        if value is None:
+            continue
+        source, bucket = field.decode().rsplit("$", 1)
+        ohlc = json.loads(value)
+        points.append(
+            PricePoint(
+                source=source,
+                symbol=symbol,
+                timestamp=datetime.fromtimestamp(int(bucket)),
+                open=ohlc["o"],
+                high=ohlc["h"],
+                low=ohlc["l"],
+                close=ohlc["c"],
+                count=ohlc["n"],
+            )
+        )
+    return points
@@ -0,0 +1,50 @@
+import json
+import time
+from typing import Any, Dict, Optional
+
+from pytoncenter import AsyncTonCenterClientV3
+from pytoncenter.address import Address
+from pytoncenter.v3.models import GetSpecifiedJettonWalletRequest
+
+from app.providers.manager import CacheManager
+from app.utils.single_flight import SingleFlight
+
+# jetton paid out by rings, `/asset/reward` reports its balance
+REWARD_JETTON_ADDRESS = "0:903d8c69172157c484a203f738db0358af3706736f4d7051eaaeea434e54f76b"
+
+_lookups = SingleFlight()
+
+
+def jetton_wallet_key(owner: str) -> str:
+    """
+    Hash of jetton master -> cached jetton wallet of `owner`, one key per owner so a payout drops every cached wallet of the owner at once.
+    """
+    return f"jetton_wallet${Address(owner).to_string(False)}"
+
+
+async def get_cached_jetton_wallet(cache: CacheManager, toncenter: AsyncTonCenterClientV3, owner: str, jetton_master: str, ttl: int = 30, negative_ttl: int = 10) -> Optional[Dict[str, Any]]:
+    """
+    Jetton wallet of `owner` for `jetton_master`, None when the owner has no wallet.
+    Wallets are cached for `ttl` seconds and missing wallets for `negative_ttl` seconds, concurrent lookups of the same wallet share one
+    toncenter request.
+    """
+    owner = Address(owner).to_string(False)
+    jetton_master = Address(jetton_master).to_string(False)
+    key = jetton_wallet_key(owner)
+    cached = await cache.client.hget(key, jetton_master)  # type: ignore
+    if cached is not None:
+        entry = json.loads(cached)
+        if entry["expires_at"] > time.time():
+            return entry["wallet"]
+
+    async def lookup() -> Optional[Dict[str, Any]]:
+        wallet = await toncenter.get_jetton_wallets(GetSpecifiedJettonWalletRequest(owner_address=owner, jetton_address=jetton_master))
+        result = wallet.model_dump() if wallet is not None else None
+        expires_at = time.time() + (ttl if result is not None else negative_ttl)
+        pipe = cache.client.pipeline(transaction=False)
+        pipe.hset(key, jetton_master, json.dumps({"wallet": result, "expires_at": expires_at}))
+        pipe.expire(key, max(ttl, negative_ttl))
+        await pipe.execute()
+        return result
+
+    return await _lookups.do((owner, jetton_master), lookup)
@@ -0,0 +1,65 @@
+from typing import List, Optional, Tuple
+
+from app.providers.manager import CacheManager, DatabaseManager
+
+# sorted set of address -> total reward, kept next to the `leaderboard` collection so rank and top N are O(log n)
+# rewards are added by the ingestion buffer, see `app.providers.impl.ingestion_buffer`
+LEADERBOARD_KEY = "leaderboard$rewards"
+SEED_LOCK_KEY = "leaderboard$seed"
+SEED_LOCK_TIMEOUT = 600
+
+
+async def get_top_records(cache: CacheManager, limit: int) -> List[Tuple[str, float]]:
+    records = await cache.client.zrevrange(LEADERBOARD_KEY, 0, limit - 1, withscores=True)
+    return [(address.decode(), score) for address, score in records]
+
+
+async def get_rank(cache: CacheManager, address: str) -> Tuple[int, Optional[float]]:
+    """
+    Return the rank and reward of `address`, the rank is 1 + the number of users with a strictly greater reward.
+    Rank is 0 and reward is None when the address has no reward yet.
+    """
+    reward = await cache.client.zscore(LEADERBOARD_KEY, address)
+    if reward is None:
+        return 0, None
+    greater = await cache.client.zcount(LEADERBOARD_KEY, f"({reward}", "+inf")
+    return greater + 1, reward
+
+
+async def rebuild_leaderboard(db: DatabaseManager, cache: CacheManager, batch_size: int = 1000) -> int:
+    """
+    Rebuild the sorted set from the `leaderboard` collection.
+    Records are written to a temporary key that replaces the live key in one RENAME, so readers never see a partial leaderboard.
+    Rewards applied by ingestion while the rebuild runs can be lost, run it while ingestion is stopped or run it again afterwards.
+    """
+    tmp_key = f"{LEADERBOARD_KEY}$rebuild"
+    await cache.client.delete(tmp_key)
+    total = 0
+    batch = {}
+    async for record in db.db["leaderboard"].find({}, {"_id": 0, "address": 1, "reward": 1}):
+        batch[record["address"]] = record["reward"]
+        if len(batch) >= batch_size:
+            await cache.client.zadd(tmp_key, batch)
+            total += len(batch)
+            batch = {}
+    if len(batch) > 0:
+        await cache.client.zadd(tmp_key, batch)
+        total += len(batch)
+    if total == 0:
+        await cache.client.delete(LEADERBOARD_KEY)
+    else:
+        await cache.client.rename(tmp_key, LEADERBOARD_KEY)
+    return total
+
+
+async def seed_leaderboard(db: DatabaseManager, cache: CacheManager) -> Optional[int]:
+    """
+    Rebuild the sorted set unless it exists, run by every process on startup so a redis that lost its data serves ranks again.
+    Processes starting together wait for the one that rebuilds, returns the number of records or None when the set was there.
+    """
+    if await cache.client.exists(LEADERBOARD_KEY):
+        return None
+    async with cache.client.lock(SEED_LOCK_KEY, timeout=SEED_LOCK_TIMEOUT):
+        if await cache.client.exists(LEADERBOARD_KEY):
+            return None
+        return await rebuild_leaderboard(db, cache)
@@ -2,15 +2,23 @@ import asyncio
 from datetime import datetime, timedelta
 from functools import cache
 import json
+import time
 from operator import is_
-from typing import List, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from fastapi import Depends
 from redis import Redis
 import redis
-from app.providers import get_cache, get_db
+from redis.asyncio.client import Pipeline
+from redis.commands.core import AsyncScript
+from app.providers import get_cache, get_db, get_exchange_manager, get_pair_registry, get_price_poller
 from app.providers.manager import CacheManager, DatabaseManager
 from app.models.core import PriceFeed, Pair
+from app.jobs.events import PRICE_CHANNEL, encode_event, price_event
+from app.jobs.history import record_price_history
+from app.settings import Settings, get_settings
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.metrics import EXCHANGE_BREAKER_STATE, EXCHANGE_ERRORS, EXCHANGE_LATENCY, EXCHANGE_REJECTED
 from ccxt import Exchange
 import ccxt.async_support as ccxt
 import logging
@@ -25,44 +33,277 @@ console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 
 
+# source of the feed combining every exchange's price
+AGGREGATE_SOURCE = "aggregate"
+
+# Store the price ARGV[2] of venue ARGV[1], taken at time ARGV[3] (ARGV[4] in ISO format), in KEYS[2] and recompute the aggregate feed of
+# symbol ARGV[5] into KEYS[1] as of time ARGV[6]. Venues older than ARGV[7] seconds are left out and the weight of a price halves every
+# ARGV[8] seconds of age. Venues further than ARGV[9], a fraction, from the weighted median are rejected as outliers and the aggregate
+# is the weighted mean of the rest. Fewer than ARGV[10] remaining venues leave the previous aggregate in place, readers see it age.
+# The new aggregate is published on channel ARGV[11] for every pair id from ARGV[12] on.
+AGGREGATE_PRICE_SCRIPT = """
+redis.call('HSET', KEYS[2], ARGV[1], cjson.encode({p = tonumber(ARGV[2]), t = tonumber(ARGV[3]), at = ARGV[4]}))
+local now = tonumber(ARGV[6])
+local max_age = tonumber(ARGV[7])
+local half_life = tonumber(ARGV[8])
+local venues = {}
+local total = 0
+local fields = redis.call('HGETALL', KEYS[2])
+for i = 1, #fields, 2 do
+    local venue = cjson.decode(fields[i + 1])
+    local age = math.max(0, now - venue.t)
+    if age <= max_age then
+        venue.w = 0.5 ^ (age / half_life)
+        total = total + venue.w
+        table.insert(venues, venue)
+    end
+end
+if #venues == 0 then
+    return 0
+end
+table.sort(venues, function(a, b) return a.p < b.p end)
+local median = venues[#venues].p
+local seen = 0
+for _, venue in ipairs(venues) do
+    seen = seen + venue.w
+    if seen >= total / 2 then
+        median = venue.p
+        break
+    end
+end
+local max_deviation = tonumber(ARGV[9])
+local sum, weight, used, newest, at = 0, 0, 0, nil, nil
+for _, venue in ipairs(venues) do
+    if math.abs(venue.p - median) <= max_deviation * median then
+        sum = sum + venue.p * venue.w
+        weight = weight + venue.w
+        used = used + 1
+        if newest == nil or venue.t > newest then
+            newest = venue.t
+            at = venue.at
+        end
+    end
+end
+if used < tonumber(ARGV[10]) then
+    return 0
+end
+local price = math.floor(sum / weight * 10000 + 0.5) / 10000
+redis.call('HSET', KEYS[1], 'aggregate', cjson.encode({source = 'aggregate', price = price, last_updated_at = at, symbol = ARGV[5]}))
+for i = 12, #ARGV do
+    redis.call('PUBLISH', ARGV[11], cjson.encode({type = 'price', pair_id = ARGV[i], symbol = ARGV[5], source = 'aggregate', price = price, ts = newest}))
+end
+return used
+"""
+# built without a client, it only ever runs on the pipeline of the poll, which loads it into redis when missing
+UPDATE_AGGREGATE = AsyncScript(None, AGGREGATE_PRICE_SCRIPT.encode())  # type: ignore
+
+
+def price_feed_key(symbol: str) -> str:
+    """
+    All feeds of a symbol live in one hash keyed by source, so they can be read in a single round trip.
+    """
+    return f"price${symbol}"
+
+
+def price_venues_key(symbol: str) -> str:
+    """
+    Latest price and timestamp of every exchange of a symbol, the input of its aggregate feed.
+    """
+    return f"price_venues${symbol}"
+
+
+async def aggregate_price(pipe: Pipeline, feed: PriceFeed, pair_ids: List[str], settings: Settings):
+    """
+    Queue the commands that fold `feed` into the aggregate feed of its symbol, stored under the `aggregate` source next to the
+    exchange feeds. The aggregate is updated by every exchange's poll in redis, so it costs no extra round trip and stays consistent
+    when exchanges are polled concurrently.
+    """
+    await UPDATE_AGGREGATE(
+        keys=[price_feed_key(feed.symbol), price_venues_key(feed.symbol)],
+        args=[
+            feed.source,
+            feed.price,
+            feed.last_updated_at.timestamp(),
+            feed.last_updated_at.isoformat(),
+            feed.symbol,
+            time.time(),
+            settings.TICTON_PRICE_AGGREGATE_MAX_AGE,
+            settings.TICTON_PRICE_AGGREGATE_HALF_LIFE,
+            settings.TICTON_PRICE_AGGREGATE_MAX_DEVIATION,
+            settings.TICTON_PRICE_AGGREGATE_MIN_SOURCES,
+            PRICE_CHANNEL,
+            *pair_ids,
+        ],  # type: ignore
+        client=pipe,
+    )
+
+
 def get_exchanges() -> List[Exchange]:
-    options = ["bybit", "gateio", "okx"]
+    """
+    Create fresh exchange instances, the poller uses the long-lived ones from `get_exchange_manager` instead.
+    """
+    options = get_settings().TICTON_EXCHANGES
     return [getattr(ccxt, opt)() for opt in options]
 
 
-async def fetch_price(exchange: Exchange, symbol: str, **kwargs) -> Tuple[Optional[str], str, Optional[float]]:
+class ExchangeUnavailable(Exception):
+    """
+    The call was not made, the exchange's circuit breaker is open or the cycle deadline passed.
+    """
+
+
+def _breaker_changed(exchange: Exchange, breaker: CircuitBreaker, before: str):
+    EXCHANGE_BREAKER_STATE.labels(exchange.name).set(CircuitBreaker.STATE_VALUES[breaker.state])
+    if breaker.state == before:
+        return
+    if breaker.state == "open":
+        logger.warning(f"Circuit breaker of {exchange.name} opened after {breaker.failures} consecutive failures, calls are skipped for {breaker.snapshot()['retry_in_seconds']}s")
+    elif breaker.state == "closed":
+        logger.info(f"Circuit breaker of {exchange.name} closed, {breaker.rejected} calls were skipped so far")
+
+
+async def guarded_call(exchange: Exchange, call: str, request: Callable[[], Awaitable[Any]], breaker: Optional[CircuitBreaker], deadline: Optional[float]) -> Any:
+    """
+    Make one exchange call under the exchange's circuit breaker, cancelled when `time.monotonic()` reaches `deadline`.
+    Raises `ExchangeUnavailable` without calling the exchange when the breaker rejects the call or the deadline already passed.
+    """
+    if deadline is not None and time.monotonic() >= deadline:
+        raise ExchangeUnavailable(f"{exchange.name}: deadline passed before {call}")
+    if breaker is not None:
+        before = breaker.state
+        allowed = breaker.allow()
+        _breaker_changed(exchange, breaker, before)
+        if not allowed:
+            EXCHANGE_REJECTED.labels(exchange.name).inc()
+            raise ExchangeUnavailable(f"{exchange.name}: circuit breaker is {breaker.state}")
+    start = time.perf_counter()
     try:
-        ticker = await exchange.fetch_ticker(symbol)  # type: ignore
+        result = await asyncio.wait_for(request(), None if deadline is None else deadline - time.monotonic())
+    except Exception:
+        EXCHANGE_ERRORS.labels(exchange.name, call).inc()
+        if breaker is not None:
+            before = breaker.state
+            breaker.record_failure()
+            _breaker_changed(exchange, breaker, before)
+        raise
+    finally:
+        EXCHANGE_LATENCY.labels(exchange.name, call).observe(time.perf_counter() - start)
+    if breaker is not None:
+        before = breaker.state
+        breaker.record_success()
+        _breaker_changed(exchange, breaker, before)
+    return result
+
+
+async def fetch_price(exchange: Exchange, symbol: str, breaker: Optional[CircuitBreaker] = None, deadline: Optional[float] = None, **kwargs) -> Tuple[Optional[str], str, Optional[float]]:
+    try:
+        ticker = await guarded_call(exchange, "fetch_ticker", lambda: exchange.fetch_ticker(symbol), breaker, deadline)  # type: ignore
         return exchange.name, symbol, ticker.get("last", None)
+    except ExchangeUnavailable:
+        return None, symbol, None
     except Exception as e:
-        logger.exception(f"Failed to fetch price for {exchange.name}:{symbol}. Reason: {e}")
+        # no traceback, a down exchange fails every symbol until its breaker opens
+        logger.warning(f"Failed to fetch price for {exchange.name}:{symbol}. Reason: {e!r}")
         return None, symbol, None
 
 
-async def set_price(exchanges: List[Exchange]):
+async def fetch_prices(
+    exchange: Exchange, symbols: List[str], max_concurrency: int = 4, breaker: Optional[CircuitBreaker] = None, timeout: Optional[float] = None
+) -> List[Tuple[Optional[str], str, Optional[float]]]:
+    """
+    Fetch the last price of every symbol listed on `exchange`.
+    A single batched `fetch_tickers` call is used when the exchange supports it, otherwise at most `max_concurrency` single fetches run at a time.
+    Every call goes through `breaker` and the whole fetch takes at most `timeout` seconds, prices not fetched by then count as failed.
+    """
+    if exchange.markets:
+        symbols = [symbol for symbol in symbols if symbol in exchange.markets]
+    if len(symbols) == 0:
+        return []
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    if exchange.has.get("fetchTickers"):
+        try:
+            tickers = await guarded_call(exchange, "fetch_tickers", lambda: exchange.fetch_tickers(symbols), breaker, deadline)  # type: ignore
+            return [(exchange.name, symbol, tickers[symbol].get("last", None) if symbol in tickers else None) for symbol in symbols]
+        except ExchangeUnavailable:
+            return [(None, symbol, None) for symbol in symbols]
+        except Exception as e:
+            logger.warning(f"Failed to fetch tickers for {exchange.name}, falling back to single fetches. Reason: {e!r}")
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def limited(symbol: str):
+        async with semaphore:
+            return await fetch_price(exchange, symbol, breaker=breaker, deadline=deadline)
+
+    return list(await asyncio.gather(*[limited(symbol) for symbol in symbols]))
+
+
+async def set_price(exchanges: Optional[List[Exchange]] = None) -> Tuple[int, int]:
+    """
+    Fetch the price of every pair from `exchanges` and write the feeds, returns the number of prices that could not be fetched or written
+    and the number of prices tried.
+    """
     cache = await get_cache()
-    db = await get_db()
+    registry = await get_pair_registry()
+    exchange_manager = await get_exchange_manager()
+    if exchanges is None:
+        exchanges = exchange_manager.exchanges
     assert len(exchanges) > 0, "exchange list cannot be empty"
-    # Find support pairs in database
-    result = db.db["pairs"].find()
-    pairs = [Pair(**i) for i in result]
+    # Find support pairs in registry
+    pairs = await registry.list()
     if len(pairs) == 0:
         logger.info("No pairs found in database")
-        return
-    symbols = [f"{p.base_asset_symbol.upper()}/{p.quote_asset_symbol.upper()}" for p in pairs]
-    # for each exchange and symbol, get the price
-    jobs = []
-    for exchange in exchanges:
-        for symbol in symbols:
-            jobs.append(fetch_price(exchange, symbol))
-    results: List[Tuple[Optional[str], str, float]] = await asyncio.gather(*jobs)
+        return 0, 0
+    pair_ids: Dict[str, List[str]] = {}
+    for p in pairs:
+        pair_ids.setdefault(f"{p.base_asset_symbol.upper()}/{p.quote_asset_symbol.upper()}", []).append(p.id)
+    symbols = list(pair_ids)
+    # for each exchange, get the price of every symbol in one batch, bounded by the exchange timeout whatever state the exchange is in
+    settings = get_settings()
+    batches = await asyncio.gather(
+        *[
+            fetch_prices(exchange, symbols, settings.TICTON_EXCHANGE_MAX_CONCURRENCY, exchange_manager.breaker(exchange.name), settings.TICTON_EXCHANGE_TIMEOUT)  # type: ignore
+            for exchange in exchanges
+        ]
+    )
+    results: List[Tuple[Optional[str], str, Optional[float]]] = [result for batch in batches for result in batch]
+    pipe = cache.client.pipeline(transaction=False)
+    feeds: List[PriceFeed] = []
     for source, symbol, price in results:
         if price is None:
             continue
         # TODO: Hard coded the price to 4 decimal places, should be configurable in the future
         feed = PriceFeed(source=source or "", price=round(price, 4), last_updated_at=datetime.now(), symbol=symbol)
-        resp = cache.client.set(name=f"price${source}${symbol}", value=feed.model_dump_json())
-        if not resp:
-            logger.error(f"Failed to set price for {source}:{symbol}")
-    for exchange in exchanges:
-        await exchange.close()  # type: ignore
+        pipe.hset(name=price_feed_key(symbol), key=feed.source, value=feed.model_dump_json())
+        for pair_id in pair_ids[symbol]:
+            pipe.publish(PRICE_CHANNEL, encode_event(price_event(pair_id, feed)))
+        await aggregate_price(pipe, feed, pair_ids[symbol], settings)
+        feeds.append(feed)
+    await record_price_history(pipe, feeds, settings)
+    failed = sum(1 for _, _, price in results if price is None)
+    try:
+        await pipe.execute()
+    except Exception as e:
+        logger.error(f"Failed to set price for {', '.join(f'{f.source}:{f.symbol}' for f in feeds)}. Reason: {e}")
+        failed += len(feeds)
+    return failed, len(results)
+
+
+async def poll_prices(settings: Settings):
+    """
+    Run the price poller until cancelled. Run by the lease coordinator so one process of the deployment polls the exchanges.
+    """
+    poller = await get_price_poller()
+    exchange_manager = await get_exchange_manager()
+    await poller.connect(
+        exchanges=exchange_manager.exchanges,
+        poll=lambda exchange: set_price([exchange]),
+        interval=settings.TICTON_PRICE_POLL_INTERVAL,
+        max_interval=settings.TICTON_PRICE_POLL_MAX_INTERVAL,
+        jitter=settings.TICTON_PRICE_POLL_JITTER,
+        failure_ratio=settings.TICTON_PRICE_POLL_FAILURE_RATIO,
+    )
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await poller.disconnect()
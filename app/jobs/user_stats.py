@@ -0,0 +1,97 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.models.indexes import INDEXES
+from app.models.queries import USER_ALARM_COUNTS, migration_filter, user_alarm_counts_pipeline, user_stats_filter
+from app.providers.manager import CacheManager, DatabaseManager
+
+# counts of the `user_stats` documents, changed with $inc by the ingestion buffer, see `app.providers.impl.ingestion_buffer`
+USER_STATS_FIELDS = ["active", "closed", "ticks", "winds", "reward"]
+
+# marker of the first count of `user_stats` from the alarms, the increments of ingestion only add up to the totals from then on
+USER_STATS_MIGRATION = "user_stats"
+SEED_LOCK_KEY = "user_stats$seed"
+SEED_LOCK_TIMEOUT = 3600
+
+# the marker is never removed, once it is seen it is not read again
+_seeded = False
+
+
+async def user_stats_seeded(db: DatabaseManager) -> bool:
+    """
+    Whether `user_stats` was counted from the alarms. Before that a stats document only holds what ingestion counted since the upgrade.
+    """
+    global _seeded
+    if not _seeded:
+        _seeded = await db.db["migrations"].find_one(migration_filter(USER_STATS_MIGRATION)) is not None
+    return _seeded
+
+
+async def get_user_stats(db: DatabaseManager, address: str) -> Optional[Dict[str, Any]]:
+    """
+    Stats of `address`, None when no event of the address was counted yet.
+    A retried flush is applied once, only events replayed after a worker stopped between writing them and their checkpoint are counted
+    twice. Counts are clamped at 0 so such an event can not push one below until the next rebuild.
+    """
+    doc = await db.db["user_stats"].find_one(user_stats_filter(address), {"_id": 0, **{field: 1 for field in USER_STATS_FIELDS}})
+    if doc is None:
+        return None
+    return {"address": address, **{field: max(0, doc.get(field, 0)) for field in USER_STATS_FIELDS}}
+
+
+async def count_user_stats(db: DatabaseManager, address: str) -> Dict[str, Any]:
+    """
+    Stats of `address` counted from its alarms and leaderboard record, served until `user_stats` is seeded.
+    """
+    counts = await db.db["alarms"].aggregate(user_alarm_counts_pipeline(address)).to_list(length=None)
+    record = await db.db["leaderboard"].find_one({"address": address}, {"_id": 0, "reward": 1})
+    stats = {field: counts[0][field] if len(counts) > 0 else 0 for field in USER_STATS_FIELDS if field != "reward"}
+    return {"address": address, **stats, "reward": record["reward"] if record is not None else 0.0}
+
+
+def user_stats_pipeline(target: str) -> List[Dict[str, Any]]:
+    """
+    Stats of every address from the `alarms` and `leaderboard` collections, written to `target`.
+    Alarms opened by a wind hold twice the base asset of the alarm they replaced, alarms opened by a tick hold exactly the threshold.
+    """
+    return [
+        USER_ALARM_COUNTS,
+        {"$unionWith": {"coll": "leaderboard", "pipeline": [{"$project": {"_id": "$address", "reward": 1}}]}},
+        {"$group": {"_id": "$_id", **{field: {"$sum": f"${field}"} for field in USER_STATS_FIELDS}}},
+        {"$project": {"_id": 0, "address": "$_id", **{field: 1 for field in USER_STATS_FIELDS}, "updated_at": "$$NOW"}},
+        {"$out": target},
+    ]
+
+
+async def rebuild_user_stats(db: DatabaseManager) -> int:
+    """
+    Recount the `user_stats` collection from the alarms and the leaderboard and mark it seeded.
+    The stats are written to a temporary collection that replaces the live one in one rename, so readers never see partial stats.
+    Events counted by ingestion while the rebuild runs can be lost, run it while ingestion is stopped or run it again afterwards.
+    """
+    global _seeded
+    tmp = "user_stats_rebuild"
+    await db.db[tmp].drop()
+    await db.db["alarms"].aggregate(user_stats_pipeline(tmp)).to_list(length=None)
+    total = await db.db[tmp].count_documents({})
+    if total == 0:
+        await db.db["user_stats"].delete_many({})
+    else:
+        await db.db[tmp].create_indexes(INDEXES["user_stats"])
+        await db.db[tmp].rename("user_stats", dropTarget=True)
+    await db.db["migrations"].update_one(migration_filter(USER_STATS_MIGRATION), {"$set": {"applied_at": datetime.now()}}, upsert=True)
+    _seeded = True
+    return total
+
+
+async def seed_user_stats(db: DatabaseManager, cache: CacheManager) -> Optional[int]:
+    """
+    Count `user_stats` from the alarms unless it was counted before, run by every worker before it ingests.
+    Workers starting together wait for the one that counts, returns the number of users or None when the stats were already seeded.
+    """
+    if await user_stats_seeded(db):
+        return None
+    async with cache.client.lock(SEED_LOCK_KEY, timeout=SEED_LOCK_TIMEOUT):
+        if await user_stats_seeded(db):
+            return None
+        return await rebuild_user_stats(db)
@@ -1,5 +1,5 @@
-from typing import List
-from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, ConfigDict, Field, StrictFloat, StrictInt, StrictStr
 from typing import Generic, TypeVar
 
 
@@ -8,9 +8,36 @@ M = TypeVar("M", bound=BaseModel)
 
 class PageResponse(BaseModel, Generic[M]):
     items: List[M]
-    total: int
+    total: Optional[int] = Field(default=None, description="Total number of items, null when the total was not requested")
+    next_cursor: Optional[str] = Field(default=None, description="Opaque cursor of the next page, null on the last page")
 
 
 class Pagination(BaseModel):
     limit: int
     skip: int
+    cursor: Optional[Dict[str, Any]] = None
+    include_total: bool = True
+
+
+class AlarmCursor(BaseModel):
+    """
+    Position of a cursor of the alarm lists, see `app.models.queries.alarm_cursor`.
+    The values end up in query filters, strict types keep an operator document out of them.
+    """
+
+    model_config = ConfigDict(extra="forbid")
+
+    id: StrictInt
+    oracle: StrictStr
+
+
+class LeaderboardCursor(BaseModel):
+    """
+    Position of a cursor of the leaderboard, see `app.models.queries.leaderboard_cursor`.
+    """
+
+    model_config = ConfigDict(extra="forbid")
+
+    reward: StrictFloat = Field(allow_inf_nan=False)
+    address: StrictStr
+    rank: StrictInt = Field(ge=0)
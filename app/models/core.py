@@ -93,6 +93,20 @@ class PriceFeed(BaseModel):
         json_encoders = {datetime: lambda v: v.isoformat()}
 
 
+class PricePoint(BaseModel):
+    source: str = Field(description="price source, e.g. gateio, okx", examples=["gateio"])
+    symbol: str = Field(description="symbol of the pair", examples=["TON/USDT"])
+    timestamp: datetime = Field(description="start of the bucket, or the sample time for raw points")
+    open: float = Field(description="first price in the bucket", examples=[2.2])
+    high: float = Field(description="highest price in the bucket", examples=[2.3])
+    low: float = Field(description="lowest price in the bucket", examples=[2.1])
+    close: float = Field(description="last price in the bucket", examples=[2.25])
+    count: int = Field(description="number of samples in the bucket", examples=[15])
+
+    class Config:
+        json_encoders = {datetime: lambda v: v.isoformat()}
+
+
 class AlarmResponse(BaseModel):
     base_asset_image_url: str = Field(description="Image url of base asset")
     quote_asset_image_url: str = Field(description="Image url of quote asset")
@@ -110,3 +124,12 @@ class AlarmResponse(BaseModel):
     alarm_id: int = Field(description="Alarm id", examples=[13])
     alarm_address: str = Field(description="Address of alarm")
     remain_scale: int = Field(description="Remain scale of position", examples=[1])
+
+
+class UserStats(BaseModel):
+    address: str = Field(description="Address of user", examples=["0:29754304394b879c1a3e45275b8a4919677a9622d64b7578f27dff6537f792e5"])
+    active: int = Field(description="Alarms of the user that are not closed, emptied alarms included", examples=[3])
+    closed: int = Field(description="Alarms of the user that rang and closed", examples=[12])
+    ticks: int = Field(description="Alarms the user opened with a tick", examples=[10])
+    winds: int = Field(description="Alarms the user opened by winding another alarm", examples=[5])
+    reward: float = Field(description="Total reward received by the user", examples=[2.26])
@@ -0,0 +1,48 @@
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+# Index specification of every collection, applied by `main.py init`.
+# Compound indexes follow equality -> sort -> range order so the queries in `app.models.queries` never need a blocking sort.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "pairs": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("oracle_address", ASCENDING)], unique=True),
+    ],
+    "alarms": [
+        # on_tick_success / on_wind_success / on_ring_success look alarms up by oracle and id
+        IndexModel([("oracle", ASCENDING), ("id", ASCENDING)], unique=True),
+        # /core/alarms/{address}/active and /core/alarms/{address}/closed, oracle breaks id ties of the keyset cursor
+        IndexModel([("watchmaker", ASCENDING), ("id", DESCENDING), ("oracle", DESCENDING), ("status", ASCENDING)]),
+        # /core/alarms/active
+        IndexModel([("pair_id", ASCENDING), ("id", DESCENDING), ("oracle", DESCENDING), ("status", ASCENDING), ("remain_scale", ASCENDING)]),
+        # subscribe_oracle resumes from the newest alarm of an oracle
+        IndexModel([("oracle", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    "leaderboard": [
+        IndexModel([("address", ASCENDING)], unique=True),
+        IndexModel([("reward", DESCENDING), ("address", ASCENDING)]),
+    ],
+    # one stats document per address, counted up by the ingestion buffer and read by /core/users/{address}/stats and the alarm list totals
+    "user_stats": [
+        IndexModel([("address", ASCENDING)], unique=True),
+    ],
+    # one marker per one-off data migration, like the first count of `user_stats`
+    "migrations": [
+        IndexModel([("name", ASCENDING)], unique=True),
+    ],
+    # one sync checkpoint per oracle, written by the ingestion buffer
+    "sync_state": [
+        IndexModel([("oracle", ASCENDING)], unique=True),
+    ],
+}
+
+
+async def apply_indexes(db) -> Dict[str, List[str]]:
+    """
+    Create every declared index, existing indexes with the same keys and options are left untouched.
+    """
+    created = {}
+    for collection, indexes in INDEXES.items():
+        created[collection] = await db[collection].create_indexes(indexes)
+    return created
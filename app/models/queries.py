@@ -0,0 +1,198 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from app.models.common import Pagination
+
+# Queries used by the routers and jobs. They are kept here so `main.py bench plans` can explain exactly what the app runs.
+
+
+# Lists are paged by keyset: the next page starts after the last document of the previous one instead of skipping over
+# every earlier document. The last document is handed out as an opaque cursor, see `app.utils.encode_cursor`.
+# `$skip` is only used by the legacy `page` parameter.
+
+ALARM_PAGE_SORT = {"id": -1, "oracle": -1}
+LEADERBOARD_PAGE_SORT = {"reward": -1, "address": 1}
+
+
+def _page(match: Dict[str, Any], after: Optional[Dict[str, Any]], sort: Dict[str, Any], p: Pagination) -> List[Dict[str, Any]]:
+    pipeline: List[Dict[str, Any]] = [{"$match": match if after is None else {"$and": [match, after]}}, {"$sort": sort}]
+    if p.cursor is None and p.skip > 0:
+        pipeline.append({"$skip": p.skip})
+    # one extra document tells whether there is a next page
+    pipeline.append({"$limit": p.limit + 1})
+    return pipeline
+
+
+def alarm_cursor(alarm: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": alarm["id"], "oracle": alarm["oracle"]}
+
+
+def _after_alarm(p: Pagination) -> Optional[Dict[str, Any]]:
+    # alarm ids are only unique per oracle, so the oracle breaks ties between alarms sharing an id
+    if p.cursor is None:
+        return None
+    return {"$or": [{"id": {"$lt": p.cursor["id"]}}, {"id": p.cursor["id"], "oracle": {"$lt": p.cursor["oracle"]}}]}
+
+
+def active_alarms_by_watchmaker_filter(watchmaker: str) -> Dict[str, Any]:
+    return {"watchmaker": {"$eq": watchmaker}, "status": {"$ne": "closed"}}
+
+
+def closed_alarms_by_watchmaker_filter(watchmaker: str) -> Dict[str, Any]:
+    return {"watchmaker": {"$eq": watchmaker}, "status": {"$eq": "closed"}}
+
+
+def active_alarms_by_pair_filter(pair_id: str) -> Dict[str, Any]:
+    return {"pair_id": {"$eq": pair_id}, "status": {"$ne": "closed"}, "remain_scale": {"$gt": 0}}
+
+
+# Fields of the pair joined into every alarm of a list, see `alarm_view_pipeline`
+ALARM_VIEW_PAIR_FIELDS = ["base_asset_image_url", "quote_asset_image_url", "base_asset_symbol", "quote_asset_symbol"]
+
+
+def _alarm_view(closed: bool) -> List[Dict[str, Any]]:
+    projection: Dict[str, Any] = {
+        "_id": 0,
+        # cursor fields
+        "id": 1,
+        "oracle": 1,
+        # an alarm of a deleted pair has no pair fields, they are empty strings so the response keeps its shape
+        **{field: {"$ifNull": [f"$pair.{field}", ""]} for field in ALARM_VIEW_PAIR_FIELDS},
+        "created_at": 1,
+        "price": 1,
+        "base_asset_scale": 1,
+        "quote_asset_scale": 1,
+        "reward": {"$ifNull": ["$reward", 0.0]},
+        "min_base_asset_threshold": 1,
+        "arbitrage_ratio": {"$divide": [{"$subtract": ["$origin_remain_scale", "$remain_scale"]}, "$origin_remain_scale"]},
+        "watchmaker": 1,
+        "address": 1,
+        "remain_scale": 1,
+    }
+    if closed:
+        projection["closed_at"] = 1
+    return [
+        {"$lookup": {"from": "pairs", "localField": "pair_id", "foreignField": "id", "as": "pair"}},
+        # keep alarms of a deleted pair so the extra document still tells whether there is a next page
+        {"$unwind": {"path": "$pair", "preserveNullAndEmptyArrays": True}},
+        {"$project": projection},
+    ]
+
+
+def alarm_view_pipeline(match: Dict[str, Any], p: Pagination, closed: bool = False) -> List[Dict[str, Any]]:
+    """
+    Page of alarms matching `match`, joined with their pair and projected to the fields of `AlarmResponse` plus the cursor fields.
+    The join runs after `$limit`, so it reads one pair per returned alarm through the unique `pairs.id` index.
+    """
+    return _page(match, _after_alarm(p), ALARM_PAGE_SORT, p) + _alarm_view(closed)
+
+
+def active_alarms_by_watchmaker_pipeline(watchmaker: str, p: Pagination) -> List[Dict[str, Any]]:
+    return alarm_view_pipeline(active_alarms_by_watchmaker_filter(watchmaker), p)
+
+
+def closed_alarms_by_watchmaker_pipeline(watchmaker: str, p: Pagination) -> List[Dict[str, Any]]:
+    return alarm_view_pipeline(closed_alarms_by_watchmaker_filter(watchmaker), p, closed=True)
+
+
+def active_alarms_by_pair_pipeline(pair_id: str, p: Pagination) -> List[Dict[str, Any]]:
+    return alarm_view_pipeline(active_alarms_by_pair_filter(pair_id), p)
+
+
+def leaderboard_cursor(record: Dict[str, Any], rank: int) -> Dict[str, Any]:
+    return {"reward": record["reward"], "address": record["address"], "rank": rank}
+
+
+def leaderboard_pipeline(p: Pagination) -> List[Dict[str, Any]]:
+    after = None
+    if p.cursor is not None:
+        after = {"$or": [{"reward": {"$lt": p.cursor["reward"]}}, {"reward": p.cursor["reward"], "address": {"$gt": p.cursor["address"]}}]}
+    return _page({}, after, LEADERBOARD_PAGE_SORT, p)
+
+
+def alarm_by_id_filter(oracle: str, alarm_id: int) -> Dict[str, Any]:
+    """
+    Alarm ids are only unique within the oracle that issued them.
+    """
+    return {"oracle": oracle, "id": alarm_id}
+
+
+def latest_alarm_of_oracle_filter(oracle: str) -> Dict[str, Any]:
+    return {"oracle": oracle}
+
+
+LATEST_ALARM_SORT = {"created_at": -1}
+
+
+def sync_state_filter(oracle: str) -> Dict[str, Any]:
+    return {"oracle": oracle}
+
+
+def user_stats_filter(address: str) -> Dict[str, Any]:
+    return {"address": address}
+
+
+# alarm counts of every watchmaker, alarms opened by a wind hold more base asset than the threshold, see `app.jobs.user_stats`
+USER_ALARM_COUNTS = {
+    "$group": {
+        "_id": "$watchmaker",
+        "active": {"$sum": {"$cond": [{"$ne": ["$status", "closed"]}, 1, 0]}},
+        "closed": {"$sum": {"$cond": [{"$eq": ["$status", "closed"]}, 1, 0]}},
+        "ticks": {"$sum": {"$cond": [{"$gt": ["$base_asset_amount", "$min_base_asset_threshold"]}, 0, 1]}},
+        "winds": {"$sum": {"$cond": [{"$gt": ["$base_asset_amount", "$min_base_asset_threshold"]}, 1, 0]}},
+    }
+}
+
+
+def user_alarm_counts_pipeline(watchmaker: str) -> List[Dict[str, Any]]:
+    return [{"$match": {"watchmaker": {"$eq": watchmaker}}}, USER_ALARM_COUNTS]
+
+
+def migration_filter(name: str) -> Dict[str, Any]:
+    return {"name": name}
+
+
+def increment_filter(address: str, flush_id: str) -> Dict[str, Any]:
+    # `$inc` writes of the ingestion buffer skip documents that already applied the flush, see `IncrementBatch`
+    return {"address": address, "flushes": {"$ne": flush_id}}
+
+
+class QueryCase(NamedTuple):
+    name: str
+    collection: str
+    pipeline: Optional[List[Dict[str, Any]]] = None
+    filter: Optional[Dict[str, Any]] = None
+    sort: Optional[Dict[str, Any]] = None
+
+
+def query_cases() -> List[QueryCase]:
+    """
+    Every indexed query the app runs, with placeholder values.
+    Full reads of `pairs` by the pair registry and of `leaderboard` and `alarms` by the rebuild commands are scans by design and are not listed.
+    """
+    address = "0:" + "0" * 64
+    p = Pagination(limit=10, skip=0)
+    after_alarm = Pagination(limit=10, skip=0, cursor={"id": 100, "oracle": address}, include_total=False)
+    after_record = Pagination(limit=10, skip=0, cursor={"reward": 1.0, "address": address, "rank": 10}, include_total=False)
+    return [
+        QueryCase("core.get_my_active_alarms", "alarms", pipeline=active_alarms_by_watchmaker_pipeline(address, p)),
+        QueryCase("core.get_my_active_alarms.cursor", "alarms", pipeline=active_alarms_by_watchmaker_pipeline(address, after_alarm)),
+        QueryCase("core.get_my_active_alarms.total", "alarms", filter=active_alarms_by_watchmaker_filter(address)),
+        QueryCase("core.get_my_closed_alarms", "alarms", pipeline=closed_alarms_by_watchmaker_pipeline(address, p)),
+        QueryCase("core.get_my_closed_alarms.cursor", "alarms", pipeline=closed_alarms_by_watchmaker_pipeline(address, after_alarm)),
+        QueryCase("core.get_my_closed_alarms.total", "alarms", filter=closed_alarms_by_watchmaker_filter(address)),
+        QueryCase("core.get_alarms_by_pair_id", "alarms", pipeline=active_alarms_by_pair_pipeline("pair", p)),
+        QueryCase("core.get_alarms_by_pair_id.cursor", "alarms", pipeline=active_alarms_by_pair_pipeline("pair", after_alarm)),
+        QueryCase("core.get_alarms_by_pair_id.total", "alarms", filter=active_alarms_by_pair_filter("pair")),
+        QueryCase("core.get_user_stats", "user_stats", filter=user_stats_filter(address)),
+        QueryCase("core.get_user_stats.unseeded", "alarms", pipeline=user_alarm_counts_pipeline(address)),
+        QueryCase("leaderboard.get_leader_board_pagination", "leaderboard", pipeline=leaderboard_pipeline(p)),
+        QueryCase("leaderboard.get_leader_board_pagination.cursor", "leaderboard", pipeline=leaderboard_pipeline(after_record)),
+        QueryCase("jobs.on_ring_success.find_alarm", "alarms", filter=alarm_by_id_filter(address, 1)),
+        QueryCase("jobs.on_wind_success.find_old_alarm", "alarms", filter=alarm_by_id_filter(address, 1)),
+        QueryCase("jobs.on_tick_success.upsert_alarm", "alarms", filter=alarm_by_id_filter(address, 1)),
+        QueryCase("jobs.on_ring_success.inc_leaderboard", "leaderboard", filter=increment_filter(address, "flush")),
+        QueryCase("jobs.ingestion.inc_user_stats", "user_stats", filter=increment_filter(address, "flush")),
+        QueryCase("jobs.subscribe_oracle.sync_state", "sync_state", filter=sync_state_filter(address)),
+        QueryCase("jobs.subscribe_oracle.latest_alarm", "alarms", filter=latest_alarm_of_oracle_filter(address), sort=LATEST_ALARM_SORT),
+        QueryCase("asset.debug_delete_pair.delete_pair", "pairs", filter={"id": "pair"}),
+    ]
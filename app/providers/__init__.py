@@ -1,7 +1,26 @@
 from ticton import TicTonAsyncClient
 from app.providers.impl.redis_manger import RedisManager
+from app.providers.impl.exchange_manager import ExchangeManager
+from app.providers.impl.pair_registry import PairRegistry
+from app.providers.impl.ingestion_buffer import IngestionBuffer
+from app.providers.impl.ton_client_pool import TonClientPool
+from app.providers.impl.price_poller import PricePoller
+from app.providers.impl.lease_coordinator import LeaseCoordinator
+from app.providers.impl.event_hub import EventHub
+from app.providers.impl.metrics_reporter import MetricsReporter
 from app.providers.impl.scheduler_manager import AsyncScheduler
-from app.providers.manager import DatabaseManager, CacheManager
+from app.providers.manager import (
+    DatabaseManager,
+    CacheManager,
+    EventStreamManager,
+    ExchangeSessionManager,
+    IngestionManager,
+    LeaseManager,
+    MetricsManager,
+    PairRegistryManager,
+    PricePollerManager,
+    TonClientManager,
+)
 from app.providers.impl.mongo_manager import MongoManager
 
 
@@ -15,3 +34,35 @@ async def get_cache() -> CacheManager:
 
 async def get_scheduler():
     return AsyncScheduler()
+
+
+async def get_exchange_manager() -> ExchangeSessionManager:
+    return ExchangeManager()
+
+
+async def get_pair_registry() -> PairRegistryManager:
+    return PairRegistry()
+
+
+async def get_ingestion() -> IngestionManager:
+    return IngestionBuffer()
+
+
+async def get_ton_clients() -> TonClientManager:
+    return TonClientPool()
+
+
+async def get_price_poller() -> PricePollerManager:
+    return PricePoller()
+
+
+async def get_leases() -> LeaseManager:
+    return LeaseCoordinator()
+
+
+async def get_event_hub() -> EventStreamManager:
+    return EventHub()
+
+
+async def get_metrics() -> MetricsManager:
+    return MetricsReporter()
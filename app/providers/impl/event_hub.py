@@ -0,0 +1,145 @@
+import asyncio
+import json
+import traceback
+from typing import Any, Dict, Optional, Set, Union
+
+from app.jobs.events import ALARM_CHANNEL, PRICE_CHANNEL, event_matches
+from app.providers.manager import CacheManager, EventStreamManager
+
+
+class EventSubscription:
+    """
+    Events of one stream client, newest last. A client that does not keep up loses its oldest events instead of slowing the hub.
+    """
+
+    def __init__(self, pair_id: Optional[str], watchmaker: Optional[str], queue_size: int):
+        self.pair_id = pair_id
+        self.watchmaker = watchmaker
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def push(self, message: str):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self) -> str:
+        return await self.queue.get()
+
+
+class EventHub(EventStreamManager):
+    """
+    Fan-out of the price and alarm event channels to the stream clients of this process.
+    The process holds one redis subscription however many clients are connected. Every message is decoded once to read its pair and
+    watchmaker, subscriptions are indexed by their most selective filter so a message only visits the clients that can match it, and
+    the raw message is forwarded as is.
+    """
+
+    cache: CacheManager = None  # type: ignore
+    queue_size: int = 100
+    received: int = 0
+    delivered: int = 0
+    malformed: int = 0
+    # events dropped by clients that are gone, the live ones are summed on read
+    dropped: int = 0
+    instance = None
+
+    _by_watchmaker: Dict[str, Set[EventSubscription]] = {}
+    _by_pair: Dict[str, Set[EventSubscription]] = {}
+    _unfiltered: Set[EventSubscription] = set()
+    _task: Optional[asyncio.Task] = None
+
+    def __new__(cls):
+        """
+        Singleton pattern
+        """
+        if not cls.instance:
+            cls.instance = super(EventHub, cls).__new__(cls)
+        return cls.instance
+
+    async def connect(self, cache: CacheManager, queue_size: int = 100):
+        self.cache = cache
+        self.queue_size = queue_size
+        self.received = 0
+        self.delivered = 0
+        self.malformed = 0
+        self.dropped = 0
+        self._by_watchmaker = {}
+        self._by_pair = {}
+        self._unfiltered = set()
+        self._task = asyncio.create_task(self._run())
+
+    def _index(self, subscription: EventSubscription) -> Set[EventSubscription]:
+        if subscription.watchmaker is not None:
+            return self._by_watchmaker.setdefault(subscription.watchmaker, set())
+        if subscription.pair_id is not None:
+            return self._by_pair.setdefault(subscription.pair_id, set())
+        return self._unfiltered
+
+    def subscribe(self, pair_id: Optional[str] = None, watchmaker: Optional[str] = None) -> EventSubscription:
+        subscription = EventSubscription(pair_id, watchmaker, self.queue_size)
+        self._index(subscription).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: EventSubscription):
+        index = self._index(subscription)
+        if subscription in index:
+            self.dropped += subscription.dropped
+        index.discard(subscription)
+        if len(index) == 0:
+            # drop empty buckets so the index does not grow with every address ever streamed
+            if subscription.watchmaker is not None:
+                self._by_watchmaker.pop(subscription.watchmaker, None)
+            elif subscription.pair_id is not None:
+                self._by_pair.pop(subscription.pair_id, None)
+
+    def _dispatch(self, data: Union[str, bytes]):
+        try:
+            message = data.decode() if isinstance(data, bytes) else data
+            event = json.loads(message)
+        except ValueError:
+            event = None
+        if not isinstance(event, dict):
+            # a message another publisher put on the channels, skip it rather than lose the subscription
+            self.malformed += 1
+            return
+        self.received += 1
+        candidates = [self._unfiltered, self._by_pair.get(event.get("pair_id"), ()), self._by_watchmaker.get(event.get("watchmaker"), ())]
+        for group in candidates:
+            for subscription in group:
+                if event_matches(event, subscription.pair_id, subscription.watchmaker):
+                    subscription.push(message)
+                    self.delivered += 1
+
+    async def _run(self):
+        while True:
+            pubsub = self.cache.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(PRICE_CHANNEL, ALARM_CHANNEL)
+                async for message in pubsub.listen():
+                    self._dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # clients miss the events published until the subscription is back, they refetch on reconnect anyway
+                print(traceback.format_exc())
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        subscriptions = [s for group in [self._unfiltered, *self._by_pair.values(), *self._by_watchmaker.values()] for s in group]
+        return {
+            "subscriptions": len(subscriptions),
+            "received": self.received,
+            "delivered": self.delivered,
+            "malformed": self.malformed,
+            "dropped": self.dropped + sum(s.dropped for s in subscriptions),
+        }
+
+    async def disconnect(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import ssl
+from typing import Any, Dict, List
+
+import aiohttp
+import ccxt.async_support as ccxt
+import certifi
+from ccxt.async_support import Exchange
+
+from app.providers.manager import ExchangeSessionManager
+from app.utils.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+
+class ExchangeManager(ExchangeSessionManager):
+    _exchanges: List[Exchange] = []
+    _session: aiohttp.ClientSession = None  # type: ignore
+    _breakers: Dict[str, CircuitBreaker] = {}
+    failure_threshold: int = 5
+    reset_timeout: float = 30.0
+    markets_refresh_interval: float = 3600.0
+    instance = None
+
+    _task: asyncio.Task = None  # type: ignore
+
+    def __new__(cls):
+        """
+        Singleton pattern
+        """
+        if not cls.instance:
+            cls.instance = super(ExchangeManager, cls).__new__(cls)
+        return cls.instance
+
+    @property
+    def exchanges(self) -> List[Exchange]:
+        return self._exchanges
+
+    async def connect(
+        self,
+        names: List[str],
+        keepalive_timeout: float = 60.0,
+        limit_per_host: int = 8,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        markets_refresh_interval: float = 3600.0,
+    ):
+        """
+        Create long-lived exchange instances that share one HTTP session.
+        Idle connections are kept for `keepalive_timeout` seconds, which is longer than the polling interval, so every poll reuses a warm TLS connection.
+        Every exchange gets a circuit breaker that opens after `failure_threshold` consecutive failed calls for `reset_timeout` seconds.
+        Markets are reloaded every `markets_refresh_interval` seconds in every process, the exchanges live in the process that polls with them.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.markets_refresh_interval = markets_refresh_interval
+        self._breakers = {}
+        connector = aiohttp.TCPConnector(
+            ssl=ssl.create_default_context(cafile=certifi.where()),
+            limit_per_host=limit_per_host,
+            keepalive_timeout=keepalive_timeout,
+            ttl_dns_cache=300,
+            enable_cleanup_closed=True,
+        )
+        self._session = aiohttp.ClientSession(connector=connector)
+        self._exchanges = [getattr(ccxt, name)({"session": self._session, "enableRateLimit": True}) for name in names]
+        await self.refresh_markets(reload=False)
+        self._task = asyncio.create_task(self._run())
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        """
+        Circuit breaker of the exchange named `name`, exchanges created outside the manager share the breaker of their name.
+        """
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, failure_threshold=self.failure_threshold, reset_timeout=self.reset_timeout)
+            self._breakers[name] = breaker
+        return breaker
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: breaker.snapshot() for name, breaker in self._breakers.items()}
+
+    async def refresh_markets(self, reload: bool = True):
+        """
+        Load markets of every exchange, an exchange that fails keeps its previous markets.
+        """
+        results = await asyncio.gather(*[exchange.load_markets(reload=reload) for exchange in self._exchanges], return_exceptions=True)
+        for exchange, result in zip(self._exchanges, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to load markets for {exchange.name}. Reason: {result}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.markets_refresh_interval)
+            try:
+                await self.refresh_markets()
+            except Exception as e:
+                logger.warning(f"Failed to refresh markets. Reason: {e}")
+
+    async def disconnect(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None  # type: ignore
+        await asyncio.gather(*[exchange.close() for exchange in self._exchanges], return_exceptions=True)
+        self._exchanges = []
+        if self._session is not None:
+            await self._session.close()
+            self._session = None  # type: ignore
@@ -0,0 +1,390 @@
+import asyncio
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.jobs.events import encode_event
+from app.jobs.jetton import jetton_wallet_key
+from app.jobs.leaderboard import LEADERBOARD_KEY
+from app.models.queries import alarm_by_id_filter, increment_filter, sync_state_filter
+from app.providers.manager import LEASE_TOKEN, CacheManager, DatabaseManager, IngestionManager
+from app.utils.metrics import LATENCY_BUCKETS, SIZE_BUCKETS, Histogram
+
+# flush ids remembered on every document written with `$inc`, a retried flush finds its id and skips the document
+APPLIED_FLUSHES = 16
+
+# writes are queued under the fencing token of the lease their subscription runs under, None outside of leases like in backfill
+Token = Optional[str]
+
+
+class IncrementBatch:
+    """
+    `$inc` writes of one flush to one collection, by address. The writes that failed are retried with the same id until every address is
+    written, so a write the database applied before failing or timing out is not applied again.
+    """
+
+    def __init__(self, collection: str, increments: Dict[str, Dict[str, float]], token: Token = None, stamped: bool = False):
+        self.id = uuid.uuid4().hex
+        self.collection = collection
+        self.increments = increments
+        self.token = token
+        # set `updated_at` on every written document
+        self.stamped = stamped
+        self.pending = set(increments)
+
+
+class IngestionBuffer(IngestionManager):
+    """
+    Write buffer between the oracle subscriptions and the database.
+    Alarm writes of every subscription are queued in arrival order and flushed as one ordered `bulk_write`, so the writes of an oracle
+    are applied in the order its events were received. Leaderboard rewards and user stats changes are summed per address and flushed after
+    the alarms as an `IncrementBatch`, sync checkpoints are flushed last so a checkpoint never runs ahead of the writes of the events before it.
+    Stream events are published once the writes they describe are flushed, so a client refetching on an event sees the change.
+    Every write is queued with the lease token of its subscription. Before each flush, retries included, the `fence` is asked which tokens
+    are still held and the writes of the others are dropped, their next owner replays them from the sync checkpoint.
+    A flush runs when `batch_size` writes are queued or `flush_interval` seconds after the previous one. Callers wait for a flush when
+    `max_pending` writes are queued, `max_pending=1` writes every event through.
+    """
+
+    db: DatabaseManager = None  # type: ignore
+    cache: CacheManager = None  # type: ignore
+    batch_size: int = 500
+    flush_interval: float = 0.25
+    max_pending: int = 5000
+    alarm_cache_size: int = 10000
+    publish_events: bool = True
+    events: int = 0
+    written: int = 0
+    failed: int = 0
+    dropped: int = 0
+    flush_latency: Histogram = Histogram(LATENCY_BUCKETS)
+    batch_sizes: Histogram = Histogram(SIZE_BUCKETS)
+    instance = None
+
+    _alarm_ops: List[Tuple[Token, UpdateOne]] = []
+    _rewards: Dict[Token, Dict[str, float]] = {}
+    _user_stats: Dict[Token, Dict[str, Dict[str, float]]] = {}
+    _checkpoints: Dict[Tuple[Token, str], int] = {}
+    # increment batches of earlier flushes that are not fully written, retried before anything queued after them
+    _batches: List[IncrementBatch] = []
+    _events: List[Tuple[Token, str, str]] = []
+    # alarms written through the buffer, by oracle and id, so wind and ring events rarely read an alarm back from the database
+    _alarms: "OrderedDict[Tuple[str, int], Dict[str, Any]]" = OrderedDict()
+    _fence: Optional[Callable[[List[str]], Awaitable[Set[str]]]] = None
+    _full: asyncio.Event = None  # type: ignore
+    _lock: asyncio.Lock = None  # type: ignore
+    _task: Optional[asyncio.Task] = None
+
+    def __new__(cls):
+        """
+        Singleton pattern
+        """
+        if not cls.instance:
+            cls.instance = super(IngestionBuffer, cls).__new__(cls)
+        return cls.instance
+
+    async def connect(
+        self,
+        db: DatabaseManager,
+        cache: CacheManager,
+        batch_size: int = 500,
+        flush_interval: float = 0.25,
+        max_pending: int = 5000,
+        alarm_cache_size: int = 10000,
+        publish_events: bool = True,
+    ):
+        """
+        `publish_events=False` drops stream events instead of publishing them, redis pub/sub ignores the database index so the events of a
+        scratch run would reach the live `/stream` clients.
+        """
+        self.db = db
+        self.cache = cache
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, 1)
+        self.alarm_cache_size = alarm_cache_size
+        self.publish_events = publish_events
+        self._alarm_ops = []
+        self._rewards = {}
+        self._user_stats = {}
+        self._checkpoints = {}
+        self._batches = []
+        self._events = []
+        self._alarms = OrderedDict()
+        self._full = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self.events = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self.flush_latency = Histogram(LATENCY_BUCKETS)
+        self.batch_sizes = Histogram(SIZE_BUCKETS)
+        self._task = asyncio.create_task(self._run())
+
+    def set_fence(self, fence: Optional[Callable[[List[str]], Awaitable[Set[str]]]]):
+        """
+        `fence` returns the lease tokens of its argument that are still held, see `LeaseManager.held`.
+        """
+        self._fence = fence
+
+    def _pending(self) -> int:
+        return (
+            len(self._alarm_ops)
+            + sum(len(rewards) for rewards in self._rewards.values())
+            + sum(len(stats) for stats in self._user_stats.values())
+            + len(self._checkpoints)
+            + sum(len(batch.pending) for batch in self._batches)
+        )
+
+    def _remember(self, alarm: Dict[str, Any]):
+        key = (alarm["oracle"], alarm["id"])
+        self._alarms[key] = alarm
+        self._alarms.move_to_end(key)
+        while len(self._alarms) > self.alarm_cache_size:
+            self._alarms.popitem(last=False)
+
+    async def _queued(self):
+        self.events += 1
+        if self._pending() >= self.batch_size:
+            self._full.set()
+        while self._pending() >= self.max_pending:
+            await self.flush()
+            if self._pending() >= self.max_pending:
+                # the flush failed, back off instead of spinning on the database
+                await asyncio.sleep(self.flush_interval)
+
+    async def upsert_alarm(self, alarm: Dict[str, Any]):
+        self._alarm_ops.append((LEASE_TOKEN.get(), UpdateOne(alarm_by_id_filter(alarm["oracle"], alarm["id"]), {"$set": alarm}, upsert=True)))
+        self._remember(alarm)
+        await self._queued()
+
+    async def update_alarm(self, oracle: str, alarm_id: int, fields: Dict[str, Any]):
+        # remembered alarms are only read for fields that never change after the tick, they are not patched here
+        self._alarm_ops.append((LEASE_TOKEN.get(), UpdateOne(alarm_by_id_filter(oracle, alarm_id), {"$set": fields})))
+        await self._queued()
+
+    async def add_reward(self, address: str, reward: float):
+        rewards = self._rewards.setdefault(LEASE_TOKEN.get(), {})
+        rewards[address] = rewards.get(address, 0.0) + reward
+        await self._queued()
+
+    async def add_user_stats(self, address: str, deltas: Dict[str, float]):
+        # counted on top of the queued changes of the address, like rewards
+        stats = self._user_stats.setdefault(LEASE_TOKEN.get(), {}).setdefault(address, {})
+        for field, delta in deltas.items():
+            stats[field] = stats.get(field, 0) + delta
+        await self._queued()
+
+    async def checkpoint(self, oracle: str, lt: int):
+        key = (LEASE_TOKEN.get(), oracle)
+        self._checkpoints[key] = max(lt, self._checkpoints.get(key, lt))
+        await self._queued()
+
+    async def publish(self, channel: str, event: Dict[str, Any]):
+        if not self.publish_events:
+            return
+        # published with the next flush, not counted as a pending write since every event comes with one
+        self._events.append((LEASE_TOKEN.get(), channel, encode_event(event)))
+
+    async def find_alarm(self, oracle: str, alarm_id: int) -> Optional[Dict[str, Any]]:
+        alarm = self._alarms.get((oracle, alarm_id))
+        if alarm is not None:
+            self._alarms.move_to_end((oracle, alarm_id))
+            return alarm
+        # the alarm may be queued but already evicted, write the queue before reading it back
+        if len(self._alarm_ops) > 0:
+            await self.flush()
+        alarm = await self.db.db["alarms"].find_one(alarm_by_id_filter(oracle, alarm_id))
+        if alarm is not None:
+            self._remember(alarm)
+        return alarm
+
+    async def _write_alarms(self, ops: List[UpdateOne]):
+        while len(ops) > 0:
+            try:
+                await self.db.db["alarms"].bulk_write(ops, ordered=True)
+                self.written += len(ops)
+                return
+            except BulkWriteError as e:
+                # an ordered bulk stops at the first failed write, skip it and resume after it
+                index = e.details["writeErrors"][0]["index"]
+                print(f"Ingestion | skipped alarm write {ops[index]}: {e.details['writeErrors'][0].get('errmsg')}")
+                self.written += index
+                self.failed += 1
+                ops = ops[index + 1 :]
+
+    async def _write_increments(self, collection: str, batches: List[IncrementBatch]):
+        """
+        Write the pending addresses of `batches` in one bulk, a document that already holds the id of a batch matches no filter and is
+        left alone. Its upsert then fails on the unique address index, as does the upsert of an address a concurrent writer created first,
+        the two are told apart by reading the batch id back. Addresses that failed otherwise stay pending.
+        """
+        now = datetime.now()
+        targets: List[Tuple[IncrementBatch, str]] = []
+        ops = []
+        for batch in batches:
+            for address in sorted(batch.pending):
+                update: Dict[str, Any] = {"$inc": batch.increments[address], "$push": {"flushes": {"$each": [batch.id], "$slice": -APPLIED_FLUSHES}}}
+                if batch.stamped:
+                    update["$set"] = {"updated_at": now}
+                targets.append((batch, address))
+                ops.append(UpdateOne(increment_filter(address, batch.id), update, upsert=True))
+        if len(ops) == 0:
+            return
+        failed: Set[int] = set()
+        try:
+            await self.db.db[collection].bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details["writeErrors"]}
+            for index in [error["index"] for error in e.details["writeErrors"] if error.get("code") == 11000]:
+                batch, address = targets[index]
+                if await self.db.db[collection].find_one({"address": address, "flushes": batch.id}, {"_id": 1}) is not None:
+                    failed.discard(index)
+        for index, (batch, address) in enumerate(targets):
+            if index not in failed:
+                batch.pending.discard(address)
+        self.written += len(ops) - len(failed)
+        if len(failed) > 0:
+            raise Exception(f"{len(failed)} of {len(ops)} {collection} increments failed, they are retried with the next flush")
+
+    async def _write_checkpoints(self, checkpoints: Dict[str, int]):
+        now = datetime.now()
+        await self.db.db["sync_state"].bulk_write(
+            [UpdateOne(sync_state_filter(oracle), {"$max": {"lt": lt}, "$set": {"updated_at": now}}, upsert=True) for oracle, lt in checkpoints.items()],
+            ordered=False,
+        )
+        self.written += len(checkpoints)
+
+    async def _mirror_rewards(self, rewards: Dict[str, float]):
+        # mirrored once per written batch, the database is the source of truth and a failed sorted set update is fixed by
+        # `main.py rebuild-leaderboard`, it does not hold back the rest of the flush
+        try:
+            pipe = self.cache.client.pipeline(transaction=False)
+            for address, reward in rewards.items():
+                pipe.zincrby(LEADERBOARD_KEY, reward, address)
+                # the payout changed the reward jetton balance of the receiver
+                pipe.delete(jetton_wallet_key(address))
+            await pipe.execute()
+        except Exception:
+            print(traceback.format_exc())
+
+    async def _publish(self, events: List[Tuple[str, str]]):
+        pipe = self.cache.client.pipeline(transaction=False)
+        for channel, message in events:
+            pipe.publish(channel, message)
+        await pipe.execute()
+
+    def _drop(self, tokens: Set[Token]):
+        """
+        Drop every queued write of `tokens`, their subscriptions lost their leases.
+        """
+        size = self._pending()
+        self._alarm_ops = [(token, op) for token, op in self._alarm_ops if token not in tokens]
+        self._checkpoints = {key: lt for key, lt in self._checkpoints.items() if key[0] not in tokens}
+        self._batches = [batch for batch in self._batches if batch.token not in tokens]
+        self._events = [event for event in self._events if event[0] not in tokens]
+        self.dropped += size - self._pending()
+        # remembered alarms of the dropped writes were never written
+        self._alarms.clear()
+        print(f"Ingestion | dropped {size - self._pending()} writes of {len(tokens)} subscriptions that lost their lease")
+
+    async def flush(self):
+        async with self._lock:
+            if self._pending() == 0 and len(self._events) == 0:
+                return
+            for token, rewards in self._rewards.items():
+                self._batches.append(IncrementBatch("leaderboard", {address: {"reward": reward} for address, reward in rewards.items()}, token=token))
+            for token, stats in self._user_stats.items():
+                self._batches.append(IncrementBatch("user_stats", stats, token=token, stamped=True))
+            self._rewards = {}
+            self._user_stats = {}
+            start = time.perf_counter()
+            try:
+                tokens = {token for token, _ in self._alarm_ops} | {key[0] for key in self._checkpoints} | {batch.token for batch in self._batches}
+                tokens |= {event[0] for event in self._events}
+                tokens.discard(None)
+                if self._fence is not None and len(tokens) > 0:
+                    lost = tokens - await self._fence(sorted(tokens))  # type: ignore
+                    if len(lost) > 0:
+                        self._drop(lost)  # type: ignore
+            except Exception:
+                # nothing is written without knowing who holds the leases
+                print(traceback.format_exc())
+                self.flush_latency.observe(time.perf_counter() - start)
+                return
+            ops, self._alarm_ops = self._alarm_ops, []
+            checkpoints: Dict[str, int] = {}
+            for (_, oracle), lt in self._checkpoints.items():
+                checkpoints[oracle] = max(lt, checkpoints.get(oracle, lt))
+            queued_checkpoints, self._checkpoints = self._checkpoints, {}
+            events, self._events = self._events, []
+            size = len(ops) + sum(len(batch.pending) for batch in self._batches) + len(checkpoints)
+            try:
+                await self._write_alarms([op for _, op in ops])
+                ops = []
+                for collection in ["leaderboard", "user_stats"]:
+                    batches = [batch for batch in self._batches if batch.collection == collection]
+                    try:
+                        await self._write_increments(collection, batches)
+                    finally:
+                        # a batch is only dropped once every address of it is written, failed writes keep it and the checkpoints queued
+                        for batch in batches:
+                            if len(batch.pending) == 0:
+                                self._batches.remove(batch)
+                                if collection == "leaderboard":
+                                    await self._mirror_rewards({address: increments["reward"] for address, increments in batch.increments.items()})
+                if len(checkpoints) > 0:
+                    await self._write_checkpoints(checkpoints)
+                    queued_checkpoints = {}
+                if len(events) > 0:
+                    # stream clients catch up by refetching, events that fail to publish are not retried
+                    published, events = events, []
+                    await self._publish([(channel, message) for _, channel, message in published])
+            except Exception:
+                print(traceback.format_exc())
+                # requeue what was not written in front of the writes queued meanwhile, alarm writes are idempotent $set and unwritten
+                # increment batches are still queued with their ids
+                self._alarm_ops = ops + self._alarm_ops
+                for key, lt in queued_checkpoints.items():
+                    self._checkpoints[key] = max(lt, self._checkpoints.get(key, lt))
+                self._events = events + self._events
+                return
+            finally:
+                self.flush_latency.observe(time.perf_counter() - start)
+            self.batch_sizes.observe(size)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "events": self.events,
+            "written": self.written,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "pending": self._pending(),
+            "flush_latency_seconds": self.flush_latency.snapshot(),
+            "batch_size": self.batch_sizes.snapshot(),
+        }
+
+    async def disconnect(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from redis.commands.core import AsyncScript
+
+from app.providers.manager import LEASE_TOKEN, CacheManager, LeaseManager
+from app.utils.hash_ring import HashRing
+
+logger = logging.getLogger(__name__)
+
+NODES_KEY = "leases$nodes"
+
+# Extend KEYS[1] to ARGV[2] milliseconds if it is still held by ARGV[1]
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+# Delete KEYS[1] if it is still held by ARGV[1]
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# built once without a client, every call passes the client or pipeline it runs on
+RENEW = AsyncScript(None, RENEW_SCRIPT.encode())  # type: ignore
+RELEASE = AsyncScript(None, RELEASE_SCRIPT.encode())  # type: ignore
+
+Unit = Callable[[], Awaitable[Any]]
+
+# a unit that keeps crashing is restarted after heartbeat_interval * 2 ** (crashes - 1) seconds, up to this many
+MAX_RESTART_BACKOFF = 300.0
+
+
+def lease_key(unit: str) -> str:
+    return f"lease${unit}"
+
+
+class LeaseCoordinator(LeaseManager):
+    """
+    Runs every unit of work, like the subscription of one oracle, in exactly one process across all nodes.
+    Every process is a node that heartbeats into a redis sorted set scored by the time its heartbeat expires. Each heartbeat the live
+    nodes are placed on a consistent hash ring and a node runs the units the ring assigns to it, once it holds their lease: a redis key
+    set with NX for `lease_ttl` seconds. A node that joins takes over about 1/nodes of the units, the previous owners stop and release
+    them on their next heartbeat. The units of a node that dies move once its heartbeat and leases expire.
+    The lease, not the ring, guarantees a single owner: nodes can briefly disagree on the ring but only one of them holds the key.
+    Leases are renewed by their own task, which never waits for a unit to stop, and a unit is cancelled as soon as a renewal fails.
+    Every run of a unit gets a fencing token, its writes are fenced with `held`, which only vouches for the current run of a unit whose
+    lease this node renewed less than `lease_ttl - heartbeat_interval` seconds ago and still finds in redis.
+    """
+
+    cache: CacheManager = None  # type: ignore
+    node_id: str = ""
+    lease_ttl: float = 15.0
+    heartbeat_interval: float = 5.0
+    vnodes: int = 64
+    instance = None
+
+    _units: Callable[[], Awaitable[Dict[str, Unit]]] = None  # type: ignore
+    _drain: Optional[Callable[[], Awaitable[Any]]] = None
+    _tasks: Dict[str, asyncio.Task] = {}
+    # units that are winding down, their leases are renewed until they are released
+    _stopping: Dict[str, asyncio.Task] = {}
+    # monotonic time until which the lease of a unit is known to be held, measured from before the request that set or renewed it
+    _valid_until: Dict[str, float] = {}
+    _crashes: Dict[str, int] = {}
+    _restart_at: Dict[str, float] = {}
+    _started_at: Dict[str, float] = {}
+    # fencing token of the current run of every unit
+    _tokens: Dict[str, str] = {}
+    _nodes: List[str] = []
+    _wake: asyncio.Event = None  # type: ignore
+    _task: asyncio.Task = None  # type: ignore
+    _renew_task: asyncio.Task = None  # type: ignore
+
+    def __new__(cls):
+        """
+        Singleton pattern
+        """
+        if not cls.instance:
+            cls.instance = super(LeaseCoordinator, cls).__new__(cls)
+        return cls.instance
+
+    async def connect(
+        self,
+        cache: CacheManager,
+        units: Callable[[], Awaitable[Dict[str, Unit]]],
+        lease_ttl: float = 15.0,
+        vnodes: int = 64,
+        drain: Optional[Callable[[], Awaitable[Any]]] = None,
+    ):
+        """
+        Start balancing, `units` returns every unit of the deployment by key, with the coroutine function that runs it until cancelled.
+        `drain` writes what stopped units queued, it runs before their leases are released so the writes are not fenced off.
+        """
+        self.cache = cache
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_ttl = lease_ttl
+        self.heartbeat_interval = lease_ttl / 3
+        self.vnodes = vnodes
+        self._units = units
+        self._drain = drain
+        self._tasks = {}
+        self._stopping = {}
+        self._valid_until = {}
+        self._crashes = {}
+        self._restart_at = {}
+        self._started_at = {}
+        self._tokens = {}
+        self._nodes = []
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        self._renew_task = asyncio.create_task(self._run_renewals())
+
+    async def _heartbeat(self) -> List[str]:
+        now = time.time()
+        pipe = self.cache.client.pipeline(transaction=False)
+        pipe.zadd(NODES_KEY, {self.node_id: now + self.lease_ttl})
+        pipe.zremrangebyscore(NODES_KEY, "-inf", now)
+        pipe.zrange(NODES_KEY, 0, -1)
+        *_, nodes = await pipe.execute()
+        return [node.decode() if isinstance(node, bytes) else node for node in nodes]
+
+    async def _acquire(self, unit: str) -> bool:
+        sent = time.monotonic()
+        acquired = bool(await self.cache.client.set(lease_key(unit), self.node_id, nx=True, px=int(self.lease_ttl * 1000)))
+        if acquired:
+            self._valid_until[unit] = sent + self.lease_ttl
+        return acquired
+
+    async def _renew(self, units: List[str]) -> Dict[str, bool]:
+        pipe = self.cache.client.pipeline(transaction=False)
+        for unit in units:
+            await RENEW(keys=[lease_key(unit)], args=[self.node_id, int(self.lease_ttl * 1000)], client=pipe)
+        sent = time.monotonic()
+        renewed = {unit: bool(result) for unit, result in zip(units, await pipe.execute())}
+        for unit, held in renewed.items():
+            if held:
+                self._valid_until[unit] = sent + self.lease_ttl
+        return renewed
+
+    async def _release(self, unit: str):
+        self._valid_until.pop(unit, None)
+        self._tokens.pop(unit, None)
+        await RELEASE(keys=[lease_key(unit)], args=[self.node_id], client=self.cache.client)
+
+    async def _run_unit(self, token: str, run: Unit):
+        # tasks the unit starts inherit the context, so every write it queues is tagged with the token of this run
+        LEASE_TOKEN.set(token)
+        await run()
+
+    async def _stop(self, unit: str, release: bool):
+        task = self._tasks.pop(unit)
+        task.cancel()
+        self._stopping[unit] = task
+        try:
+            # wait for the unit to wind down before another node may take the lease, the lease is renewed meanwhile
+            await asyncio.gather(task, return_exceptions=True)
+            if release:
+                if self._drain is not None:
+                    await self._drain()
+                await self._release(unit)
+        finally:
+            self._stopping.pop(unit, None)
+
+    def _lost(self, unit: str):
+        """
+        Cancel a unit whose lease is gone without waiting for it, it must not write once another node may run it.
+        """
+        self._valid_until.pop(unit, None)
+        self._tokens.pop(unit, None)
+        task = self._tasks.pop(unit, None) or self._stopping.pop(unit, None)
+        if task is not None:
+            task.cancel()
+
+    def _crashed(self, unit: str, error: Optional[BaseException]):
+        ran = time.monotonic() - self._started_at.get(unit, 0.0)
+        # a unit that ran longer than the longest backoff before crashing starts over from the shortest one
+        crashes = 1 if ran > MAX_RESTART_BACKOFF else self._crashes.get(unit, 0) + 1
+        self._crashes[unit] = crashes
+        backoff = min(MAX_RESTART_BACKOFF, self.heartbeat_interval * 2 ** (crashes - 1))
+        self._restart_at[unit] = time.monotonic() + backoff
+        logger.warning(f"Leases | {unit} stopped after crash {crashes}: {error!r}, restarting it in {backoff:.1f}s")
+
+    async def _balance(self):
+        self._nodes = await self._heartbeat()
+        ring = HashRing(self._nodes, self.vnodes)
+        units = await self._units()
+        assigned = {unit for unit in units if ring.owner(unit) == self.node_id}
+        for unit, task in list(self._tasks.items()):
+            if unit not in self._tasks:
+                # the renewal task cancelled it meanwhile
+                continue
+            if task.done():
+                self._crashed(unit, task.exception() if not task.cancelled() else asyncio.CancelledError())
+                await self._stop(unit, release=True)
+            elif unit not in assigned:
+                logger.info(f"Leases | {unit} moved to another node")
+                await self._stop(unit, release=True)
+        now = time.monotonic()
+        for unit in sorted(assigned - set(self._tasks) - set(self._stopping)):
+            if self._restart_at.get(unit, 0.0) > now:
+                continue
+            if await self._acquire(unit):
+                logger.info(f"Leases | {unit} started on {self.node_id}")
+                self._started_at[unit] = time.monotonic()
+                self._tokens[unit] = f"{unit}#{uuid.uuid4().hex[:8]}"
+                self._tasks[unit] = asyncio.create_task(self._run_unit(self._tokens[unit], units[unit]))
+
+    async def _run(self):
+        while True:
+            try:
+                await self._balance()
+            except Exception:
+                logger.exception("Leases | balancing failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.heartbeat_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _run_renewals(self):
+        while True:
+            units = [*self._tasks, *self._stopping]
+            try:
+                if len(units) > 0:
+                    for unit, held in (await self._renew(units)).items():
+                        if not held:
+                            logger.warning(f"Leases | lost the lease of {unit}, stopping it")
+                            self._lost(unit)
+            except Exception:
+                logger.exception("Leases | renewing leases failed")
+            # a lease that could not be renewed in time is treated as lost, whatever redis holds
+            now = time.monotonic()
+            for unit in [*self._tasks, *self._stopping]:
+                if self._valid_until.get(unit, 0.0) <= now:
+                    logger.warning(f"Leases | the lease of {unit} expired before it was renewed, stopping it")
+                    self._lost(unit)
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def held(self, tokens: List[str]) -> Set[str]:
+        """
+        Tokens of `tokens` that belong to the current run of a unit whose lease this node holds with at least a heartbeat interval left,
+        read back from redis. Writes of a token that is not returned must be dropped, the next run replays them from the sync checkpoint,
+        so a run that still goes on without its writes is stopped here.
+        """
+        deadline = time.monotonic() + self.heartbeat_interval
+        current = {token: unit for unit, token in self._tokens.items()}
+        fresh = [token for token in tokens if token in current and self._valid_until.get(current[token], 0.0) > deadline]
+        held = set()
+        if self.cache is not None and len(fresh) > 0:
+            owners = await self.cache.client.mget([lease_key(current[token]) for token in fresh])
+            held = {token for token, owner in zip(fresh, owners) if owner is not None and (owner.decode() if isinstance(owner, bytes) else owner) == self.node_id}
+        for token in tokens:
+            if token not in held and token in current:
+                logger.warning(f"Leases | dropped the writes of {current[token]}, its lease is not held long enough, stopping it")
+                self._lost(current[token])
+        return held
+
+    def rebalance(self):
+        """
+        Balance now instead of on the next heartbeat, used after the units changed.
+        """
+        if self._wake is not None:
+            self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "node": self.node_id,
+            "nodes": self._nodes,
+            "units": sorted(self._tasks),
+            "backing_off": {unit: round(at - now, 1) for unit, at in sorted(self._restart_at.items()) if at > now},
+        }
+
+    async def disconnect(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None  # type: ignore
+        if self.cache is None:
+            return
+        # stopping units keep their leases renewed until they are released
+        for unit in list(self._tasks):
+            await self._stop(unit, release=True)
+        if self._renew_task is not None:
+            self._renew_task.cancel()
+            await asyncio.gather(self._renew_task, return_exceptions=True)
+            self._renew_task = None  # type: ignore
+        # leave the ring right away so the other nodes take over on their next heartbeat
+        await self.cache.client.zrem(NODES_KEY, self.node_id)
@@ -0,0 +1,124 @@
+import asyncio
+import json
+import os
+import socket
+import time
+import traceback
+from typing import Any, Callable, Dict
+
+from app.providers.manager import CacheManager, MetricsManager
+from app.utils.metrics import REGISTRY, render_metrics
+
+NODES_KEY = "metrics$nodes"
+
+
+def snapshot_key(process: str) -> str:
+    return f"metrics${process}"
+
+
+def stats_key(process: str) -> str:
+    return f"metrics$stats${process}"
+
+
+class MetricsReporter(MetricsManager):
+    """
+    Shares the metrics of this process with the other processes of the deployment.
+    API workers and ingestion workers are separate processes and only the API ones serve HTTP, so every process writes a snapshot of its
+    registry to redis every `interval` seconds and `/metrics` renders the snapshots of all live processes, each sample labeled with the
+    process it comes from. A process that stops reporting drops out after three intervals.
+    The debug stats of the ingestion, like its flush latency or the leases it holds, are shared the same way so the `/core/debug` endpoints
+    of an API worker show every worker. They are reported even when metrics are disabled.
+    """
+
+    cache: CacheManager = None  # type: ignore
+    process: str = ""
+    interval: float = 15.0
+    instance = None
+
+    _stats: Dict[str, Callable[[], Dict[str, Any]]] = {}
+    _task: asyncio.Task = None  # type: ignore
+
+    def __new__(cls):
+        """
+        Singleton pattern
+        """
+        if not cls.instance:
+            cls.instance = super(MetricsReporter, cls).__new__(cls)
+        return cls.instance
+
+    async def connect(self, cache: CacheManager, interval: float = 15.0, enabled: bool = True):
+        self.cache = cache
+        self.process = f"{socket.gethostname()}:{os.getpid()}"
+        self.interval = interval
+        self._stats = {}
+        REGISTRY.enabled = enabled
+        self._task = asyncio.create_task(self._run())
+
+    def add_stats(self, name: str, stats: Callable[[], Dict[str, Any]]):
+        """
+        Report `stats()` of this process under `name`, read back by `stats(name)` in any process.
+        """
+        self._stats[name] = stats
+
+    def _collect(self) -> Dict[str, Dict[str, Any]]:
+        return {name: stats() for name, stats in self._stats.items()}
+
+    async def _report(self):
+        ttl = self.interval * 3
+        pipe = self.cache.client.pipeline(transaction=False)
+        pipe.zadd(NODES_KEY, {self.process: time.time() + ttl})
+        if REGISTRY.enabled:
+            pipe.set(snapshot_key(self.process), json.dumps(REGISTRY.snapshot()), px=int(ttl * 1000))
+        if len(self._stats) > 0:
+            pipe.set(stats_key(self.process), json.dumps(self._collect()), px=int(ttl * 1000))
+        await pipe.execute()
+
+    async def _run(self):
+        while True:
+            try:
+                await self._report()
+            except Exception:
+                print(traceback.format_exc())
+            await asyncio.sleep(self.interval)
+
+    async def _reports(self, key: Callable[[str], str]) -> Dict[str, Any]:
+        """
+        Last report of every other live process, read from `key(process)`.
+        """
+        now = time.time()
+        await self.cache.client.zremrangebyscore(NODES_KEY, "-inf", now)
+        processes = [p.decode() if isinstance(p, bytes) else p for p in await self.cache.client.zrange(NODES_KEY, 0, -1)]
+        others = [p for p in processes if p != self.process]
+        reports: Dict[str, Any] = {}
+        if len(others) > 0:
+            for process, raw in zip(others, await self.cache.client.mget([key(p) for p in others])):
+                if raw is not None:
+                    reports[process] = json.loads(raw)
+        return reports
+
+    async def render(self) -> str:
+        snapshots = await self._reports(snapshot_key)
+        # this process answers with its live registry rather than its last report
+        snapshots[self.process] = REGISTRY.snapshot()
+        return render_metrics(snapshots)
+
+    async def stats(self, name: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Stats reported under `name` by every live process, by process.
+        """
+        reports = {process: report[name] for process, report in (await self._reports(stats_key)).items() if name in report}
+        if name in self._stats:
+            reports[self.process] = self._stats[name]()
+        return dict(sorted(reports.items()))
+
+    async def disconnect(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None  # type: ignore
+        if self.cache is None:
+            return
+        pipe = self.cache.client.pipeline(transaction=False)
+        pipe.zrem(NODES_KEY, self.process)
+        pipe.delete(snapshot_key(self.process), stats_key(self.process))
+        await pipe.execute()
@@ -1,13 +1,44 @@
+from typing import Dict, Tuple
+
 from app.providers.manager import DatabaseManager
-from pymongo import MongoClient
-from pymongo.database import Database
-import os
+from app.utils.metrics import MONGO_ERRORS, MONGO_LATENCY, REGISTRY
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo.monitoring import CommandFailedEvent, CommandListener, CommandStartedEvent, CommandSucceededEvent
+
+
+class CommandTimer(CommandListener):
+    """
+    Records the duration of every command by command and collection, as measured by the driver.
+    The collection is only known when a command starts, it is kept by request id until the command ends.
+    """
+
+    def __init__(self):
+        self._pending: Dict[Tuple[int, int], str] = {}
+
+    def started(self, event: CommandStartedEvent):
+        if REGISTRY.enabled:
+            collection = event.command.get(event.command_name)
+            if not isinstance(collection, str):
+                # getMore names its collection in a field of its own
+                collection = event.command.get("collection", "")
+            self._pending[(event.request_id, event.operation_id)] = collection
+
+    def succeeded(self, event: CommandSucceededEvent):
+        collection = self._pending.pop((event.request_id, event.operation_id), None)
+        if collection is not None:
+            MONGO_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+
+    def failed(self, event: CommandFailedEvent):
+        collection = self._pending.pop((event.request_id, event.operation_id), None)
+        if collection is not None:
+            MONGO_LATENCY.labels(event.command_name, collection).observe(event.duration_micros / 1e6)
+            MONGO_ERRORS.labels(event.command_name, collection).inc()
 
 
 class MongoManager(DatabaseManager):
-    client: MongoClient = None  # type: ignore
-    db: Database = None  # type: ignore
-    
+    client: AsyncIOMotorClient = None  # type: ignore
+    db: AsyncIOMotorDatabase = None  # type: ignore
+
     instance = None
 
     def __new__(cls):
@@ -25,16 +56,22 @@ class MongoManager(DatabaseManager):
         username: str,
         password: str,
         db_name: str,
+        max_pool_size: int = 100,
+        min_pool_size: int = 0,
+        max_idle_time_ms: int = 0,
     ):
-        self.client = MongoClient(
+        self.client = AsyncIOMotorClient(
             host=host,
             port=port,
             username=username,
             password=password,
-            connect=True,
             serverSelectionTimeoutMS=3000,
             connectTimeoutMS=3000,
             timeoutMS=3000,
+            maxPoolSize=max_pool_size,
+            minPoolSize=min_pool_size,
+            maxIdleTimeMS=max_idle_time_ms or None,
+            event_listeners=[CommandTimer()],
         )
         self.db = self.client.get_database(db_name)
 
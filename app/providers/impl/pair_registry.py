@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from app.models.core import Pair
+from app.providers.manager import CacheManager, DatabaseManager, PairRegistryManager
+
+PAIRS_VERSION_KEY = "pairs$version"
+
+
+class PairRegistry(PairRegistryManager):
+    """
+    In-memory copy of the `pairs` collection.
+    Writers bump a version key in redis, every process compares it with the version it loaded at most once per `check_interval` seconds
+    and reloads the collection when it changed, so a pair change is visible everywhere within `check_interval`.
+    """
+
+    db: DatabaseManager = None  # type: ignore
+    cache: CacheManager = None  # type: ignore
+    check_interval: float = 1.0
+    instance = None
+
+    _pairs: List[Pair] = []
+    _by_id: Dict[str, Pair] = {}
+    _by_oracle: Dict[str, Pair] = {}
+    _version: Optional[bytes] = None
+    _loaded: bool = False
+    _checked_at: float = 0.0
+    _lock: asyncio.Lock = None  # type: ignore
+
+    def __new__(cls):
+        """
+        Singleton pattern
+        """
+        if not cls.instance:
+            cls.instance = super(PairRegistry, cls).__new__(cls)
+            # an asyncio lock binds to a loop on first contended use only, so it can exist before `connect`
+            cls.instance._lock = asyncio.Lock()
+        return cls.instance
+
+    async def connect(self, db: DatabaseManager, cache: CacheManager, check_interval: float = 1.0):
+        self.db = db
+        self.cache = cache
+        self.check_interval = check_interval
+        self._lock = asyncio.Lock()
+        self._loaded = False
+        await self._refresh()
+
+    async def _reload(self, version: Optional[bytes]):
+        pairs = [Pair(**i) async for i in self.db.db["pairs"].find()]
+        self._pairs = pairs
+        self._by_id = {pair.id: pair for pair in pairs}
+        self._by_oracle = {pair.oracle_address: pair for pair in pairs}
+        self._version = version
+        self._loaded = True
+
+    async def _refresh(self):
+        if self._loaded and time.monotonic() - self._checked_at < self.check_interval:
+            return
+        async with self._lock:
+            if self._loaded and time.monotonic() - self._checked_at < self.check_interval:
+                return
+            version = await self.cache.client.get(PAIRS_VERSION_KEY)
+            if not self._loaded or version != self._version:
+                await self._reload(version)
+            self._checked_at = time.monotonic()
+
+    async def list(self) -> List[Pair]:
+        await self._refresh()
+        return list(self._pairs)
+
+    async def get(self, pair_id: str) -> Optional[Pair]:
+        await self._refresh()
+        return self._by_id.get(pair_id, None)
+
+    async def get_by_oracle(self, oracle_address: str) -> Optional[Pair]:
+        await self._refresh()
+        return self._by_oracle.get(oracle_address, None)
+
+    async def invalidate(self):
+        """
+        Publish a new version after the `pairs` collection changed and reload this process right away.
+        """
+        version = await self.cache.client.incr(PAIRS_VERSION_KEY)
+        async with self._lock:
+            await self._reload(str(version).encode())
+            self._checked_at = time.monotonic()
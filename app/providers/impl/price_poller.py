@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from ccxt.async_support import Exchange
+
+from app.providers.manager import PricePollerManager
+from app.utils.metrics import LATENCY_BUCKETS, SET_PRICE_DURATION, Histogram
+
+logger = logging.getLogger(__name__)
+
+
+class ExchangePollState:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.cycles = 0
+        self.failed_cycles = 0
+        # prices that could not be updated, a cycle only fails when too many of them do
+        self.failed_prices = 0
+        self.missed = 0
+        self.lateness = Histogram(LATENCY_BUCKETS)
+        self.cycle_duration = Histogram(LATENCY_BUCKETS)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "cycles": self.cycles,
+            "failed_cycles": self.failed_cycles,
+            "failed_prices": self.failed_prices,
+            "missed": self.missed,
+            "lateness_seconds": self.lateness.snapshot(),
+            "cycle_duration_seconds": self.cycle_duration.snapshot(),
+        }
+
+
+class PricePoller(PricePollerManager):
+    """
+    In-process price polling loop, one task per exchange.
+    Cycles are scheduled on a fixed grid of `interval` seconds from the start instead of `interval` seconds after the previous cycle, so
+    the schedule does not drift by the cycle time. Each cycle starts up to `jitter * interval` seconds after its slot so the processes of
+    a deployment do not hit an exchange at the same instant. A cycle fails when the poll raises or at least `failure_ratio` of its prices
+    are not updated, a few unquoted symbols only count as failed prices. An exchange that fails doubles its interval up to `max_interval`,
+    a slow exchange polls no faster than its cycle time, both come back to `interval` once the exchange recovers.
+    A cycle that starts late is recorded in the lateness histogram, slots that pass entirely while a cycle is still running are counted
+    as missed instead of being dropped silently.
+    """
+
+    interval: float = 4.0
+    max_interval: float = 60.0
+    jitter: float = 0.1
+    failure_ratio: float = 0.5
+    instance = None
+
+    _poll: Callable[[Exchange], Awaitable[Tuple[int, int]]] = None  # type: ignore
+    _states: Dict[str, ExchangePollState] = {}
+    _tasks: List[asyncio.Task] = []
+
+    def __new__(cls):
+        """
+        Singleton pattern
+        """
+        if not cls.instance:
+            cls.instance = super(PricePoller, cls).__new__(cls)
+        return cls.instance
+
+    async def connect(
+        self,
+        exchanges: List[Exchange],
+        poll: Callable[[Exchange], Awaitable[Tuple[int, int]]],
+        interval: float = 4.0,
+        max_interval: float = 60.0,
+        jitter: float = 0.1,
+        failure_ratio: float = 0.5,
+    ):
+        """
+        Start polling, `poll` runs one cycle for one exchange and returns the number of prices it failed to update and the number it tried.
+        """
+        self._poll = poll
+        self.interval = interval
+        self.max_interval = max(max_interval, interval)
+        self.jitter = jitter
+        self.failure_ratio = failure_ratio
+        self._states = {exchange.name: ExchangePollState(interval) for exchange in exchanges}  # type: ignore
+        self._tasks = [asyncio.create_task(self._run(exchange, self._states[exchange.name])) for exchange in exchanges]  # type: ignore
+
+    def _adapt(self, state: ExchangePollState, failed: bool, duration: float):
+        if failed:
+            state.interval = min(self.max_interval, state.interval * 2)
+        else:
+            state.interval = min(self.max_interval, max(self.interval, state.interval / 2, duration))
+
+    async def _run(self, exchange: Exchange, state: ExchangePollState):
+        slot = time.monotonic()
+        while True:
+            scheduled = slot + random.uniform(0, self.jitter * state.interval)
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            start = time.monotonic()
+            state.lateness.observe(max(0.0, start - scheduled))
+            try:
+                failed_prices, prices = await self._poll(exchange)
+                state.failed_prices += failed_prices
+                failed = prices > 0 and failed_prices >= self.failure_ratio * prices
+            except Exception as e:
+                logger.exception(f"Price poll of {exchange.name} failed. Reason: {e}")
+                failed = True
+            duration = time.monotonic() - start
+            state.cycles += 1
+            state.failed_cycles += int(failed)
+            state.cycle_duration.observe(duration)
+            SET_PRICE_DURATION.labels(exchange.name).observe(duration)
+            self._adapt(state, failed, duration)
+            slot += state.interval
+            # a cycle that overran starts the next one right away and shows up as lateness, whole slots it overran are skipped
+            missed = int((time.monotonic() - slot) // state.interval)
+            if missed > 0:
+                state.missed += missed
+                slot += missed * state.interval
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: state.snapshot() for name, state in self._states.items()}
+
+    async def disconnect(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
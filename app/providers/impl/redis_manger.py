@@ -1,9 +1,54 @@
-import redis
+import time
+
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.client import Pipeline
 from app.providers.manager import CacheManager
+from app.utils.metrics import REDIS_ERRORS, REDIS_LATENCY, REGISTRY
+
+
+class TimedPipeline(Pipeline):
+    """
+    Pipeline timed as a whole, its commands share one round trip.
+    """
+
+    async def execute(self, raise_on_error: bool = True):
+        if not REGISTRY.enabled:
+            return await super().execute(raise_on_error)
+        start = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        except Exception:
+            REDIS_ERRORS.labels("PIPELINE").inc()
+            raise
+        finally:
+            REDIS_LATENCY.labels("PIPELINE").observe(time.perf_counter() - start)
+
+
+class TimedRedis(Redis):
+    """
+    Redis client recording the duration of every command by command name. Pub/sub connections are not timed, they block by design.
+    """
+
+    async def execute_command(self, *args, **options):
+        if not REGISTRY.enabled:
+            return await super().execute_command(*args, **options)
+        command = str(args[0]).upper()
+        start = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        except Exception:
+            REDIS_ERRORS.labels(command).inc()
+            raise
+        finally:
+            REDIS_LATENCY.labels(command).observe(time.perf_counter() - start)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> TimedPipeline:
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
 
 
 class RedisManager(CacheManager):
-    client: redis.Redis = None  # type: ignore
+    client: Redis = None  # type: ignore
+    pool: BlockingConnectionPool = None  # type: ignore
 
     def __new__(cls):
         """
@@ -19,8 +64,24 @@ class RedisManager(CacheManager):
         port: int,
         password: str,
         db: int,
+        max_connections: int = 64,
+        pool_timeout: float = 3.0,
     ):
-        self.client = redis.StrictRedis(host=host, port=port, db=db, password=password)
+        """
+        Connections are shared through a blocking pool, callers wait up to `pool_timeout` seconds for a free connection instead of failing.
+        """
+        self.pool = BlockingConnectionPool(
+            host=host,
+            port=port,
+            db=db,
+            password=password,
+            max_connections=max_connections,
+            timeout=pool_timeout,
+            socket_timeout=3,
+            socket_connect_timeout=3,
+        )
+        self.client = TimedRedis(connection_pool=self.pool)
 
     async def disconnect(self):
-        self.client.close()
+        await self.client.aclose()
+        await self.pool.disconnect()
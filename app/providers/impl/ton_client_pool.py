@@ -0,0 +1,142 @@
+import logging
+import ssl
+from typing import Any, Dict, Literal, Optional, Tuple
+
+import aiohttp
+import certifi
+from pytoncenter import AsyncTonCenterClientV3
+from pytoncenter.address import Address
+from ticton import TicTonAsyncClient
+
+from app.providers.manager import TonClientManager
+from app.utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+def check_request_hook():
+    """
+    Fail unless every request of `AsyncTonCenterClientV3` still goes through `_underlying_call`, the private method
+    `PooledTonCenterClient` overrides. Another pytoncenter version could route around it and silently bypass the shared rate limit.
+    """
+    for name in ["_async_get", "_async_post"]:
+        method = getattr(AsyncTonCenterClientV3, name, None)
+        if method is None or "_underlying_call" not in method.__code__.co_names:
+            raise RuntimeError(f"AsyncTonCenterClientV3.{name} no longer calls _underlying_call, pin pytoncenter to 0.0.14 or update PooledTonCenterClient")
+    for name in ["_underlying_call", "_get_request_headers", "_parse_response"]:
+        if not hasattr(AsyncTonCenterClientV3, name):
+            raise RuntimeError(f"AsyncTonCenterClientV3.{name} is gone, pin pytoncenter to 0.0.14 or update PooledTonCenterClient")
+
+
+class PooledTonCenterClient(AsyncTonCenterClientV3):
+    """
+    Toncenter client that sends its requests through a shared session and a shared token bucket instead of opening a session per request
+    and keeping a limiter of its own. It overrides the private `_underlying_call` of pytoncenter, see `check_request_hook`.
+    """
+
+    def __init__(
+        self,
+        network: Literal["mainnet", "testnet"],
+        api_key: str,
+        session: aiohttp.ClientSession,
+        bucket: TokenBucket,
+        background: bool,
+        max_retries: int,
+    ):
+        super().__init__(network, api_key=api_key, qps=bucket.rate)
+        self.session = session
+        self.bucket = bucket
+        self.background = background
+        self.max_retries = max_retries
+
+    async def _underlying_call(
+        self,
+        method: Literal["GET", "POST", "PUT", "DELETE"],
+        url: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        payload: Optional[Dict[str, Any]] = None,
+    ):
+        if params:
+            for k, v in params.items():
+                if isinstance(v, bool):
+                    params[k] = str(v).lower()
+        attempt = 0
+        while True:
+            await self.bucket.acquire(self.background)
+            async with self.session.request(method, url=url, headers=self._get_request_headers(), params=params, json=payload) as response:
+                if response.status == 429 and attempt < self.max_retries:
+                    # another process shares the key or the budget is off, make every caller wait for the bucket to refill
+                    self.bucket.drain()
+                    attempt += 1
+                    continue
+                return await self._parse_response(response)
+
+
+class TonClientPool(TonClientManager):
+    """
+    Process-wide TON API clients.
+    Every client shares one keep-alive HTTP session and one token bucket sized for `TICTON_TONCENTER_API_KEY`. API handlers use the
+    foreground client, subscriptions and backfill use the background client, which yields to waiting foreground requests.
+    """
+
+    _session: aiohttp.ClientSession = None  # type: ignore
+    _bucket: TokenBucket = None  # type: ignore
+    _clients: Dict[bool, PooledTonCenterClient] = {}
+    _ticton_clients: Dict[Tuple[str, bool], TicTonAsyncClient] = {}
+    instance = None
+
+    def __new__(cls):
+        """
+        Singleton pattern
+        """
+        if not cls.instance:
+            cls.instance = super(TonClientPool, cls).__new__(cls)
+        return cls.instance
+
+    async def connect(
+        self,
+        api_key: str,
+        network: Literal["mainnet", "testnet"],
+        qps: Optional[float] = None,
+        interactive_reserve: float = 2.0,
+        keepalive_timeout: float = 60.0,
+        max_retries: int = 2,
+    ):
+        check_request_hook()
+        if qps is None:
+            # toncenter allows 10 rps per key and 1 rps without one, stay slightly below like pytoncenter does
+            qps = 9.5 * len(api_key.split(",")) if api_key else 1.0
+        connector = aiohttp.TCPConnector(
+            ssl=ssl.create_default_context(cafile=certifi.where()),
+            keepalive_timeout=keepalive_timeout,
+            ttl_dns_cache=300,
+            enable_cleanup_closed=True,
+        )
+        self._session = aiohttp.ClientSession(connector=connector)
+        self._bucket = TokenBucket(rate=qps, reserve=interactive_reserve)
+        self._clients = {background: PooledTonCenterClient(network, api_key, self._session, self._bucket, background=background, max_retries=max_retries) for background in [False, True]}
+        self._ticton_clients = {}
+
+    def toncenter(self, background: bool = False) -> AsyncTonCenterClientV3:
+        return self._clients[background]
+
+    async def ticton(self, oracle_address: str, background: bool = True) -> TicTonAsyncClient:
+        """
+        Read-only ticton client of an oracle, the oracle metadata is fetched once per process.
+        """
+        key = (Address(oracle_address).to_string(False), background)
+        client = self._ticton_clients.get(key)
+        if client is None:
+            toncenter = self.toncenter(background)
+            metadata = await TicTonAsyncClient.get_oracle_metadata(toncenter, oracle_address)
+            client = TicTonAsyncClient(metadata=metadata, toncenter=toncenter, oracle_addr=oracle_address, logger=logger)
+            self._ticton_clients[key] = client
+        return client
+
+    async def disconnect(self):
+        self._clients = {}
+        self._ticton_clients = {}
+        if self._session is not None:
+            await self._session.close()
+            self._session = None  # type: ignore
@@ -1,6 +1,10 @@
 from abc import ABCMeta, abstractmethod
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Set, Tuple
 from apscheduler.schedulers.base import BaseScheduler
-import redis
+from redis.asyncio import Redis
+from ccxt.async_support import Exchange
+from app.models.core import Pair
 
 
 class DatabaseManager(metaclass=ABCMeta):
@@ -15,7 +19,7 @@ class DatabaseManager(metaclass=ABCMeta):
         raise NotImplementedError
 
     @abstractmethod
-    def connect(self, host: str, port: int, username: str, password: str, db_name: str):
+    def connect(self, host: str, port: int, username: str, password: str, db_name: str, max_pool_size: int, min_pool_size: int, max_idle_time_ms: int):
         raise NotImplementedError
 
     @abstractmethod
@@ -26,11 +30,11 @@ class DatabaseManager(metaclass=ABCMeta):
 class CacheManager(metaclass=ABCMeta):
     @property
     @abstractmethod
-    def client(self) -> redis.Redis:
+    def client(self) -> Redis:
         raise NotImplementedError
 
     @abstractmethod
-    def connect(self, host: str, port: int, password: str, db: int):
+    def connect(self, host: str, port: int, password: str, db: int, max_connections: int, pool_timeout: float):
         raise NotImplementedError
 
     @abstractmethod
@@ -43,3 +47,219 @@ class ScheduleManager(metaclass=ABCMeta):
     @abstractmethod
     def scheduler(self) -> BaseScheduler:
         raise NotImplementedError
+
+
+class ExchangeSessionManager(metaclass=ABCMeta):
+    @property
+    @abstractmethod
+    def exchanges(self) -> List[Exchange]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def connect(self, names: List[str], keepalive_timeout: float, limit_per_host: int, failure_threshold: int, reset_timeout: float, markets_refresh_interval: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def breaker(self, name: str) -> Any:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def refresh_markets(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def disconnect(self):
+        raise NotImplementedError
+
+
+class PairRegistryManager(metaclass=ABCMeta):
+    @abstractmethod
+    def connect(self, db: DatabaseManager, cache: CacheManager, check_interval: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list(self) -> List[Pair]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, pair_id: str) -> Optional[Pair]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_by_oracle(self, oracle_address: str) -> Optional[Pair]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def invalidate(self):
+        raise NotImplementedError
+
+
+# fencing token of the lease the current task runs under, set by the lease manager for every run of a unit so its writes can be fenced
+LEASE_TOKEN: ContextVar[Optional[str]] = ContextVar("lease_token", default=None)
+
+
+class IngestionManager(metaclass=ABCMeta):
+    @abstractmethod
+    def connect(self, db: DatabaseManager, cache: CacheManager, batch_size: int, flush_interval: float, max_pending: int, alarm_cache_size: int, publish_events: bool):
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_fence(self, fence: Optional[Callable[[List[str]], Awaitable[Set[str]]]]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def upsert_alarm(self, alarm: Dict[str, Any]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_alarm(self, oracle: str, alarm_id: int, fields: Dict[str, Any]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_reward(self, address: str, reward: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_user_stats(self, address: str, deltas: Dict[str, float]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def checkpoint(self, oracle: str, lt: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def publish(self, channel: str, event: Dict[str, Any]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_alarm(self, oracle: str, alarm_id: int) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def flush(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def disconnect(self):
+        raise NotImplementedError
+
+
+class TonClientManager(metaclass=ABCMeta):
+    @abstractmethod
+    def connect(
+        self,
+        api_key: str,
+        network: Literal["mainnet", "testnet"],
+        qps: Optional[float],
+        interactive_reserve: float,
+        keepalive_timeout: float,
+        max_retries: int,
+    ):
+        raise NotImplementedError
+
+    @abstractmethod
+    def toncenter(self, background: bool = False):
+        raise NotImplementedError
+
+    @abstractmethod
+    def ticton(self, oracle_address: str, background: bool = True):
+        raise NotImplementedError
+
+    @abstractmethod
+    def disconnect(self):
+        raise NotImplementedError
+
+
+class PricePollerManager(metaclass=ABCMeta):
+    @abstractmethod
+    def connect(self, exchanges: List[Exchange], poll: Callable[[Exchange], Awaitable[Tuple[int, int]]], interval: float, max_interval: float, jitter: float, failure_ratio: float):
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def disconnect(self):
+        raise NotImplementedError
+
+
+class LeaseManager(metaclass=ABCMeta):
+    @abstractmethod
+    def connect(
+        self,
+        cache: CacheManager,
+        units: Callable[[], Awaitable[Dict[str, Callable[[], Awaitable[Any]]]]],
+        lease_ttl: float,
+        vnodes: int,
+        drain: Optional[Callable[[], Awaitable[Any]]],
+    ):
+        raise NotImplementedError
+
+    @abstractmethod
+    def rebalance(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def held(self, tokens: List[str]) -> Set[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def disconnect(self):
+        raise NotImplementedError
+
+
+class EventStreamManager(metaclass=ABCMeta):
+    @abstractmethod
+    def connect(self, cache: CacheManager, queue_size: int):
+        raise NotImplementedError
+
+    @abstractmethod
+    def subscribe(self, pair_id: Optional[str] = None, watchmaker: Optional[str] = None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def disconnect(self):
+        raise NotImplementedError
+
+
+class MetricsManager(metaclass=ABCMeta):
+    @abstractmethod
+    def connect(self, cache: CacheManager, interval: float, enabled: bool):
+        raise NotImplementedError
+
+    @abstractmethod
+    def render(self) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_stats(self, name: str, stats: Callable[[], Dict[str, Any]]):
+        raise NotImplementedError
+
+    @abstractmethod
+    def stats(self, name: str) -> Dict[str, Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def disconnect(self):
+        raise NotImplementedError
@@ -1,6 +1,7 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings
 from functools import lru_cache
-from typing import Literal
+from typing import List, Literal, Optional
 
 
 class Settings(BaseSettings):
@@ -9,15 +10,58 @@ class Settings(BaseSettings):
     TICTON_DB_USERNAME: str
     TICTON_DB_PASSWORD: str
     TICTON_DB_NAME: str
+    TICTON_DB_MAX_POOL_SIZE: int = 100
+    TICTON_DB_MIN_POOL_SIZE: int = 0
+    TICTON_DB_MAX_IDLE_TIME_MS: int = 0
     TICTON_REDIS_HOST: str
     TICTON_REDIS_PORT: int
     TICTON_REDIS_PASSWORD: str
     TICTON_REDIS_DB: int
+    TICTON_REDIS_MAX_CONNECTIONS: int = 64
+    TICTON_REDIS_POOL_TIMEOUT: float = 3.0
     TICTON_TG_BOT_TOKEN: str
     TICTON_MANIFEST_URL: str
     TICTON_MODE: Literal["dev", "main"]
     TICTON_TONCENTER_API_KEY: str
+    TICTON_TONCENTER_QPS: Optional[float] = None
+    TICTON_TONCENTER_INTERACTIVE_RESERVE: float = 2.0
+    TICTON_TONCENTER_KEEPALIVE_TIMEOUT: float = 60.0
+    TICTON_TONCENTER_MAX_RETRIES: int = 2
+    TICTON_JETTON_WALLET_TTL: int = 30
+    TICTON_JETTON_WALLET_NEGATIVE_TTL: int = 10
     TICTON_NETWORK: Literal["mainnet", "testnet"]
+    TICTON_PAIR_REGISTRY_CHECK_INTERVAL: float = 1.0
+    TICTON_LEASE_TTL: float = 15.0
+    TICTON_LEASE_VNODES: int = 64
+    TICTON_EXCHANGES: List[str] = ["bybit", "gateio", "okx"]
+    TICTON_EXCHANGE_KEEPALIVE_TIMEOUT: float = 60.0
+    TICTON_EXCHANGE_MARKETS_REFRESH_INTERVAL: int = 3600
+    TICTON_EXCHANGE_MAX_CONCURRENCY: int = 4
+    TICTON_EXCHANGE_TIMEOUT: float = 2.0
+    TICTON_EXCHANGE_BREAKER_FAILURES: int = 5
+    TICTON_EXCHANGE_BREAKER_RESET_TIMEOUT: float = 30.0
+    TICTON_PRICE_POLL_INTERVAL: float = 4.0
+    TICTON_PRICE_POLL_MAX_INTERVAL: float = 60.0
+    TICTON_PRICE_POLL_JITTER: float = 0.1
+    TICTON_PRICE_POLL_FAILURE_RATIO: float = 0.5
+    TICTON_PRICE_AGGREGATE_MAX_AGE: float = 60.0
+    # the aggregate script divides the age of a price by it
+    TICTON_PRICE_AGGREGATE_HALF_LIFE: float = Field(10.0, gt=0)
+    TICTON_PRICE_AGGREGATE_MAX_DEVIATION: float = 0.02
+    TICTON_PRICE_AGGREGATE_MIN_SOURCES: int = 2
+    TICTON_PRICE_HISTORY_RAW_RETENTION: int = 86400
+    TICTON_PRICE_HISTORY_1M_RETENTION: int = 604800
+    TICTON_PRICE_HISTORY_5M_RETENTION: int = 2592000
+    TICTON_PRICE_HISTORY_1H_RETENTION: int = 31536000
+    TICTON_PAGINATION_TOTAL_TTL: int = 30
+    TICTON_STREAM_QUEUE_SIZE: int = 100
+    TICTON_STREAM_KEEPALIVE: float = 15.0
+    TICTON_METRICS_ENABLED: bool = True
+    TICTON_METRICS_REPORT_INTERVAL: float = 15.0
+    TICTON_INGEST_BATCH_SIZE: int = 500
+    TICTON_INGEST_FLUSH_INTERVAL: float = 0.25
+    TICTON_INGEST_MAX_PENDING: int = 5000
+    TICTON_INGEST_ALARM_CACHE_SIZE: int = 10000
 
 
 @lru_cache()
@@ -1,17 +1,97 @@
-from datetime import datetime, timedelta
-import json
-from typing import Tuple, Optional, Annotated
-from app.models.common import Pagination
-from tonsdk.contract import Address
+import base64
+import binascii
 import hashlib
-from nacl.signing import VerifyKey
+import json
+from datetime import datetime, timedelta
+from typing import Annotated, Any, Callable, Dict, List, Optional, Tuple, Type
+
+from fastapi import HTTPException, Query, Response, status
+from motor.motor_asyncio import AsyncIOMotorCollection
 from nacl.encoding import HexEncoder
-from typing import Optional
-from fastapi import Query
+from nacl.signing import VerifyKey
+from pydantic import BaseModel, ValidationError
+from tonsdk.contract import Address
+
+from app.models.common import Pagination
+from app.providers.manager import CacheManager
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error, RecursionError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def get_pagination(cursor_model: Type[BaseModel]) -> Callable[..., Pagination]:
+    """
+    Pagination dependency of a list whose cursors hold a `cursor_model`, a cursor of another shape is rejected with 400.
+    """
+
+    def pagination(
+        page: Annotated[int, Query(ge=1)] = 1,
+        per_page: Annotated[int, Query(ge=1, le=20)] = 10,
+        cursor: Annotated[Optional[str], Query(max_length=1024, description="`next_cursor` of the previous page, `page` is ignored when it is set")] = None,
+        include_total: Annotated[Optional[bool], Query(description="Whether to return `total`, defaults to true for `page` and false for `cursor`")] = None,
+    ) -> Pagination:
+        if cursor is not None:
+            try:
+                position = cursor_model.model_validate(decode_cursor(cursor)).model_dump()
+            except (ValueError, ValidationError):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+            return Pagination(limit=per_page, skip=0, cursor=position, include_total=bool(include_total))
+        return Pagination(limit=per_page, skip=(page - 1) * per_page, include_total=True if include_total is None else include_total)
+
+    return pagination
+
+
+def split_page(docs: List[Dict[str, Any]], p: Pagination, cursor_of: Callable[[Dict[str, Any], int], Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Split the `limit + 1` documents returned by a page pipeline into the page and the cursor of the next page.
+    `cursor_of` receives the last document of the page and its index on the page.
+    """
+    if len(docs) <= p.limit:
+        return docs, None
+    docs = docs[: p.limit]
+    return docs, encode_cursor(cursor_of(docs[-1], len(docs) - 1))
+
+
+# same settings as starlette's JSONResponse.render, built once instead of on every response
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":"))
+
+
+def json_bytes(content: Any) -> bytes:
+    """
+    Serialize JSON-native content to the exact bytes `JSONResponse` would send.
+    """
+    return _JSON_ENCODER.encode(content).encode("utf-8")
+
+
+def raw_json_response(content: Any, status_code: int = status.HTTP_200_OK) -> Response:
+    """
+    `JSONResponse` for content that is already JSON-native, skips `jsonable_encoder` and the per-call encoder setup of `json.dumps`.
+    """
+    return Response(content=json_bytes(content), status_code=status_code, media_type="application/json")
 
 
-def get_pagination(page: Annotated[int, Query(ge=1)] = 1, per_page: Annotated[int, Query(ge=1, le=20)] = 10) -> Pagination:
-    return Pagination(limit=per_page, skip=(page - 1) * per_page)
+async def count_documents_cached(cache: CacheManager, collection: AsyncIOMotorCollection, filter: Dict[str, Any], ttl: int = 30) -> int:
+    """
+    Count the documents matching `filter`, the result is cached in redis for `ttl` seconds so paging through a list does not recount it.
+    """
+    key = "count${}${}".format(collection.name, hashlib.sha1(json.dumps(filter, sort_keys=True, default=str).encode()).hexdigest())
+    cached = await cache.client.get(key)
+    if cached is not None:
+        return int(cached)
+    total = await collection.count_documents(filter) if len(filter) > 0 else await collection.estimated_document_count()
+    await cache.client.set(key, total, ex=ttl)
+    return total
 
 
 def calculate_time_elapse(ts: datetime) -> str:
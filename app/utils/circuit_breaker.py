@@ -0,0 +1,77 @@
+import time
+from typing import Any, Dict, Literal
+
+BreakerState = Literal["closed", "open", "half_open"]
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of one remote service.
+    `failure_threshold` consecutive failures open the breaker and calls are rejected without being made. After `reset_timeout` seconds
+    the breaker is half open and lets a single probe call through, a successful probe closes it and a failed one opens it again for
+    twice as long, up to `max_reset_timeout`.
+    """
+
+    STATE_VALUES: Dict[BreakerState, int] = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0, max_reset_timeout: float = 300.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(max_reset_timeout, reset_timeout)
+        self.state: BreakerState = "closed"
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._open_for = reset_timeout
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+
+    def allow(self) -> bool:
+        """
+        Whether a call may be made now, a call that is allowed must be followed by `record_success` or `record_failure`.
+        """
+        now = time.monotonic()
+        if self.state == "open" and now - self._opened_at >= self._open_for:
+            self.state = "half_open"
+        if self.state == "closed":
+            return True
+        # a probe that never reported, because its caller was cancelled, stops blocking the next one after a reset timeout
+        if self.state == "half_open" and (not self._probing or now - self._probe_started >= self.reset_timeout):
+            self._probing = True
+            self._probe_started = now
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        if self.state != "closed":
+            self.state = "closed"
+            self._open_for = self.reset_timeout
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open":
+            self._probing = False
+            self._open(min(self.max_reset_timeout, self._open_for * 2))
+        elif self.state == "closed" and self.failures >= self.failure_threshold:
+            self._open(self.reset_timeout)
+
+    def _open(self, duration: float):
+        self.state = "open"
+        self.opened += 1
+        self._open_for = duration
+        self._opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        retry_in = max(0.0, self._opened_at + self._open_for - time.monotonic()) if self.state == "open" else 0.0
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_in_seconds": round(retry_in, 3),
+        }
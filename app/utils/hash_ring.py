@@ -0,0 +1,28 @@
+import bisect
+import hashlib
+from typing import Iterable, List, Optional, Tuple
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha1(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring, every node is placed at `vnodes` points so keys spread evenly.
+    Adding or removing a node only moves the keys of the ring segments it owns, about 1/nodes of them.
+    """
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = 64):
+        self.nodes = sorted(set(nodes))
+        self._points: List[Tuple[int, str]] = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._hashes = [point for point, _ in self._points]
+
+    def owner(self, key: str) -> Optional[str]:
+        """
+        Node owning `key`, the first point clockwise from the hash of the key. None when the ring is empty.
+        """
+        if len(self._points) == 0:
+            return None
+        i = bisect.bisect_left(self._hashes, _hash(key)) % len(self._points)
+        return self._points[i][1]
@@ -0,0 +1,197 @@
+import bisect
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+# default upper bounds, in seconds for latencies and in items for sizes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# upper bounds in seconds of how far ingestion runs behind the chain, a catch-up from the oldest transaction lands in the last ones
+LAG_BUCKETS = (1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0, 21600.0, 86400.0)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram, observing a value is O(log buckets) and the memory does not grow with the number of observations.
+    Quantiles are estimated as the upper bound of the bucket they fall in, values above the last bucket report the observed max.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets: List[float] = sorted(buckets)
+        # one extra slot for values above the last bucket
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimated quantile, q is in [0, 1].
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count > 0 else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """
+        Observations at or below each bucket bound, the last bound is infinity.
+        """
+        result = []
+        seen = 0
+        for bound, count in zip([*self.buckets, float("inf")], self.counts):
+            seen += count
+            result.append((bound, seen))
+        return result
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricFamily:
+    """
+    Metric with a fixed set of label names, one histogram, counter or gauge per combination of label values.
+    """
+
+    def __init__(self, name: str, kind: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.kind = kind
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self.children: Dict[Tuple[str, ...], Union[Histogram, Counter, Gauge]] = {}
+
+    def labels(self, *values: str) -> Any:
+        child = self.children.get(values)
+        if child is None:
+            child = Histogram(self.buckets) if self.kind == "histogram" else Gauge() if self.kind == "gauge" else Counter()
+            self.children[values] = child
+        return child
+
+    def samples(self) -> List[Sample]:
+        result: List[Sample] = []
+        for values, child in list(self.children.items()):
+            labels = dict(zip(self.labelnames, values))
+            if isinstance(child, Histogram):
+                for bound, count in child.cumulative():
+                    result.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, count))
+                result.append((f"{self.name}_sum", labels, child.sum))
+                result.append((f"{self.name}_count", labels, child.count))
+            elif isinstance(child, Gauge):
+                result.append((self.name, labels, child.value))
+            else:
+                result.append((f"{self.name}_total", labels, child.value))
+        return result
+
+
+class MetricsRegistry:
+    """
+    Metrics of this process. Turning `enabled` off makes every instrumentation point skip its timing, which is how the overhead is measured.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.families: Dict[str, MetricFamily] = {}
+
+    def _family(self, name: str, kind: str, help: str, labelnames: Sequence[str], buckets: Sequence[float]) -> MetricFamily:
+        if name not in self.families:
+            self.families[name] = MetricFamily(name, kind, help, labelnames, buckets)
+        return self.families[name]
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> MetricFamily:
+        return self._family(name, "histogram", help, labelnames, buckets)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._family(name, "counter", help, labelnames, ())
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._family(name, "gauge", help, labelnames, ())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        JSON-native copy of every family, merged with the snapshots of other processes by `render_metrics`.
+        """
+        return {name: {"type": f.kind, "help": f.help, "samples": f.samples()} for name, f in self.families.items()}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render_metrics(snapshots: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Prometheus text exposition of the snapshots of several processes, keyed by process. Every sample gets a `process` label.
+    Counter samples are named `<family>_total`, the text format 0.0.4 wants the HELP and TYPE lines under that name as well.
+    """
+    families: Dict[str, Dict[str, Any]] = {}
+    for process, snapshot in sorted(snapshots.items()):
+        for name, family in snapshot.items():
+            merged = families.setdefault(name, {"type": family["type"], "help": family["help"], "samples": []})
+            merged["samples"].extend((sample, {"process": process, **labels}, value) for sample, labels, value in family["samples"])
+    lines: List[str] = []
+    for name, family in sorted(families.items()):
+        if family["type"] == "counter":
+            name = f"{name}_total"
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for sample, labels, value in family["samples"]:
+            rendered = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+            lines.append(f"{sample}{{{rendered}}} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+ROUTE_LATENCY = REGISTRY.histogram("ticton_http_request_duration_seconds", "Time from receiving a request to sending the response headers", ("method", "route", "status"))
+MONGO_LATENCY = REGISTRY.histogram("ticton_mongo_command_duration_seconds", "Duration of MongoDB commands", ("command", "collection"))
+MONGO_ERRORS = REGISTRY.counter("ticton_mongo_command_errors", "MongoDB commands that failed", ("command", "collection"))
+REDIS_LATENCY = REGISTRY.histogram("ticton_redis_command_duration_seconds", "Duration of redis commands, a pipeline counts as one", ("command",))
+REDIS_ERRORS = REGISTRY.counter("ticton_redis_command_errors", "Redis commands that failed", ("command",))
+EXCHANGE_LATENCY = REGISTRY.histogram("ticton_exchange_fetch_duration_seconds", "Duration of price fetches", ("exchange", "call"))
+EXCHANGE_ERRORS = REGISTRY.counter("ticton_exchange_fetch_errors", "Price fetches that failed", ("exchange", "call"))
+EXCHANGE_BREAKER_STATE = REGISTRY.gauge("ticton_exchange_breaker_state", "Circuit breaker of the exchange, 0 closed, 1 half open, 2 open", ("exchange",))
+EXCHANGE_REJECTED = REGISTRY.counter("ticton_exchange_fetch_rejected", "Price fetches skipped because the exchange's circuit breaker was open", ("exchange",))
+SET_PRICE_DURATION = REGISTRY.histogram("ticton_set_price_cycle_duration_seconds", "Duration of a price polling cycle", ("exchange",))
+INGESTION_LAG = REGISTRY.histogram("ticton_ingestion_lag_seconds", "Time from a transaction on chain to its event being processed", ("oracle",), buckets=LAG_BUCKETS)
@@ -0,0 +1,46 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Token bucket shared by every caller of a rate limited API.
+    Tokens refill at `rate` per second up to `capacity`. Background callers wait while a foreground caller is waiting and never take
+    the last `reserve` tokens, so background traffic uses the spare budget and a foreground request rarely waits.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, reserve: float = 0.0):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.reserve = max(0.0, min(reserve, self.capacity - 1))
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._foreground_waiters = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, background: bool = False):
+        if not background:
+            self._foreground_waiters += 1
+        try:
+            floor = self.reserve if background else 0.0
+            while True:
+                self._refill()
+                if self.tokens >= 1 + floor and (not background or self._foreground_waiters == 0):
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep(max(1 + floor - self.tokens, 1) / self.rate)
+        finally:
+            if not background:
+                self._foreground_waiters -= 1
+
+    def drain(self):
+        """
+        Empty the bucket, used when the API answers 429 so every caller backs off until tokens refill.
+        """
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
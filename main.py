@@ -1,4 +1,9 @@
 import asyncio
+import json
+import multiprocessing
+import signal
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 import fastapi
 import typer
 from typer import Typer
@@ -8,106 +13,231 @@ import os
 import uvicorn
 from contextlib import asynccontextmanager
 from app.api.leaderboard import LeaderBoardRouter
-from app.jobs.core import init_subscriptions
-from app.providers import get_cache, get_db
-from app.api import CoreRouter, AssetRouter
+from app.jobs.core import subscription_units
+from app.jobs.leaderboard import rebuild_leaderboard, seed_leaderboard
+from app.jobs.user_stats import rebuild_user_stats, seed_user_stats
+from app.models.indexes import apply_indexes
+from app.providers import get_cache, get_db, get_event_hub, get_exchange_manager, get_ingestion, get_leases, get_metrics, get_pair_registry, get_price_poller, get_ton_clients
+from app.api import CoreRouter, AssetRouter, MetricsRouter, RouteMetricsMiddleware, StreamRouter
 from dotenv import load_dotenv
-from app.providers import get_scheduler
-from app.jobs.price import get_exchanges, set_price
-from apscheduler.jobstores.mongodb import MongoDBJobStore
+from app.jobs.price import poll_prices
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
-from pytz import timezone
-from app.settings import get_settings
-from redis import StrictRedis
+from pytoncenter.address import Address
+from app.settings import Settings, get_settings
+from app.providers.manager import CacheManager, DatabaseManager, PairRegistryManager, TonClientManager
 import time
 
 os.environ["TZ"] = "Asia/Taipei"
 time.tzset()
 
 
+async def connect_db(settings: Settings) -> DatabaseManager:
+    manager = await get_db()
+    await manager.connect(
+        host=settings.TICTON_DB_HOST,
+        port=settings.TICTON_DB_PORT,
+        username=settings.TICTON_DB_USERNAME,
+        password=settings.TICTON_DB_PASSWORD,
+        db_name=settings.TICTON_DB_NAME,
+        max_pool_size=settings.TICTON_DB_MAX_POOL_SIZE,
+        min_pool_size=settings.TICTON_DB_MIN_POOL_SIZE,
+        max_idle_time_ms=settings.TICTON_DB_MAX_IDLE_TIME_MS,
+    )
+    result = await manager.db.command("ping")
+    if result["ok"] != 1:
+        raise Exception("Failed to connect to database")
+    return manager
+
+
+async def connect_cache(settings: Settings) -> CacheManager:
+    cache = await get_cache()
+    await cache.connect(
+        host=settings.TICTON_REDIS_HOST,
+        port=settings.TICTON_REDIS_PORT,
+        db=settings.TICTON_REDIS_DB,
+        password=settings.TICTON_REDIS_PASSWORD,
+        max_connections=settings.TICTON_REDIS_MAX_CONNECTIONS,
+        pool_timeout=settings.TICTON_REDIS_POOL_TIMEOUT,
+    )
+    resp = await cache.client.ping()
+    if not resp:
+        raise Exception("Failed to connect to redis")
+    return cache
+
+
+async def connect_ton_clients(settings: Settings) -> TonClientManager:
+    clients = await get_ton_clients()
+    await clients.connect(
+        api_key=settings.TICTON_TONCENTER_API_KEY,
+        network=settings.TICTON_NETWORK,
+        qps=settings.TICTON_TONCENTER_QPS,
+        interactive_reserve=settings.TICTON_TONCENTER_INTERACTIVE_RESERVE,
+        keepalive_timeout=settings.TICTON_TONCENTER_KEEPALIVE_TIMEOUT,
+        max_retries=settings.TICTON_TONCENTER_MAX_RETRIES,
+    )
+    return clients
+
+
+async def lease_units(registry: PairRegistryManager, settings: Settings) -> Dict[str, Callable[[], Awaitable[Any]]]:
+    """
+    Work that must run in exactly one worker: the subscription of every oracle and the price poller.
+    """
+    units: Dict[str, Callable[[], Awaitable[Any]]] = await subscription_units(registry)
+    # prices are polled in process, a seconds-interval job in the mongo job store would rewrite its state on every run
+    units["set_price"] = partial(poll_prices, settings)
+    return units
+
+
 @asynccontextmanager
-async def lifespan(_: FastAPI):
-    scheduler = None
+async def connect_services(settings: Settings):
+    """
+    Connections every role needs: database, cache, pair registry, the TON API clients, the event stream hub and the metrics reporter.
+    """
     manager = None
     cache = None
+    ton_clients = None
+    event_hub = None
+    metrics = None
     try:
-        settings = get_settings()
-        manager = await get_db()
-        await manager.connect(
-            host=settings.TICTON_DB_HOST,
-            port=settings.TICTON_DB_PORT,
-            username=settings.TICTON_DB_USERNAME,
-            password=settings.TICTON_DB_PASSWORD,
-            db_name=settings.TICTON_DB_NAME,
-        )
+        manager = await connect_db(settings)
+        cache = await connect_cache(settings)
+        # ranks are read from redis only, rebuild them from the database when redis lost them
+        seeded = await seed_leaderboard(manager, cache)
+        if seeded is not None:
+            print(f"Rebuilt leaderboard with {seeded} records")
+        registry = await get_pair_registry()
+        await registry.connect(db=manager, cache=cache, check_interval=settings.TICTON_PAIR_REGISTRY_CHECK_INTERVAL)
+        ton_clients = await connect_ton_clients(settings)
+        event_hub = await get_event_hub()
+        await event_hub.connect(cache=cache, queue_size=settings.TICTON_STREAM_QUEUE_SIZE)
+        metrics = await get_metrics()
+        await metrics.connect(cache=cache, interval=settings.TICTON_METRICS_REPORT_INTERVAL, enabled=settings.TICTON_METRICS_ENABLED)
+        yield manager, cache, registry
+    finally:
+        if metrics is not None:
+            await metrics.disconnect()
+        if event_hub is not None:
+            await event_hub.disconnect()
+        if ton_clients is not None:
+            await ton_clients.disconnect()
+        if cache is not None:
+            await cache.disconnect()
+        if manager is not None:
+            await manager.disconnect()
+
 
-        result = manager.db.command("ping")
-        if result["ok"] != 1:
-            raise Exception("Failed to connect to database")
-        cache = await get_cache()
-        await cache.connect(
-            host=settings.TICTON_REDIS_HOST,
-            port=settings.TICTON_REDIS_PORT,
-            db=settings.TICTON_REDIS_DB,
-            password=settings.TICTON_REDIS_PASSWORD,
+@asynccontextmanager
+async def run_ingestion(settings: Settings, manager: DatabaseManager, cache: CacheManager, registry: PairRegistryManager):
+    """
+    Background work of the worker role: oracle subscriptions, price polling and the jobs they rely on.
+    """
+    exchange_manager = None
+    ingestion = None
+    leases = None
+    try:
+        ingestion = await get_ingestion()
+        await ingestion.connect(
+            db=manager,
+            cache=cache,
+            batch_size=settings.TICTON_INGEST_BATCH_SIZE,
+            flush_interval=settings.TICTON_INGEST_FLUSH_INTERVAL,
+            max_pending=settings.TICTON_INGEST_MAX_PENDING,
+            alarm_cache_size=settings.TICTON_INGEST_ALARM_CACHE_SIZE,
+        )
+        # the alarm list totals read the stats once they are seeded, count them before this worker adds to them
+        seeded = await seed_user_stats(manager, cache)
+        if seeded is not None:
+            print(f"Seeded stats of {seeded} users from the alarms")
+        exchange_manager = await get_exchange_manager()
+        await exchange_manager.connect(
+            names=settings.TICTON_EXCHANGES,
+            keepalive_timeout=settings.TICTON_EXCHANGE_KEEPALIVE_TIMEOUT,
+            failure_threshold=settings.TICTON_EXCHANGE_BREAKER_FAILURES,
+            reset_timeout=settings.TICTON_EXCHANGE_BREAKER_RESET_TIMEOUT,
+            markets_refresh_interval=settings.TICTON_EXCHANGE_MARKETS_REFRESH_INTERVAL,
         )
-        resp = cache.client.ping()
-        if not resp:
-            raise Exception("Failed to connect to redis")
-        scheduler = await get_scheduler()
-        jobstores = {"default": MongoDBJobStore(client=manager.client)}
-        job_defaults = {"coalesce": True}
-        exchanges = get_exchanges()
-        scheduler.scheduler.configure(jobstores=jobstores, job_defaults=job_defaults, timezone=timezone("Asia/Taipei"))
-        if scheduler.scheduler.get_job("set_price") is None:
-            scheduler.scheduler.add_job(set_price, "interval", seconds=4, args=[exchanges], id="set_price", name="set_price", replace_existing=True, max_instances=1)
-        await init_subscriptions(manager, scheduler)
-        scheduler.scheduler.start()
+        leases = await get_leases()
+        # writes of a subscription are dropped once its lease is lost, the next owner replays them from the sync checkpoint
+        ingestion.set_fence(leases.held)
+        await leases.connect(
+            cache=cache,
+            units=lambda: lease_units(registry, settings),
+            lease_ttl=settings.TICTON_LEASE_TTL,
+            vnodes=settings.TICTON_LEASE_VNODES,
+            drain=ingestion.flush,
+        )
+        # the debug endpoints of the API processes read these through the metrics reporter
+        metrics = await get_metrics()
+        metrics.add_stats("ingestion", ingestion.stats)
+        metrics.add_stats("prices", (await get_price_poller()).stats)
+        metrics.add_stats("exchanges", exchange_manager.stats)
+        metrics.add_stats("leases", leases.stats)
         yield
     finally:
-        if scheduler is not None:
-            scheduler.scheduler.shutdown(wait=False)
-        if manager is not None:
-            await manager.disconnect()
-        if cache is not None:
-            await cache.disconnect()
-        for exchange in exchanges:  # type: ignore
-            await exchange.close()
+        if leases is not None:
+            # stops the subscriptions and the price poller and hands them to the other workers
+            await leases.disconnect()
+        if ingestion is not None:
+            # write what is still buffered before the database goes away
+            await ingestion.disconnect()
+        if exchange_manager is not None:
+            await exchange_manager.disconnect()
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """
+    API and ingestion in one process, used by `start`.
+    """
+    settings = get_settings()
+    async with connect_services(settings) as (manager, cache, registry):
+        async with run_ingestion(settings, manager, cache, registry):
+            yield
+
+
+@asynccontextmanager
+async def api_lifespan(_: FastAPI):
+    """
+    API only, used by the `serve` workers. No scheduler, exchange sessions or subscriptions, they run in `worker` processes.
+    """
+    async with connect_services(get_settings()):
+        yield
+
+
+def create_app(lifespan) -> FastAPI:
+    app = FastAPI(
+        title="Tic Ton web server",
+        summary="Main web server for Tic Ton Oracle",
+        lifespan=lifespan,
+    )
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(RouteMetricsMiddleware)
+    app.dependency_overrides[get_db] = get_db
+    app.include_router(CoreRouter)
+    app.include_router(AssetRouter)
+    app.include_router(LeaderBoardRouter)
+    app.include_router(StreamRouter)
+    app.include_router(MetricsRouter)
+    return app
 
 
 cli = Typer()
-app = FastAPI(
-    title="Tic Ton web server",
-    summary="Main web server for Tic Ton Oracle",
-    lifespan=lifespan,
-)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-app.dependency_overrides[get_db] = get_db
-app.include_router(CoreRouter)
-app.include_router(AssetRouter)
-app.include_router(LeaderBoardRouter)
+app = create_app(lifespan)
+api = create_app(api_lifespan)
 
 
 async def setup():
     settings = get_settings()
-    manager = await get_db()
-    await manager.connect(
-        host=settings.TICTON_DB_HOST,
-        port=settings.TICTON_DB_PORT,
-        username=settings.TICTON_DB_USERNAME,
-        password=settings.TICTON_DB_PASSWORD,
-        db_name=settings.TICTON_DB_NAME,
-    )
+    manager = await connect_db(settings)
     # create indexes
-    manager.db["pairs"].create_index("oracle_address", unique=True)
-    manager.db["alarms"].create_index({"oracle": 1, "id": 1}, unique=True)
+    await apply_indexes(manager.db)
 
 
 @cli.command(name="init")
@@ -116,10 +246,93 @@ def init():
     asyncio.run(setup())
 
 
+async def rebuild():
+    settings = get_settings()
+    manager = await connect_db(settings)
+    cache = await connect_cache(settings)
+    try:
+        total = await rebuild_leaderboard(manager, cache)
+        typer.echo(f"Rebuilt leaderboard with {total} records")
+    finally:
+        await cache.disconnect()
+        await manager.disconnect()
+
+
+@cli.command(name="rebuild-leaderboard")
+def rebuild_leaderboard_command():
+    typer.echo("Rebuilding leaderboard sorted set from database")
+    asyncio.run(rebuild())
+
+
+async def recount_user_stats():
+    settings = get_settings()
+    manager = await connect_db(settings)
+    try:
+        total = await rebuild_user_stats(manager)
+        typer.echo(f"Rebuilt stats of {total} users")
+    finally:
+        await manager.disconnect()
+
+
+@cli.command(name="rebuild-user-stats")
+def rebuild_user_stats_command():
+    typer.echo("Recounting user stats from alarms and leaderboard")
+    asyncio.run(recount_user_stats())
+
+
+async def run_backfill(oracles: List[str], workers: int, ranges: int):
+    from app.jobs.backfill import backfill
+
+    settings = get_settings()
+    manager = await connect_db(settings)
+    cache = await connect_cache(settings)
+    registry = await get_pair_registry()
+    await registry.connect(db=manager, cache=cache, check_interval=settings.TICTON_PAIR_REGISTRY_CHECK_INTERVAL)
+    ingestion = await get_ingestion()
+    await ingestion.connect(
+        db=manager,
+        cache=cache,
+        batch_size=settings.TICTON_INGEST_BATCH_SIZE,
+        flush_interval=settings.TICTON_INGEST_FLUSH_INTERVAL,
+        max_pending=settings.TICTON_INGEST_MAX_PENDING,
+        alarm_cache_size=settings.TICTON_INGEST_ALARM_CACHE_SIZE,
+    )
+    ton_clients = await connect_ton_clients(settings)
+    try:
+        await seed_user_stats(manager, cache)
+        pairs = await registry.list()
+        if len(oracles) > 0:
+            wanted = {Address(oracle).to_string(False) for oracle in oracles}
+            pairs = [pair for pair in pairs if Address(pair.oracle_address).to_string(False) in wanted]
+        for oracle, count in (await backfill(pairs, manager, ingestion, workers=workers, ranges=ranges)).items():
+            typer.echo(f"Backfilled {count} transactions of oracle {oracle}")
+    finally:
+        await ingestion.disconnect()
+        await ton_clients.disconnect()
+        await cache.disconnect()
+        await manager.disconnect()
+
+
+@cli.command(name="backfill")
+def backfill_command(
+    oracles: List[str] = typer.Option([], "--oracle", help="Oracle to backfill, all pairs when omitted"),
+    workers: int = typer.Option(8, help="Transaction ranges fetched concurrently across all oracles"),
+    ranges: int = typer.Option(32, help="Number of lt ranges the history of an oracle is split into"),
+):
+    """
+    Process oracle history from the sync checkpoints, run it while no `start` or `worker` process is running.
+    """
+    typer.echo("Backfilling oracle transactions")
+    asyncio.run(run_backfill(oracles, workers, ranges))
+
+
 @cli.command(name="start")
 def start_server(
     port: int = int(os.getenv("TICTON_SERVER_PORT", 8000)),
 ):
+    """
+    Serve the API and run ingestion in a single process.
+    """
     typer.echo("Initializing database")
     asyncio.run(setup())
 
@@ -127,5 +340,380 @@ def start_server(
     uvicorn.run("main:app", host="0.0.0.0", port=port)
 
 
+@cli.command(name="serve")
+def serve(
+    port: int = int(os.getenv("TICTON_SERVER_PORT", 8000)),
+    workers: int = int(os.getenv("TICTON_SERVER_WORKERS", 4)),
+):
+    """
+    Serve the API only, with `workers` uvicorn processes. Run `worker` next to it for subscriptions and price polling.
+    """
+    typer.echo("Initializing database")
+    asyncio.run(setup())
+
+    typer.echo(f"Starting {workers} API workers on port {port}")
+    uvicorn.run("main:api", host="0.0.0.0", port=port, workers=workers)
+
+
+async def run_worker():
+    settings = get_settings()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in [signal.SIGINT, signal.SIGTERM]:
+        loop.add_signal_handler(sig, stop.set)
+    async with connect_services(settings) as (manager, cache, registry):
+        async with run_ingestion(settings, manager, cache, registry):
+            await stop.wait()
+
+
+def worker_process():
+    asyncio.run(run_worker())
+
+
+@cli.command(name="worker")
+def start_worker(
+    processes: int = int(os.getenv("TICTON_WORKER_PROCESSES", 1)),
+):
+    """
+    Run oracle subscriptions and price polling without serving the API.
+    Subscriptions and the price poller are spread over every worker process of every host by lease, add processes or hosts to scale.
+    """
+    typer.echo("Initializing database")
+    asyncio.run(setup())
+
+    typer.echo(f"Starting {processes} ingestion workers")
+    if processes == 1:
+        worker_process()
+        return
+    context = multiprocessing.get_context("spawn")
+    children = [context.Process(target=worker_process, name=f"worker-{i}") for i in range(processes)]
+
+    def terminate(*_):
+        # a SIGTERM of a supervisor reaches this process only, pass it on so the children flush and release their leases
+        for child in children:
+            if child.is_alive():
+                child.terminate()
+
+    signal.signal(signal.SIGTERM, terminate)
+    for child in children:
+        child.start()
+    for child in children:
+        try:
+            child.join()
+        except KeyboardInterrupt:
+            # the children received the signal too and are shutting down
+            child.join()
+
+
+bench_cli = Typer(help="Run benchmarks against local services")
+cli.add_typer(bench_cli, name="bench")
+
+
+@bench_cli.command(name="db")
+def bench_db(
+    alarms: int = 50_000,
+    watchmakers: int = 500,
+    requests: int = 2_000,
+    concurrency: int = 64,
+):
+    from app.bench.db import run_db_benchmark
+
+    typer.echo("Benchmarking blocking vs async database access")
+    result = asyncio.run(run_db_benchmark(get_settings(), alarms=alarms, watchmakers=watchmakers, requests=requests, concurrency=concurrency))
+    typer.echo(json.dumps(result, indent=2))
+
+
+@bench_cli.command(name="exchanges")
+def bench_exchanges(
+    symbols: List[str] = typer.Option(["TON/USDT"], "--symbol"),
+    cycles: int = 10,
+    interval: float = 4.0,
+):
+    from app.bench.exchanges import run_exchange_benchmark
+
+    typer.echo("Benchmarking per-cycle latency of cold vs warm exchange sessions")
+    result = asyncio.run(run_exchange_benchmark(get_settings().TICTON_EXCHANGES, symbols=symbols, cycles=cycles, interval=interval))
+    typer.echo(json.dumps(result, indent=2))
+
+
+@bench_cli.command(name="tickers")
+def bench_tickers(
+    pairs: List[int] = typer.Option([1, 10, 50, 100, 200], "--pairs"),
+    exchanges: int = 3,
+    latency: float = 0.05,
+    rate_limit: float = 0.05,
+    max_concurrency: int = 4,
+):
+    from app.bench.tickers import run_ticker_benchmark
+
+    typer.echo("Benchmarking polling cycle time of per-symbol vs batched ticker fetching")
+    result = asyncio.run(run_ticker_benchmark(pairs, exchanges=exchanges, latency=latency, rate_limit=rate_limit, max_concurrency=max_concurrency))
+    typer.echo(json.dumps(result, indent=2))
+
+
+@bench_cli.command(name="serialize")
+def bench_serialize(
+    page_sizes: List[int] = typer.Option([10, 20], "--page-size"),
+    rounds: int = 2_000,
+):
+    from app.bench.serialize import run_serialize_benchmark
+
+    typer.echo("Benchmarking per-item cost of validated vs direct alarm list serialization")
+    result = run_serialize_benchmark(page_sizes, rounds=rounds)
+    typer.echo(json.dumps(result, indent=2))
+
+
+async def replay_ingest(oracles: int, events: int, receivers: int, batch_size: int, flush_interval: float, max_pending: int, redis_db: int) -> dict:
+    from app.bench.ingest import run_ingest_benchmark
+
+    settings = get_settings()
+    scratch = settings.model_copy(update={"TICTON_DB_NAME": f"{settings.TICTON_DB_NAME}_ingest", "TICTON_REDIS_DB": redis_db})
+    manager = await connect_db(scratch)
+    cache = await connect_cache(scratch)
+    try:
+        return await run_ingest_benchmark(manager, cache, oracles=oracles, events=events, receivers=receivers, batch_size=batch_size, flush_interval=flush_interval, max_pending=max_pending)
+    finally:
+        await manager.client.drop_database(scratch.TICTON_DB_NAME)
+        await cache.disconnect()
+        await manager.disconnect()
+
+
+@bench_cli.command(name="ingest")
+def bench_ingest(
+    oracles: int = 8,
+    events: int = 2_000,
+    receivers: int = 200,
+    batch_size: int = 500,
+    flush_interval: float = 0.25,
+    max_pending: int = 5_000,
+    redis_db: int = typer.Option(15, help="Scratch redis database, the leaderboard key in it is overwritten"),
+):
+    typer.echo("Replaying oracle events through write-through vs buffered ingestion")
+    result = asyncio.run(replay_ingest(oracles, events, receivers, batch_size, flush_interval, max_pending, redis_db))
+    typer.echo(json.dumps(result, indent=2))
+
+
+async def record_ingest(oracles: List[str], output: str, events: int, duration: float, start_lt: str) -> dict:
+    from app.bench.replay import record_oracles
+
+    settings = get_settings()
+    async with connect_services(settings) as (_, _, registry):
+        pairs = await registry.list()
+        if len(oracles) > 0:
+            wanted = {Address(oracle).to_string(False) for oracle in oracles}
+            pairs = [pair for pair in pairs if Address(pair.oracle_address).to_string(False) in wanted]
+        ton_clients = await get_ton_clients()
+        return await record_oracles(ton_clients, pairs, output, events=events, duration=duration, start_lt=int(start_lt) if start_lt.isdigit() else start_lt)  # type: ignore
+
+
+@bench_cli.command(name="record")
+def bench_record(
+    oracles: List[str] = typer.Option([], "--oracle", help="Oracle to record, all pairs when omitted"),
+    output: str = typer.Option("ingest-recording.jsonl.gz", help="File the recording is written to"),
+    events: int = typer.Option(10_000, help="Stop after this many events across all oracles"),
+    duration: float = typer.Option(600.0, help="Stop after this many seconds"),
+    start_lt: str = typer.Option("oldest", help="lt to record from, `oldest` or `latest`"),
+):
+    """
+    Record the tick, wind and ring events of live oracles for `bench replay`, nothing is written to the database.
+    """
+    typer.echo("Recording oracle events")
+    result = asyncio.run(record_ingest(oracles, output, events, duration, start_lt))
+    typer.echo(json.dumps(result, indent=2))
+
+
+async def replay_recording(
+    path: Optional[str], speed: float, oracles: int, events: int, receivers: int, save: Optional[str], batch_size: int, flush_interval: float, max_pending: int, redis_db: int
+) -> dict:
+    from app.bench.replay import read_recording, run_replay, synthetic_recording
+
+    if path is not None:
+        recording = read_recording(path)
+    else:
+        recording = synthetic_recording(oracles, events, receivers)
+    if save is not None:
+        recording.save(save)
+    settings = get_settings()
+    scratch = settings.model_copy(update={"TICTON_DB_NAME": f"{settings.TICTON_DB_NAME}_replay", "TICTON_REDIS_DB": redis_db})
+    manager = await connect_db(scratch)
+    cache = await connect_cache(scratch)
+    try:
+        result = await run_replay(manager, cache, recording, speed=speed, batch_size=batch_size, flush_interval=flush_interval, max_pending=max_pending)
+        return {"recording": path or "synthetic", **result}
+    finally:
+        await manager.client.drop_database(scratch.TICTON_DB_NAME)
+        await cache.disconnect()
+        await manager.disconnect()
+
+
+@bench_cli.command(name="replay")
+def bench_replay(
+    path: Optional[str] = typer.Argument(None, help="Recording written by `bench record`, a synthetic one is generated when omitted"),
+    speed: float = typer.Option(0.0, help="Replay this many times faster than the events happened on chain, 0 replays as fast as possible"),
+    oracles: int = typer.Option(8, help="Oracles of the synthetic recording"),
+    events: int = typer.Option(2_000, help="Events per oracle of the synthetic recording"),
+    receivers: int = typer.Option(200, help="Watchmakers and reward receivers of the synthetic recording"),
+    save: Optional[str] = typer.Option(None, help="Also write the replayed recording to this file"),
+    batch_size: int = 500,
+    flush_interval: float = 0.25,
+    max_pending: int = 5_000,
+    redis_db: int = typer.Option(15, help="Scratch redis database, the leaderboard key in it is overwritten"),
+):
+    """
+    Feed recorded or synthetic oracle events through the ingest handlers into a scratch database and report events per second and the
+    write cost per event.
+    """
+    typer.echo("Replaying oracle events through the ingest handlers")
+    result = asyncio.run(replay_recording(path, speed, oracles, events, receivers, save, batch_size, flush_interval, max_pending, redis_db))
+    typer.echo(json.dumps(result, indent=2))
+
+
+async def stream_load(clients: int, pairs: int, watchmakers: int, events: int, rate: float, port: int, redis_db: int) -> dict:
+    from app.bench.stream import run_stream_benchmark
+
+    settings = get_settings()
+    cache = await connect_cache(settings.model_copy(update={"TICTON_REDIS_DB": redis_db}))
+    try:
+        return await run_stream_benchmark(cache, clients=clients, pairs=pairs, watchmakers=watchmakers, events=events, rate=rate, port=port)
+    finally:
+        await cache.disconnect()
+
+
+@bench_cli.command(name="stream")
+def bench_stream(
+    clients: int = 2_000,
+    pairs: int = 20,
+    watchmakers: int = 500,
+    events: int = 500,
+    rate: float = 100.0,
+    port: int = 8765,
+    redis_db: int = typer.Option(15, help="Scratch redis database, pub/sub is not scoped by database so use a redis without live workers"),
+):
+    typer.echo("Fanning out alarm events to local WebSocket clients through one redis subscription")
+    result = asyncio.run(stream_load(clients, pairs, watchmakers, events, rate, port, redis_db))
+    typer.echo(json.dumps(result, indent=2))
+
+
+async def check_metrics_overhead(rounds: int, requests: int, budget: float) -> dict:
+    from app.bench.metrics import hot_paths, run_metrics_benchmark
+
+    settings = get_settings()
+    async with connect_services(settings) as (manager, _, _):
+        return await run_metrics_benchmark(create_app(api_lifespan), await hot_paths(manager), rounds=rounds, requests=requests, budget=budget)
+
+
+@bench_cli.command(name="metrics")
+def bench_metrics(
+    rounds: int = 10,
+    requests: int = 100,
+    budget: float = typer.Option(0.02, help="Largest fraction instrumentation may add to the p50 of a hot route"),
+):
+    """
+    Fail if the metrics instrumentation adds more than the budget to the p50 latency of any hot route.
+    """
+    typer.echo("Comparing hot route latency with metrics instrumentation on and off")
+    result = asyncio.run(check_metrics_overhead(rounds, requests, budget))
+    typer.echo(json.dumps(result, indent=2))
+    if not result["ok"]:
+        over = [path for path, r in result["routes"].items() if not r["ok"]]
+        typer.echo(f"Routes over the instrumentation budget: {', '.join(over)}", err=True)
+        raise typer.Exit(code=1)
+
+
+async def http_load(
+    fake: bool, fresh: bool, pairs: int, alarms: int, watchmakers: int, leaderboard: int, history_minutes: int, requests: int, concurrency: int, only: List[str], redis_db: int
+) -> dict:
+    from app.bench.http import bench_data, cache_seeded, connect_fakes, database_seeded, run_http_benchmark, run_info, seed_http_cache, seed_http_database, seed_params
+
+    settings = get_settings()
+    scratch = settings.model_copy(update={"TICTON_DB_NAME": f"{settings.TICTON_DB_NAME}_http", "TICTON_REDIS_DB": redis_db})
+    if fake:
+        manager, cache = await connect_fakes(scratch.TICTON_DB_NAME)
+    else:
+        manager = await connect_db(scratch)
+        cache = await connect_cache(scratch)
+    metrics = await get_metrics()
+    try:
+        # the scratch data is kept between runs, seeding a million alarms takes longer than the benchmark. Redis is checked on its own,
+        # its price history ages and it may have been flushed while the database still holds the data
+        reseed = fake or fresh or not await database_seeded(manager, seed_params(pairs, alarms, watchmakers, leaderboard))
+        if reseed:
+            typer.echo(f"Seeding {alarms} alarms, {leaderboard} leaderboard records and {pairs} pairs into {scratch.TICTON_DB_NAME}")
+            await seed_http_database(manager, pairs, alarms, watchmakers, leaderboard, indexes=not fake)
+        cache_params = {**seed_params(pairs, alarms, watchmakers, leaderboard), "history_minutes": history_minutes}
+        if reseed or not await cache_seeded(cache, cache_params):
+            typer.echo(f"Seeding the leaderboard and {history_minutes} minutes of price history into redis database {redis_db}")
+            await seed_http_cache(manager, cache, scratch, pairs, history_minutes, cache_params)
+        data = bench_data(pairs, alarms, watchmakers, leaderboard)
+        registry = await get_pair_registry()
+        await registry.connect(db=manager, cache=cache, check_interval=scratch.TICTON_PAIR_REGISTRY_CHECK_INTERVAL)
+        await metrics.connect(cache=cache, interval=scratch.TICTON_METRICS_REPORT_INTERVAL)
+        results = await run_http_benchmark(create_app(api_lifespan), data, requests=requests, concurrency=concurrency, only=only)
+        return {
+            **run_info(),
+            "backend": "in-process" if fake else "local",
+            "data": {"pairs": pairs, "alarms": alarms, "watchmakers": watchmakers, "leaderboard": leaderboard, "history_minutes": history_minutes},
+            "requests": requests,
+            "concurrency": concurrency,
+            "endpoints": results,
+        }
+    finally:
+        await metrics.disconnect()
+        if not fake:
+            await cache.disconnect()
+            await manager.disconnect()
+
+
+@bench_cli.command(name="http")
+def bench_http(
+    output: str = typer.Option("bench-http.json", help="File the results are written to as JSON"),
+    fake: bool = typer.Option(False, help="Use in-process stand-ins for MongoDB and redis instead of the configured services"),
+    fresh: bool = typer.Option(False, help="Seed again even if the scratch database already holds the data"),
+    pairs: int = 8,
+    alarms: int = 1_000_000,
+    watchmakers: int = 20_000,
+    leaderboard: int = 200_000,
+    history_minutes: int = 1440,
+    requests: int = 2_000,
+    concurrency: int = 32,
+    endpoint: List[str] = typer.Option([], help="Only run endpoints whose name contains this, can be repeated"),
+    redis_db: int = typer.Option(15, help="Scratch redis database, it is flushed when seeding"),
+):
+    """
+    Seed synthetic pairs, alarms, leaderboard and price history and measure throughput and latency of every HTTP endpoint.
+    """
+    typer.echo("Driving every HTTP endpoint with concurrent clients")
+    result = asyncio.run(http_load(fake, fresh, pairs, alarms, watchmakers, leaderboard, history_minutes, requests, concurrency, endpoint, redis_db))
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+    typer.echo(json.dumps(result, indent=2))
+    typer.echo(f"Results written to {output}")
+
+
+async def check_plans() -> List[dict]:
+    from app.bench.plans import check_query_plans
+
+    settings = get_settings()
+    manager = await connect_db(settings)
+    try:
+        return await check_query_plans(manager.client, f"{settings.TICTON_DB_NAME}_plans")
+    finally:
+        await manager.disconnect()
+
+
+@bench_cli.command(name="plans")
+def bench_plans():
+    """
+    Fail if any query of the routers and jobs falls back to a collection scan or an in-memory sort.
+    """
+    typer.echo("Explaining every query against the declared indexes")
+    results = asyncio.run(check_plans())
+    typer.echo(json.dumps(results, indent=2))
+    failed = [r["name"] for r in results if not r["ok"]]
+    if len(failed) > 0:
+        typer.echo(f"Query plans with COLLSCAN or in-memory sort: {', '.join(failed)}", err=True)
+        raise typer.Exit(code=1)
+
+
 if __name__ == "__main__":
     cli()